@@ -1,26 +1,70 @@
-"""Script that creates .attacks file from .index, .clean and access.log files
+"""Script that parses Nemesida log files and generates a .index and .clean files
+recovering necessary information to the research.
 
-Usage: comparer.py [-h] [-a access_log] -id id
+Usage: analyzer.py [-h] [-e error_log] [-a access_log] [-j workers]
+                   [-m memory] [-id id] [-r results] [-vc cache] [-rs ruleset]
+                   [-vcs cache_size] [-dt] [-b]
 
 optional arguments:
-  -h, --help     show this help message and exit
-  -a access_log  Nginx access log file which contains information about access
-                 to the server. By default: /var/log/nginx/access.log
-
-required arguments:
-  -id id         Numeric value added to idenfity generated files
+  -h, --help       show this help message and exit
+  -e error_log     Nginx error log file which contains information about
+                   Nemesida blocked urls. By default: /var/log/nginx/error.log
+  -a access_log    Nginx access log file which contains information about
+                   access to the server. By default: /var/log/nginx/access.log
+  -j workers       Number of processes parsing byte ranges of the access log
+                   in parallel. By default the access log is parsed by a
+                   single process
+  -m memory        Memory in megabytes used to join error log and .index file
+                   by request ID, spilling sorted runs to temporary files when
+                   it is exceeded. By default the join is done completely in
+                   memory
+  -id id           Numeric value added to idenfity generated files. By default
+                   is the current timestamp: ${current_timestamp}
+  -r results       Results file written by launcher. If indicated, .index and
+                   .clean files are built from it and error log without
+                   reading access log
+  -vc cache        SQLite file where the verdicts of launched URIs are kept by
+                   URI and ruleset. Launcher does not launch the URIs whose
+                   verdict is cached, writing it in the results file instead,
+                   and analyzer adds the verdicts of the results file to the
+                   cache
+  -rs ruleset      Identifier of the ruleset of Nemesida WAF whose verdicts
+                   are cached, e.g. its Docker image. Required with verdict
+                   cache
+  -vcs cache_size  Maximum number of verdicts kept in the cache, the least
+                   recently used ones are removed. By default: 1000000
+  -dt              Decompresses compressed logs and reads rotated ones in a
+                   separate thread, overlapping it with the parsing of their
+                   lines. Logs may be a glob of a rotated series, e.g.
+                   'access.log*', read from the oldest file to the newest one,
+                   compressed with gzip (.gz) or zstd (.zst)
+  -b               Batch mode, progress of the analysis is not shown. It is
+                   not shown either when the output is not a terminal
 
 
 Author: Carlos Cagigao Bravo
 """
 
 import argparse
-from pwn import log
+from logger import log
+from contextlib import contextmanager
 from datetime import datetime
+import io
+import json
+import mmap
+import os
 import re
+import shutil
+import tempfile
+import time
 from urllib import parse
 import os.path as path
 import fileinput
+import extsort
+import launcher
+import logfiles
+import progress
+import verdict_cache
 
 # =====================================
 # Constant variables
@@ -40,6 +84,21 @@ ACCESS_LOG_HELP = "Nginx access log file which contains information about access
      % ACCESS_LOG_DEFAULT
 ACCESS_LOG_VARIABLE_NAME = "access_log"
 
+RESULTS_ARG = "-r"
+RESULTS_HELP = "Results file written by launcher. If indicated, .index and .clean files are built from it and \
+error log without reading access log"
+RESULTS_VARIABLE_NAME = "results"
+
+WORKERS_ARG = "-j"
+WORKERS_HELP = "Number of processes parsing byte ranges of the access log in parallel. By default the access \
+log is parsed by a single process"
+WORKERS_VARIABLE_NAME = "workers"
+
+MEMORY_ARG = "-m"
+MEMORY_HELP = "Memory in megabytes used to join error log and .index file by request ID, spilling sorted runs \
+to temporary files when it is exceeded. By default the join is done completely in memory"
+MEMORY_VARIABLE_NAME = "memory"
+
 IDENTIFIER_LOG_ARG = "-id"
 IDENTIFIER_LOG_DEFAULT = int(datetime.timestamp(datetime.now()))
 IDENTIFIER_LOG_HELP = "Numeric value added to idenfity generated files"
@@ -51,18 +110,189 @@ START_ACCESS_LOG = "Analyzing access log..."
 FILE_NOT_EXISTS_ERROR = "File %s does not exist"
 DETECTED = "Detected URIs by Nemesida"
 UNDETECTED = "Undetected URIs by Nemesida"
+READING_FILE = "Reading {}"
+ANALYZED_URIS = "Detected URIs by Nemesida: {}, undetected URIs by Nemesida: {}"
 ADDING_NUMBER_OF_ATTACKS = "Adding number of attacks in {} line"
 ANALYSIS_INDEX_FILE = "analysis-%s.index"
 ANALYSIS_CLEAN_NAME = "analysis-%s.clean"
+ANALYSIS_STATISTICS_NAME = "analysis-%s.json"
 ANALYSIS_FILE_LOG_START = "Starting analysis for {} file"
 ANALYSIS_FILE_LOG_END = "Analysis finished for {} file"
 FILES_GENERATED = "Files {} and {} generated"
+PARSING_SHARDS = "Parsing {} byte ranges with {} processes"
+PARSED_SHARDS = "Parsed byte ranges"
+INVALID_WORKERS_ERROR = "Number of processes must be greater than 0"
+INVALID_MEMORY_ERROR = "Memory must be greater than 0"
+EXTERNAL_JOIN = "Joining error log and {} file with {} MB of memory"
+STATISTICS_GENERATED = "Run statistics written in {}"
+RUN_MARKER_FOUND = "Found run marker of attempt {} after line {}, lines launched again are analyzed once"
+RUN_MARKERS_SERIAL = "Access log has run markers of resumed launches, it is parsed again by a single process"
+COMPRESSED_SERIAL = "Access log is compressed or rotated, it is parsed by a single process"
+RESULTS_REQUEST_ID_ERROR = "Line {} of {} has a response without request ID, the launcher did not receive the \
+X-Request-ID header"
+CACHE_FILLED = "Verdicts of {} URIs added to cache {}"
+CACHE_NOT_USED = "Verdict cache is only filled from the results file written by launcher, indicate it with %s" \
+    % RESULTS_ARG
 END_MAIN = "Analysis completed successfully"
 
 INDEX_FILE_LINE = "{}\tUri [{}]\tRequestID [{}]\tBT [{}]\tNattacks\n"
 CLEAN_FILE_LINE = "{}\n"
 INDEX_NATTACKS_LINE = "\t[{}]"
 NATTACKS_COUNT = " [{}]"
+RESULTS_SEPARATOR = "\t"
+RESULTS_EMPTY_VALUE = "-"
+RESULTS_FIELDS = 7
+HTTP_BLOCKED_STATUS = "403"
+HTTP_OK_STATUS = "200"
+ISO_8859_1 = "ISO-8859-1"
+LINE_BREAK = b"\n"
+SHARDS_PER_WORKER = 4
+SHARD_MAX_SIZE = 64 * 1024 * 1024
+SHARD_INDEX_FILE = "shard-%s.index"
+SHARD_CLEAN_FILE = "shard-%s.clean"
+SORTS_NUMBER = 3
+SORT_RECORD = "{}\t{}\t{}\n"
+POSITION_FORMAT = "%012d"
+SORTED_INDEX_FILE = "sorted.index"
+SHARDS_UNIT = "byte ranges"
+
+# =====================================
+# Classes
+# =====================================
+class RunStatistics:
+    """Statistics of an analysis run, collected while the files are streamed by every stage.
+
+    Counts the lines of the input (access log or results file), .clean, .index and error log
+    files, the bytes read and the seconds spent by every stage
+    """
+
+    def __init__(self):
+        self.input_lines = 0
+        self.clean_lines = 0
+        self.attack_lines = 0
+        self.error_log_lines = 0
+        self.bytes_read = 0
+        self.timings = dict()
+
+    @contextmanager
+    def stage(self, name):
+        """Measures the seconds spent by the stage, added to previous measures with the same name
+
+        :param name: name of the stage
+        :type name: string
+        """
+        start_time = time.perf_counter()
+        try:
+            yield self
+        finally:
+            self.timings[name] = self.timings.get(name, 0) + time.perf_counter() - start_time
+
+    def to_dict(self):
+        """Returns the statistics as a dictionary
+
+        :rtype: dict
+        """
+        return {
+            "input_lines": self.input_lines,
+            "clean_lines": self.clean_lines,
+            "attack_lines": self.attack_lines,
+            "error_log_lines": self.error_log_lines,
+            "bytes_read": self.bytes_read,
+            "timings": self.timings
+        }
+
+    def save(self, file_name):
+        """Writes the statistics in a JSON file
+
+        :param file_name: name of the JSON file
+        :type file_name: string
+        """
+        with open(file_name, 'w') as statistics_file:
+            json.dump(self.to_dict(), statistics_file, indent=4)
+
+    @classmethod
+    def load(cls, file_name):
+        """Reads the statistics previously written in a JSON file
+
+        :param file_name: name of the JSON file
+        :type file_name: string
+
+        :raises FileNotFoundError: if file does not exist
+
+        :rtype: RunStatistics
+        """
+        with open(file_name) as statistics_file:
+            values = json.load(statistics_file)
+        statistics = cls()
+        for name, value in values.items():
+            setattr(statistics, name, value)
+        return statistics
+
+class AccessLogNumbering:
+    """Numbers the access log lines with the line of their URI in the launched file, as their
+    position in the access log, across the attempts of a resumed launch.
+
+    A run marker numbers the next line as the one after the checkpoint of the resumed attempt,
+    skipping the ranges of later lines sent in it, which were answered in a previous attempt and
+    are not launched again. The lines answered after the checkpoint but not acknowledged are
+    launched again, so a line is only numbered when its number is greater than the last one
+    numbered, keeping the response of the first attempt that launched it
+    """
+
+    def __init__(self, attempt=1, line=0, last_line=0, skipped=()):
+        """Creates the numbering of an access log
+
+        :param attempt: attempt of the last run marker read
+        :type attempt: int
+        :param line: number of the last line read
+        :type line: int
+        :param last_line: greatest line number given
+        :type last_line: int
+        :param skipped: (first line, last line) ranges of the attempt not launched again
+        :type skipped: iterable
+        """
+        self.attempt = attempt
+        self.line = line
+        self.last_line = last_line
+        self.skipped = dict(skipped)
+
+    def number(self, line):
+        """Numbers an access log line
+
+        :param line: access log line
+        :type line: string
+
+        :return: line number, None if it is a run marker or its line was already numbered
+        :rtype: int
+        """
+        marker = launcher.parse_run_marker(line)
+        if marker is not None:
+            attempt, self.line, skipped = marker
+            if attempt != self.attempt:
+                log.info(RUN_MARKER_FOUND.format(attempt, self.line))
+                self.attempt = attempt
+                self.skipped = dict()
+            self.skipped.update(skipped)
+            return None
+        self.line += 1
+        while self.line in self.skipped:
+            self.line = self.skipped.pop(self.line) + 1
+        if self.line <= self.last_line:
+            return None
+        self.last_line = self.line
+        return self.line
+
+    def to_dict(self):
+        """Returns the numbering as a dictionary
+
+        :rtype: dict
+        """
+        return {
+            "attempt": self.attempt,
+            "line": self.line,
+            "last_line": self.last_line,
+            "skipped": sorted(self.skipped.items())
+        }
 
 # =====================================
 # Functions
@@ -75,6 +305,11 @@ def init_parser():
     """
     parser = argparse.ArgumentParser(description=DESCRIPTION)
     add_optional_arguments(parser, False)
+    parser.add_argument(RESULTS_ARG, help=RESULTS_HELP, metavar=RESULTS_VARIABLE_NAME, \
+        dest=RESULTS_VARIABLE_NAME)
+    verdict_cache.add_optional_arguments(parser)
+    logfiles.add_optional_arguments(parser)
+    progress.add_optional_arguments(parser)
     return parser
 
 def add_optional_arguments(parser, id_required):
@@ -91,6 +326,10 @@ def add_optional_arguments(parser, id_required):
         metavar=ERROR_LOG_VARIABLE_NAME, dest=ERROR_LOG_VARIABLE_NAME)
     parser.add_argument(ACCESS_LOG_ARG, help=ACCESS_LOG_HELP, default=ACCESS_LOG_DEFAULT, \
         metavar=ACCESS_LOG_VARIABLE_NAME, dest=ACCESS_LOG_VARIABLE_NAME)
+    parser.add_argument(WORKERS_ARG, help=WORKERS_HELP, metavar=WORKERS_VARIABLE_NAME, \
+        dest=WORKERS_VARIABLE_NAME, type=int)
+    parser.add_argument(MEMORY_ARG, help=MEMORY_HELP, metavar=MEMORY_VARIABLE_NAME, \
+        dest=MEMORY_VARIABLE_NAME, type=int)
 
     if not id_required:
         help_string = IDENTIFIER_LOG_HELP + IDENTIFIER_LOG_HELP_DEFAULT
@@ -109,11 +348,11 @@ def add_required_arguments(required_arguments_group):
 def check_files(access_log_path, error_log_path):
     """Check for indicated files existence
 
-    :raises PwnlibException: if file does not exist
+    :raises LogError: if file does not exist
     """
-    if not path.isfile(access_log_path):
+    if not logfiles.exists(access_log_path):
         log.error(FILE_NOT_EXISTS_ERROR % access_log_path)
-    if not path.isfile(error_log_path):
+    if not logfiles.exists(error_log_path):
         log.error(FILE_NOT_EXISTS_ERROR % error_log_path)
 
 def get_access_log_compiled_pattern():
@@ -180,45 +419,215 @@ def add_string_from_index(str, index, str_add):
     """
     return str[:index] + str_add + str[index:]
 
-def create_list_of_file_pos(file):
-    """Creates a list of file positions in order to use file.seek(position)
-    to access concrete lines into the file with distinct length between lines
+def get_rule_ids_by_request_id(error_log_arg, statistics):
+    """Reads the error log file once grouping the rule IDs found by request ID.
+    Rule IDs keep the order in which they appear in the file, so lines of different
+    requests may be interleaved
 
-    :param file: previosly opened file
-    :type file: file in read mode
+    :param error_log_arg: error log retrieved from command line
+    :type error_log_arg: string
+    :param statistics: statistics where error log lines and bytes read are counted
+    :type statistics: RunStatistics
 
-    :return: list of positions
-    :rtype: list
+    :return: rule IDs by request ID
+    :rtype: dict
     """
-    list_pos = list()
-    pos = 0
-    length = 0
-    for each in file:
-        list_pos.append(length)
-        length = length + len(each)
-        pos += 1
-    
-    return list_pos
+    error_log_cp = get_error_log_compiled_pattern()
+    rule_ids_by_request_id = dict()
+    with logfiles.open_log(error_log_arg) as error_log:
+        for error_line in error_log:
+            statistics.error_log_lines += 1
+            statistics.bytes_read += len(error_line)
+            result_error = error_log_cp.search(error_line)
+            if result_error is not None:
+                request_id = result_error.group('id')
+                rule_ids = rule_ids_by_request_id.get(request_id)
+                if rule_ids is None:
+                    rule_ids = rule_ids_by_request_id[request_id] = list()
+                rule_ids.append(result_error.group('rule_id'))
+
+    return rule_ids_by_request_id
 
-def give_file_line_by_pos(file, pos):
-    """Return specific file line by position with file.seek(position)
+def get_nattacks_string(rule_ids):
+    """Creates the number of attacks string added after Nattacks in .index file.
+    Last rule ID found in error log is placed first
 
-    :param file: previosly opened file
-    :type file: file in read mode
-    :param pos: position in the file (to use with file.seek())
-    :type pos: int
+    :param rule_ids: rule IDs of the request in error log order
+    :type rule_ids: list
 
-    :return: file line
+    :return: number of attacks and rule IDs separated by tabs
     :rtype: string
+
+    Example:
+        ['1513', '1516'] => ' [2]\t[1516]\t[1513]'
+    """
+    nattacks = NATTACKS_COUNT.format(len(rule_ids))
+    for rule_id in reversed(rule_ids):
+        nattacks += INDEX_NATTACKS_LINE.format(rule_id)
+    return nattacks
+
+def get_error_log_records(error_log_arg, statistics):
+    """Reads the error log file returning a line for every rule ID with the request ID,
+    the position of the line in the file and the rule ID separated by tabs
+
+    :param error_log_arg: error log retrieved from command line
+    :type error_log_arg: string
+    :param statistics: statistics where error log lines and bytes read are counted
+    :type statistics: RunStatistics
+
+    :return: generator of records
+    :rtype: generator
     """
-    file.seek(pos)
+    error_log_cp = get_error_log_compiled_pattern()
+    with logfiles.open_log(error_log_arg) as error_log:
+        for error_line in error_log:
+            statistics.error_log_lines += 1
+            statistics.bytes_read += len(error_line)
+            result_error = error_log_cp.search(error_line)
+            if result_error is not None:
+                yield SORT_RECORD.format(result_error.group('id'), POSITION_FORMAT % statistics.error_log_lines, \
+                    result_error.group('rule_id'))
+
+def get_index_records(index_file_name):
+    """Reads the .index file returning every line preceded by its request ID and its position
+    in the file, separated by tabs
+
+    :param index_file_name: name of the index file
+    :type index_file_name: string
+
+    :return: generator of records
+    :rtype: generator
+    """
+    index_log_cp = get_index_log_compiled_pattern()
+    with open(index_file_name) as index_file:
+        for position, index_line in enumerate(index_file):
+            yield SORT_RECORD.format(index_log_cp.search(index_line).group('id'), POSITION_FORMAT % position, \
+                index_line[:-1])
+
+def join_sorted_records(index_records, error_records):
+    """Merge joins .index and error log records, both sorted by request ID, completing every
+    .index line with the rule IDs of its request
+
+    :param index_records: .index records sorted by request ID
+    :type index_records: iterable
+    :param error_records: error log records sorted by request ID and position
+    :type error_records: iterable
+
+    :return: generator of completed .index lines preceded by their position and a tab
+    :rtype: generator
+    """
+    index_log_cp = get_index_log_compiled_pattern()
+    error_records = iter(error_records)
+    error_record = next(error_records, None)
+    for index_record in index_records:
+        request_id, position, index_line = index_record.split(RESULTS_SEPARATOR, 2)
+        rule_ids = list()
+        while error_record is not None and error_record.split(RESULTS_SEPARATOR, 1)[0] < request_id:
+            error_record = next(error_records, None)
+        while error_record is not None and error_record.split(RESULTS_SEPARATOR, 1)[0] == request_id:
+            rule_ids.append(error_record.rstrip('\n').split(RESULTS_SEPARATOR)[2])
+            error_record = next(error_records, None)
+        result_index = index_log_cp.search(index_line)
+        yield position + RESULTS_SEPARATOR + add_string_from_index(index_line, result_index.end(), \
+            get_nattacks_string(rule_ids))
 
-    return file.readline()
+def external_error_log_analysis(error_log_arg, index_file_name, statistics, memory):
+    """Analyzes the error log file and completes the .index file as error_log_analysis does,
+    keeping in memory a bounded amount of lines.
 
+    Error log and .index records are sorted by request ID in runs spilled to temporary files,
+    merge joined, and sorted back by .index position. Every one of the three sorts uses a third
+    of the memory indicated
 
-def access_log_analysis(access_log_arg, index_file_name, clean_file_name):
+    :param error_log_arg: error log retrieved from command line
+    :type error_log_arg: string
+    :param index_file_name: name of the index file name to be completed
+    :type index_file_name: string
+    :param statistics: statistics where error log lines and bytes read are counted
+    :type statistics: RunStatistics
+    :param memory: megabytes of memory used by the sorts
+    :type memory: int
+    """
+    if memory < 1:
+        log.error(INVALID_MEMORY_ERROR)
+    log.info(ANALYSIS_FILE_LOG_START.format(error_log_arg))
+    log.info(EXTERNAL_JOIN.format(index_file_name, memory))
+    number_of_attacks = progress.Progress(ADDING_NUMBER_OF_ATTACKS.format(index_file_name))
+    memory_budget = memory * extsort.MEGABYTE // SORTS_NUMBER
+    temporary_folder = tempfile.mkdtemp(dir=path.dirname(path.abspath(index_file_name)))
+    try:
+        index_records = extsort.sort_lines(get_index_records(index_file_name), memory_budget, temporary_folder)
+        error_records = extsort.sort_lines(get_error_log_records(error_log_arg, statistics), memory_budget, \
+            temporary_folder)
+        completed_lines = extsort.sort_lines(join_sorted_records(index_records, error_records), memory_budget, \
+            temporary_folder)
+        sorted_index_file_name = path.join(temporary_folder, SORTED_INDEX_FILE)
+        with open(sorted_index_file_name, 'w') as sorted_index_file:
+            index_file_count = 0
+            for index_file_count, completed_line in enumerate(completed_lines, 1):
+                sorted_index_file.write(completed_line.split(RESULTS_SEPARATOR, 1)[1])
+                number_of_attacks.update(index_file_count)
+            number_of_attacks.done(index_file_count)
+        os.replace(sorted_index_file_name, index_file_name)
+    finally:
+        shutil.rmtree(temporary_folder)
+    log.info(ANALYSIS_FILE_LOG_END.format(error_log_arg))
+
+def read_results_file(results_file_name, statistics=None):
+    """Reads the results file written by launcher sorting its lines by line number of the
+    launched file, as responses may have been written in a different order. Lines of URIs
+    whose verdict was recovered from the cache have their rule IDs at the end
+
+    :param results_file_name: results file written by launcher
+    :type results_file_name: string
+    :param statistics: statistics where input lines and bytes read are counted, if indicated
+    :type statistics: RunStatistics
+
+    :raises LogError: if a response has no request ID, its rule IDs could not be found
+
+    :return: list of (line number, status, latency, request ID, block type, timestamp, encoded URI,
+        cached rule IDs or None if the URI was launched)
+    :rtype: list
+    """
+    results = list()
+    with open(results_file_name, encoding='ISO-8859-1', errors='ignore') as results_file:
+        for line in results_file:
+            fields = line.rstrip('\n').split(RESULTS_SEPARATOR)
+            fields[0] = int(fields[0])
+            if len(fields) == RESULTS_FIELDS:
+                fields.append(None)
+            if fields[1] != RESULTS_EMPTY_VALUE and fields[3] == RESULTS_EMPTY_VALUE:
+                log.error(RESULTS_REQUEST_ID_ERROR.format(fields[0], results_file_name))
+            results.append(tuple(fields))
+            if statistics is not None:
+                statistics.input_lines += 1
+                statistics.bytes_read += len(line)
+    results.sort(key=lambda result: result[0])
+
+    return results
+
+def number_access_log_lines(log_file):
+    """Numbers the access log lines with the line of their URI in the launched file as
+    AccessLogNumbering does. Run markers and lines launched again are not returned, so every
+    line is analyzed once, without searching the run markers before reading the file
+
+    :param log_file: iterable of access log lines
+    :type log_file: iterable
+
+    :return: generator of (line number, access log line) tuples
+    :rtype: generator
+    """
+    numbering = AccessLogNumbering()
+    for line in log_file:
+        line_number = numbering.number(line)
+        if line_number is not None:
+            yield line_number, line
+
+def access_log_analysis(access_log_arg, index_file_name, clean_file_name, statistics):
     """Analyzes the access log file and creates a completed .clean file and uncompleted .index file.
-    Index file needs to be completed analyzing error log file in the next step
+    Index file needs to be completed analyzing error log file in the next step. Lines of a resumed
+    launch that were launched again are only analyzed in the first attempt. Files of a compressed or
+    rotated access log are read in order as a single one
     
     :param access_log_arg: access log retrieved from command line
     :type access_log_arg: string
@@ -226,18 +635,22 @@ def access_log_analysis(access_log_arg, index_file_name, clean_file_name):
     :type index_file_name: string
     :param clean_file_name: name of the clean file name to be created
     :type clean_file_name: string
+    :param statistics: statistics where lines and bytes read are counted
+    :type statistics: RunStatistics
     """
     log.info(ANALYSIS_FILE_LOG_START.format(access_log_arg))
     access_log_cp = get_access_log_compiled_pattern()
-    detected_uris = log.progress(DETECTED)
-    undetected_uris = log.progress(UNDETECTED)
+    read_lines = progress.Progress(READING_FILE.format(access_log_arg), total=logfiles.get_size(access_log_arg))
 
     clean_file = open(clean_file_name, 'w')
     index_file = open(index_file_name, 'w')
-    with open(access_log_arg, encoding='ISO-8859-1', errors='ignore') as log_file:
+    with logfiles.open_log(access_log_arg) as log_file:
         detected_count = 0
         undetected_count = 0
-        for line in log_file:
+        for _, line in number_access_log_lines(log_file):
+            statistics.input_lines += 1
+            statistics.bytes_read += len(line)
+            read_lines.update(statistics.input_lines, statistics.bytes_read)
             result = access_log_cp.search(line)
             if result is not None:
                 uri = result.group('uri')
@@ -248,98 +661,308 @@ def access_log_analysis(access_log_arg, index_file_name, clean_file_name):
                     block_type = result.group('bt')
                     index_file.write(INDEX_FILE_LINE.format(timestamp, decoded_uri, request_id, block_type))
                     detected_count += 1
-                    detected_uris.status("%s" % detected_count)
                 else:
                     clean_file.write(CLEAN_FILE_LINE.format(decoded_uri))
                     undetected_count += 1
-                    undetected_uris.status("%s" % undetected_count)
     log_file.close()
     clean_file.close()
     index_file.close()
+    read_lines.done(statistics.input_lines)
+    log.info(ANALYZED_URIS.format(detected_count, undetected_count))
+    statistics.clean_lines += undetected_count
+    statistics.attack_lines += detected_count
+
+    log.info(ANALYSIS_FILE_LOG_END.format(access_log_arg))
+    log.info(FILES_GENERATED.format(index_file_name, clean_file_name))
 
+def get_access_log_shards(access_log_arg, shards_number):
+    """Splits the access log in byte ranges ending just after a line break, so every
+    line belongs to a single range
+
+    :param access_log_arg: access log retrieved from command line
+    :type access_log_arg: string
+    :param shards_number: number of byte ranges wanted
+    :type shards_number: int
+
+    :return: list of (start, end) byte positions, in file order
+    :rtype: list
+    """
+    size = path.getsize(access_log_arg)
+    boundaries = [0]
+    with open(access_log_arg, 'rb') as log_file, mmap.mmap(log_file.fileno(), 0, access=mmap.ACCESS_READ) as log_map:
+        for shard in range(1, shards_number):
+            line_break = log_map.find(LINE_BREAK, max(boundaries[-1], size * shard // shards_number))
+            if line_break == -1:
+                break
+            boundaries.append(line_break + 1)
+    boundaries.append(size)
+
+    return [(start, end) for start, end in zip(boundaries, boundaries[1:]) if start < end]
+
+def parse_access_log_shard(shard):
+    """Parses a byte range of the access log writing its .index and .clean lines in
+    temporary files. Runs in a worker process. Byte ranges with a run marker are not parsed,
+    since the numbers of their lines depend on the previous ranges
+
+    :param shard: access log, start and end byte positions, temporary .index and .clean file names
+    :type shard: tuple
+
+    :return: number of lines, detected and undetected URIs of the byte range, None if it has a run marker
+    :rtype: tuple
+    """
+    access_log_arg, start, end, index_file_name, clean_file_name = shard
+    access_log_cp = get_access_log_compiled_pattern()
+    line_count = 0
+    detected_count = 0
+    undetected_count = 0
+    with open(access_log_arg, 'rb') as log_file, mmap.mmap(log_file.fileno(), 0, access=mmap.ACCESS_READ) as log_map:
+        if log_map.find(launcher.RUN_MARKER_PATH.encode(ISO_8859_1), start, end) != -1:
+            return None
+        lines = io.StringIO(log_map[start:end].decode(ISO_8859_1), newline=None)
+    with open(index_file_name, 'w') as index_file, open(clean_file_name, 'w') as clean_file:
+        for line in lines:
+            line_count += 1
+            result = access_log_cp.search(line)
+            if result is not None:
+                decoded_uri = parse.unquote(result.group('uri'))
+                if result.group('http_status') == HTTP_BLOCKED_STATUS:
+                    index_file.write(INDEX_FILE_LINE.format(result.group('timestamp'), decoded_uri, \
+                        result.group('id'), result.group('bt')))
+                    detected_count += 1
+                else:
+                    clean_file.write(CLEAN_FILE_LINE.format(decoded_uri))
+                    undetected_count += 1
+
+    return line_count, detected_count, undetected_count
+
+def parallel_access_log_analysis(access_log_arg, index_file_name, clean_file_name, statistics, workers):
+    """Analyzes the access log file as access_log_analysis does, but parsing byte ranges of the
+    memory mapped file in a pool of processes. Files written by every process are merged in
+    file order, so .index and .clean lines keep the same order than in the serial analysis.
+    Access logs of resumed launches are analyzed again serially when a process finds a run
+    marker in its byte range, as the lines launched again depend on the lines before it, and so
+    are compressed or rotated access logs, which can not be split in byte ranges
+
+    :param access_log_arg: access log retrieved from command line
+    :type access_log_arg: string
+    :param index_file_name: name of the index file name to be created
+    :type index_file_name: string
+    :param clean_file_name: name of the clean file name to be created
+    :type clean_file_name: string
+    :param statistics: statistics where lines and bytes read are counted
+    :type statistics: RunStatistics
+    :param workers: number of processes
+    :type workers: int
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    if workers < 1:
+        log.error(INVALID_WORKERS_ERROR)
+    if not logfiles.is_plain_file(access_log_arg):
+        log.info(COMPRESSED_SERIAL)
+        access_log_analysis(access_log_arg, index_file_name, clean_file_name, statistics)
+        return
+    if path.getsize(access_log_arg) == 0:
+        access_log_analysis(access_log_arg, index_file_name, clean_file_name, statistics)
+        return
+    log.info(ANALYSIS_FILE_LOG_START.format(access_log_arg))
+    shards_number = max(workers * SHARDS_PER_WORKER, path.getsize(access_log_arg) // SHARD_MAX_SIZE + 1)
+    shards = get_access_log_shards(access_log_arg, shards_number)
+    log.info(PARSING_SHARDS.format(len(shards), workers))
+    parsed_shards = progress.Progress(PARSED_SHARDS, SHARDS_UNIT, len(shards))
+    temporary_folder = tempfile.mkdtemp(dir=path.dirname(path.abspath(index_file_name)))
+    totals = [0, 0, 0, 0]
+    try:
+        shard_files = [(path.join(temporary_folder, SHARD_INDEX_FILE % number), \
+            path.join(temporary_folder, SHARD_CLEAN_FILE % number)) for number in range(len(shards))]
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            shard_results = executor.map(parse_access_log_shard, [(access_log_arg, start, end, shard_index, \
+                shard_clean) for (start, end), (shard_index, shard_clean) in zip(shards, shard_files)])
+            with open(index_file_name, 'w') as index_file, open(clean_file_name, 'w') as clean_file:
+                for number, shard_result in enumerate(shard_results):
+                    if shard_result is None:
+                        executor.shutdown(cancel_futures=True)
+                        totals = None
+                        break
+                    shard_index, shard_clean = shard_files[number]
+                    with open(shard_index) as shard_index_file:
+                        shutil.copyfileobj(shard_index_file, index_file)
+                    with open(shard_clean) as shard_clean_file:
+                        shutil.copyfileobj(shard_clean_file, clean_file)
+                    start, end = shards[number]
+                    line_count, detected_count, undetected_count = shard_result
+                    totals = [totals[0] + line_count, totals[1] + end - start, totals[2] + detected_count, \
+                        totals[3] + undetected_count]
+                    parsed_shards.update(number + 1, number + 1)
+            parsed_shards.done(len(shards))
+    finally:
+        shutil.rmtree(temporary_folder)
+    if totals is None:
+        log.info(RUN_MARKERS_SERIAL)
+        access_log_analysis(access_log_arg, index_file_name, clean_file_name, statistics)
+        return
+
+    statistics.input_lines += totals[0]
+    statistics.bytes_read += totals[1]
+    statistics.attack_lines += totals[2]
+    statistics.clean_lines += totals[3]
+    log.info(ANALYZED_URIS.format(statistics.attack_lines, statistics.clean_lines))
     log.info(ANALYSIS_FILE_LOG_END.format(access_log_arg))
     log.info(FILES_GENERATED.format(index_file_name, clean_file_name))
 
-def error_log_analysis(error_log_arg, index_file_name):
+def error_log_analysis(error_log_arg, index_file_name, statistics):
     """Analyzes the error log file and completes the .index file adding number of attacks
     at the end of the file separated by tabs.
+
+    Error log file is read only once grouping its rule IDs by request ID, then every
+    .index line is completed in a single pass.
     
     :param error_log_arg: error log retrieved from command line
     :type error_log_arg: string
     :param index_file_name: name of the index file name to be created
     :type index_file_name: string
+    :param statistics: statistics where error log lines and bytes read are counted
+    :type statistics: RunStatistics
     """
     log.info(ANALYSIS_FILE_LOG_START.format(error_log_arg))
-    number_of_attacks = log.progress(ADDING_NUMBER_OF_ATTACKS.format(index_file_name))
+    number_of_attacks = progress.Progress(ADDING_NUMBER_OF_ATTACKS.format(index_file_name))
     index_log_cp = get_index_log_compiled_pattern()
-    error_log_cp = get_error_log_compiled_pattern()
+    rule_ids_by_request_id = get_rule_ids_by_request_id(error_log_arg, statistics)
 
-    error_log = open(error_log_arg, encoding='ISO-8859-1', errors='ignore')
-    list_pos = create_list_of_file_pos(error_log)
-    list_length = len(list_pos)
     index_file_count = 1
     for index_line in fileinput.input(index_file_name, inplace=True):
-        number_of_attacks.status("%s" % index_file_count)
-        
+        number_of_attacks.update(index_file_count)
+
         result_index = index_log_cp.search(index_line)
-        request_id = result_index.group('id')
-
-        count_file_idx = 0
-        searching_id = True
-        id_not_changed = True
-        nattacks_line = index_line
-        nattacks_count = 0
-        while count_file_idx < list_length and id_not_changed:
-            error_line = give_file_line_by_pos(error_log, list_pos[count_file_idx])
-            result_error = error_log_cp.search(error_line)
-            if result_error is not None:
-                request_id_error = result_error.group('id')
-                rule_id = result_error.group('rule_id')
-                if request_id  == request_id_error:
-                    nattacks_line = add_string_from_index(nattacks_line, result_index.end(), \
-                        INDEX_NATTACKS_LINE.format(rule_id))
-                    list_pos.pop(count_file_idx)
-                    list_length -= 1
-                    searching_id = False
-                    nattacks_count += 1
-                elif not searching_id:
-                    id_not_changed = False
-                else:
-                    count_file_idx += 1
-            else:
-                list_pos.pop(count_file_idx)
-                list_length -= 1
-        if len(nattacks_line) >= len(index_line):
-            nattacks_line = add_string_from_index(nattacks_line, result_index.end(), \
-                NATTACKS_COUNT.format(nattacks_count))
-            print(nattacks_line, end='')
+        rule_ids = rule_ids_by_request_id.pop(result_index.group('id'), [])
+        print(add_string_from_index(index_line, result_index.end(), get_nattacks_string(rule_ids)), end='')
         index_file_count += 1
     fileinput.close()
-    error_log.close()
+    number_of_attacks.done(index_file_count - 1)
     log.info(ANALYSIS_FILE_LOG_END.format(error_log_arg))
 
+def results_analysis(results_file_name, error_log_arg, index_file_name, clean_file_name, statistics, cache=None):
+    """Creates completed .clean and .index files from the results file written by launcher
+    and the error log file, without reading access log file. Rule IDs of the URIs whose
+    verdict was recovered from the cache are taken from the results file, and the verdicts of
+    the launched URIs are added to the cache if it is indicated. Only verdicts of Nemesida are
+    cached: responses with status 200, and with status 403 whose rule IDs were found in the
+    error log, so errors of the server or blocks whose rule IDs are missing are launched again
+
+    :param results_file_name: results file written by launcher
+    :type results_file_name: string
+    :param error_log_arg: error log retrieved from command line
+    :type error_log_arg: string
+    :param index_file_name: name of the index file name to be created
+    :type index_file_name: string
+    :param clean_file_name: name of the clean file name to be created
+    :type clean_file_name: string
+    :param statistics: statistics where lines and bytes read are counted
+    :type statistics: RunStatistics
+    :param cache: verdict cache where the verdicts of launched URIs are added
+    :type cache: verdict_cache.VerdictCache
+    """
+    log.info(ANALYSIS_FILE_LOG_START.format(results_file_name))
+    rule_ids_by_request_id = get_rule_ids_by_request_id(error_log_arg, statistics)
+    results = read_results_file(results_file_name, statistics)
+    read_results = progress.Progress(READING_FILE.format(results_file_name), total=len(results))
+
+    clean_file = open(clean_file_name, 'w')
+    index_file = open(index_file_name, 'w')
+    detected_count = 0
+    undetected_count = 0
+    for count, (_, status, _, request_id, block_type, timestamp, encoded_uri, cached_rule_ids) \
+        in enumerate(results, 1):
+        read_results.update(count, count)
+        if status == RESULTS_EMPTY_VALUE:
+            continue
+        decoded_uri = parse.unquote(encoded_uri)
+        if cached_rule_ids is not None:
+            rule_ids = verdict_cache.parse_rule_ids(cached_rule_ids)
+        elif status == HTTP_BLOCKED_STATUS:
+            rule_ids = rule_ids_by_request_id.pop(request_id, [])
+        else:
+            rule_ids = []
+        if cache is not None and cached_rule_ids is None and (status == HTTP_OK_STATUS or \
+            status == HTTP_BLOCKED_STATUS and rule_ids):
+            cache.put(encoded_uri, status, block_type, rule_ids)
+        if status == HTTP_BLOCKED_STATUS:
+            index_line = INDEX_FILE_LINE.format(timestamp, decoded_uri, request_id, block_type)
+            index_file.write(add_string_from_index(index_line, len(index_line) - 1, get_nattacks_string(rule_ids)))
+            detected_count += 1
+        else:
+            clean_file.write(CLEAN_FILE_LINE.format(decoded_uri))
+            undetected_count += 1
+    clean_file.close()
+    index_file.close()
+    read_results.done(len(results))
+    log.info(ANALYZED_URIS.format(detected_count, undetected_count))
+    statistics.clean_lines += undetected_count
+    statistics.attack_lines += detected_count
+
+    log.info(ANALYSIS_FILE_LOG_END.format(results_file_name))
+    log.info(FILES_GENERATED.format(index_file_name, clean_file_name))
+
 def main(args):
     """Main function.
     
     Executes analysis for access log and error log adding some log info 
-    before and after the process.
+    before and after the process. If results file written by launcher is indicated
+    it is used instead of access log, and the verdicts of its launched URIs are added to the
+    verdict cache if it is indicated. Statistics of the run are written in a JSON file next to
+    the generated files.
 
     :param args: command-line retrieved arguments
     :type args: ArgumentParser.parse_args()
+
+    :return: statistics of the run
+    :rtype: RunStatistics
     """
-    check_files(args.access_log, args.error_log)
+    results_file_name = getattr(args, RESULTS_VARIABLE_NAME, None)
+    check_files(results_file_name or args.access_log, args.error_log)
     file_identifier = args.id
     index_file_name = ANALYSIS_INDEX_FILE % file_identifier
     clean_file_name = ANALYSIS_CLEAN_NAME % file_identifier
+    statistics_file_name = ANALYSIS_STATISTICS_NAME % file_identifier
+    statistics = RunStatistics()
 
     log.info(INFO_MAIN)
-    access_log_analysis(args.access_log, index_file_name, clean_file_name)
-    error_log_analysis(args.error_log, index_file_name)
+    if results_file_name is not None:
+        cache = verdict_cache.open_cache(args)
+        try:
+            with statistics.stage(results_analysis.__name__):
+                results_analysis(results_file_name, args.error_log, index_file_name, clean_file_name, statistics, \
+                    cache)
+        finally:
+            if cache is not None:
+                cache.close()
+        if cache is not None:
+            log.info(CACHE_FILLED.format(cache.added, cache.file_name))
+    else:
+        if getattr(args, verdict_cache.CACHE_VARIABLE_NAME, None) is not None:
+            log.warn(CACHE_NOT_USED)
+        with statistics.stage(access_log_analysis.__name__):
+            workers = getattr(args, WORKERS_VARIABLE_NAME, None)
+            if workers is not None:
+                parallel_access_log_analysis(args.access_log, index_file_name, clean_file_name, statistics, workers)
+            else:
+                access_log_analysis(args.access_log, index_file_name, clean_file_name, statistics)
+        with statistics.stage(error_log_analysis.__name__):
+            memory = getattr(args, MEMORY_VARIABLE_NAME, None)
+            if memory is not None:
+                external_error_log_analysis(args.error_log, index_file_name, statistics, memory)
+            else:
+                error_log_analysis(args.error_log, index_file_name, statistics)
+    statistics.save(statistics_file_name)
+    log.info(STATISTICS_GENERATED.format(statistics_file_name))
     log.info(END_MAIN)
 
+    return statistics
+
 # =====================================
 # Main
 # =====================================
 if __name__ == "__main__":
     args = init_parser().parse_args()
+    logfiles.set_decompression_thread(args.decompression_thread)
+    progress.set_batch_mode(args.batch)
     main(args)
\ No newline at end of file
@@ -0,0 +1,491 @@
+"""Script that measures the throughput of every stage of the analysis pipeline with
+synthetic files, so runs of different commits can be compared.
+
+Usage: benchmark.py [-h] [-s sizes [sizes ...]] [-st stages [stages ...]]
+                    [-bl blocked_ratio] [-rr rules_per_request] [-n repeats]
+                    [-sd seed] [-d folder] [-o output] [-cmp previous] [-b]
+
+optional arguments:
+  -h, --help            show this help message and exit
+  -s sizes [sizes ...]  Number of requests of every set of synthetic files,
+                        one measure of every stage is done for each one. By
+                        default: 10000 100000 1000000
+  -st stages [stages ...]
+                        Stages measured, the stages they depend on are run
+                        without being measured. By default all of them:
+                        generator access_log_analysis error_log_analysis
+                        compare_access_log_and_index
+  -bl blocked_ratio     Ratio of requests blocked by Nemesida, between 0 and
+                        1. By default: 0.6
+  -rr rules_per_request
+                        Mean number of rule IDs written in the error log for
+                        every blocked request, at least 1. By default: 1.5
+  -n repeats            Times every stage is measured, the fastest measure is
+                        kept. By default: 1
+  -sd seed              Seed of the synthetic files, the same seed and sizes
+                        generate the same files. By default: 1
+  -d folder             Folder where synthetic and analysis files are written
+                        and kept. By default a temporary folder is created in
+                        the current one and removed at the end
+  -o output             JSON file where the results are written. By default:
+                        benchmark-${current_timestamp}.json
+  -cmp previous         JSON file written by a previous run, the throughput of
+                        every stage is compared with it
+  -b                    Batch mode, progress of the analysis is not shown. It
+                        is not shown either when the output is not a terminal
+
+Author: Carlos Cagigao Bravo
+"""
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+import json
+from logger import log
+import multiprocessing
+import os
+import os.path as path
+import platform
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import analyzer
+import comparer
+import generator
+import progress
+import waf_stub
+
+# =====================================
+# Constant variables
+# =====================================
+DESCRIPTION = "Script that measures the throughput of every stage of the analysis pipeline with synthetic \
+access log, error log and -raw.uri files, writing the results in a JSON file so runs of different commits \
+can be compared"
+
+GENERATOR_STAGE = "generator"
+ACCESS_LOG_STAGE = "access_log_analysis"
+ERROR_LOG_STAGE = "error_log_analysis"
+COMPARISON_STAGE = "compare_access_log_and_index"
+STAGES = [GENERATOR_STAGE, ACCESS_LOG_STAGE, ERROR_LOG_STAGE, COMPARISON_STAGE]
+STAGE_REQUIREMENTS = {ERROR_LOG_STAGE: [ACCESS_LOG_STAGE], COMPARISON_STAGE: [ACCESS_LOG_STAGE]}
+
+SIZES_ARG = "-s"
+SIZES_DEFAULT = [10000, 100000, 1000000]
+SIZES_HELP = "Number of requests of every set of synthetic files, one measure of every stage is done for \
+each one. By default: %s" % " ".join(str(size) for size in SIZES_DEFAULT)
+SIZES_VARIABLE_NAME = "sizes"
+
+STAGES_ARG = "-st"
+STAGES_HELP = "Stages measured, the stages they depend on are run without being measured. By default all of \
+them: %s" % " ".join(STAGES)
+STAGES_VARIABLE_NAME = "stages"
+
+BLOCKED_RATIO_ARG = "-bl"
+BLOCKED_RATIO_DEFAULT = 0.6
+BLOCKED_RATIO_HELP = "Ratio of requests blocked by Nemesida, between 0 and 1. By default: %s" \
+    % BLOCKED_RATIO_DEFAULT
+BLOCKED_RATIO_VARIABLE_NAME = "blocked_ratio"
+
+RULES_PER_REQUEST_ARG = "-rr"
+RULES_PER_REQUEST_DEFAULT = 1.5
+RULES_PER_REQUEST_HELP = "Mean number of rule IDs written in the error log for every blocked request, at \
+least 1. By default: %s" % RULES_PER_REQUEST_DEFAULT
+RULES_PER_REQUEST_VARIABLE_NAME = "rules_per_request"
+
+REPEATS_ARG = "-n"
+REPEATS_DEFAULT = 1
+REPEATS_HELP = "Times every stage is measured, the fastest measure is kept. By default: %s" % REPEATS_DEFAULT
+REPEATS_VARIABLE_NAME = "repeats"
+
+SEED_ARG = "-sd"
+SEED_DEFAULT = 1
+SEED_HELP = "Seed of the synthetic files, the same seed and sizes generate the same files. By default: %s" \
+    % SEED_DEFAULT
+SEED_VARIABLE_NAME = "seed"
+
+FOLDER_ARG = "-d"
+FOLDER_HELP = "Folder where synthetic and analysis files are written and kept. By default a temporary folder \
+is created in the current one and removed at the end"
+FOLDER_VARIABLE_NAME = "folder"
+
+OUTPUT_ARG = "-o"
+OUTPUT_DEFAULT = "benchmark-%s.json" % int(datetime.timestamp(datetime.now()))
+OUTPUT_HELP = "JSON file where the results are written. By default: %s" % OUTPUT_DEFAULT
+OUTPUT_VARIABLE_NAME = "output"
+
+PREVIOUS_ARG = "-cmp"
+PREVIOUS_HELP = "JSON file written by a previous run, the throughput of every stage is compared with it"
+PREVIOUS_VARIABLE_NAME = "previous"
+
+LOG_INFO_MAIN = "Benchmarking stages {} with {} requests"
+LOG_INFO_SYNTHESIS = "Synthetic files of {} requests written in {:.2f} s: {}"
+LOG_INFO_STAGE = "{:<30} {:>10} lines {:>9.3f} s {:>12.0f} lines/s {:>8.1f} MB/s {:>8.1f} MB peak RSS"
+LOG_INFO_COMPARISON = "{:<30} {:>10} lines {:>12.0f} lines/s before, {:>12.0f} now: x{:.2f}"
+LOG_INFO_END = "Results written in {}"
+SYNTHESIZING = "Writing synthetic files of {} requests"
+INVALID_SIZE_ERROR = "Number of requests must be greater than 0"
+INVALID_BLOCKED_RATIO_ERROR = "Ratio of blocked requests must be between 0 and 1"
+INVALID_RULES_PER_REQUEST_ERROR = "Mean number of rule IDs per blocked request must be at least 1"
+INVALID_REPEATS_ERROR = "Times every stage is measured must be greater than 0"
+FILE_NOT_EXISTS_ERROR = "File %s does not exist"
+
+RAW_FILE = "benchmark-raw.uri"
+URI_FILE = "benchmark.uri"
+ACCESS_LOG_FILE = "access.log"
+ERROR_LOG_FILE = "error.log"
+INDEX_FILE = "analysis-benchmark.index"
+CLEAN_FILE = "analysis-benchmark.clean"
+ATTACKS_FILE = "analysis-benchmark.attacks"
+FILE_PREFIX = "benchmark-"
+
+RAW_FILE_LINE = "{} {}\n"
+CLEAN_URIS = ["/index.php?page={}", "/static/js/app.js?v={}", "/api/v1/items/{}?sort=name&order=asc", \
+    "/search?q=product%20{}&lang=en"]
+ATTACK_URIS = ["/files/{}/..%2F..%2F..%2Fetc%2Fpasswd", "/item.php?id={}%27%20or%201=1%20--%20", \
+    "/news?id={}%20union%20select%20user,password%20from%20users", "/comment?text=%3Cscript%3Ealert({})%3C/script%3E", \
+    "/cgi-bin/run?cmd={};cat%20/etc/passwd"]
+RULE_IDS = [rule_id for rule_id, pattern in waf_stub.DEFAULT_RULES]
+CLIENT = "172.17.0.1"
+USER_AGENT = "Python-urllib/3.9"
+REQUEST_LINE = "GET {} HTTP/1.1"
+HTTP_BLOCKED_STATUS = 403
+HTTP_OK_STATUS = 200
+RESPONSE_SIZE = 162
+FIRST_SECOND = 1633017805
+REQUESTS_PER_SECOND = 1000
+WRITE_BATCH = 10000
+REQUEST_ID_FORMAT = "%032x"
+REQUEST_ID_BITS = 128
+ISO_8859_1 = "ISO-8859-1"
+MEGABYTE = 1024 * 1024
+RSS_UNIT = 1 if sys.platform == "darwin" else 1024
+
+# =====================================
+# Functions
+# =====================================
+def init_parser():
+    """Retrieves the parameters with which it has been executed
+
+    :rtype: ArgumentParser
+    :return: arguments prepared to be parsed
+    """
+    parser = argparse.ArgumentParser(description=DESCRIPTION)
+    add_optional_arguments(parser)
+    progress.add_optional_arguments(parser)
+    return parser
+
+def add_optional_arguments(parser):
+    """Add optional arguments to parser
+
+    :param parser: parser to add arguments
+    :type parser: ArgumentParser
+    """
+    parser.add_argument(SIZES_ARG, help=SIZES_HELP, default=SIZES_DEFAULT, metavar=SIZES_VARIABLE_NAME, \
+        dest=SIZES_VARIABLE_NAME, type=int, nargs='+')
+    parser.add_argument(STAGES_ARG, help=STAGES_HELP, default=STAGES, metavar=STAGES_VARIABLE_NAME, \
+        dest=STAGES_VARIABLE_NAME, choices=STAGES, nargs='+')
+    parser.add_argument(BLOCKED_RATIO_ARG, help=BLOCKED_RATIO_HELP, default=BLOCKED_RATIO_DEFAULT, \
+        metavar=BLOCKED_RATIO_VARIABLE_NAME, dest=BLOCKED_RATIO_VARIABLE_NAME, type=float)
+    parser.add_argument(RULES_PER_REQUEST_ARG, help=RULES_PER_REQUEST_HELP, default=RULES_PER_REQUEST_DEFAULT, \
+        metavar=RULES_PER_REQUEST_VARIABLE_NAME, dest=RULES_PER_REQUEST_VARIABLE_NAME, type=float)
+    parser.add_argument(REPEATS_ARG, help=REPEATS_HELP, default=REPEATS_DEFAULT, metavar=REPEATS_VARIABLE_NAME, \
+        dest=REPEATS_VARIABLE_NAME, type=int)
+    parser.add_argument(SEED_ARG, help=SEED_HELP, default=SEED_DEFAULT, metavar=SEED_VARIABLE_NAME, \
+        dest=SEED_VARIABLE_NAME, type=int)
+    parser.add_argument(FOLDER_ARG, help=FOLDER_HELP, metavar=FOLDER_VARIABLE_NAME, dest=FOLDER_VARIABLE_NAME)
+    parser.add_argument(OUTPUT_ARG, help=OUTPUT_HELP, default=OUTPUT_DEFAULT, metavar=OUTPUT_VARIABLE_NAME, \
+        dest=OUTPUT_VARIABLE_NAME)
+    parser.add_argument(PREVIOUS_ARG, help=PREVIOUS_HELP, metavar=PREVIOUS_VARIABLE_NAME, \
+        dest=PREVIOUS_VARIABLE_NAME)
+
+def check_arguments(args):
+    """Checks the values of the arguments
+
+    :param args: command-line retrieved arguments
+    :type args: ArgumentParser.parse_args()
+
+    :raises LogError: if a value is not valid
+    """
+    if min(args.sizes) < 1:
+        log.error(INVALID_SIZE_ERROR)
+    if not 0 <= args.blocked_ratio <= 1:
+        log.error(INVALID_BLOCKED_RATIO_ERROR)
+    if args.rules_per_request < 1:
+        log.error(INVALID_RULES_PER_REQUEST_ERROR)
+    if args.repeats < 1:
+        log.error(INVALID_REPEATS_ERROR)
+    if args.previous is not None and not path.isfile(args.previous):
+        log.error(FILE_NOT_EXISTS_ERROR % args.previous)
+
+def get_rule_ids_count(rules_per_request):
+    """Gets a random number of rule IDs of a blocked request, following a geometric
+    distribution whose mean is the indicated one
+
+    :param rules_per_request: mean number of rule IDs, at least 1
+    :type rules_per_request: float
+
+    :return: number of rule IDs
+    :rtype: int
+    """
+    extra_probability = 1 - 1 / rules_per_request
+    count = 1
+    while random.random() < extra_probability:
+        count += 1
+    return count
+
+def synthesize_files(folder, requests, blocked_ratio, rules_per_request, seed):
+    """Writes -raw.uri, access log and error log files of a run of the indicated number of
+    requests, in the formats read by generator, analyzer and comparer. Error log lines of
+    a request are written before its access log line, as Nemesida does
+
+    :param folder: folder where the files are written
+    :type folder: string
+    :param requests: number of requests
+    :type requests: int
+    :param blocked_ratio: ratio of blocked requests
+    :type blocked_ratio: float
+    :param rules_per_request: mean number of rule IDs of every blocked request
+    :type rules_per_request: float
+    :param seed: seed of the random values
+    :type seed: int
+
+    :return: number of lines and bytes of every file by name
+    :rtype: dict
+    """
+    random.seed(seed)
+    written_lines = progress.Progress(SYNTHESIZING.format(requests), progress.REQUESTS, requests)
+    last_second = None
+    raw_lines, access_log_lines, error_log_lines = list(), list(), list()
+    sizes = {name: [0, 0] for name in (RAW_FILE, ACCESS_LOG_FILE, ERROR_LOG_FILE)}
+    with open(path.join(folder, RAW_FILE), 'w', encoding=ISO_8859_1) as raw_file, \
+        open(path.join(folder, ACCESS_LOG_FILE), 'w', encoding=ISO_8859_1) as access_log, \
+        open(path.join(folder, ERROR_LOG_FILE), 'w', encoding=ISO_8859_1) as error_log:
+        files = {RAW_FILE: (raw_file, raw_lines), ACCESS_LOG_FILE: (access_log, access_log_lines), \
+            ERROR_LOG_FILE: (error_log, error_log_lines)}
+        for number in range(1, requests + 1):
+            second = FIRST_SECOND + number // REQUESTS_PER_SECOND
+            if second != last_second:
+                last_second = second
+                utc_time = time.gmtime(second)
+                access_log_timestamp = time.strftime(waf_stub.ACCESS_LOG_TIMESTAMP_FORMAT, utc_time)
+                error_log_timestamp = time.strftime(waf_stub.ERROR_LOG_TIMESTAMP_FORMAT, utc_time)
+            request_id = REQUEST_ID_FORMAT % random.getrandbits(REQUEST_ID_BITS)
+            blocked = random.random() < blocked_ratio
+            uri = random.choice(ATTACK_URIS if blocked else CLEAN_URIS).format(number)
+            request_line = REQUEST_LINE.format(uri)
+            raw_lines.append(RAW_FILE_LINE.format(len(uri), uri))
+            if blocked:
+                for rule_number in range(get_rule_ids_count(rules_per_request)):
+                    error_log_lines.append(waf_stub.ERROR_LOG_LINE.format(error_log_timestamp, 1, 1, number, \
+                        request_id, random.choice(RULE_IDS), CLIENT, request_line))
+            access_log_lines.append(waf_stub.ACCESS_LOG_LINE.format(CLIENT, access_log_timestamp, \
+                request_line, HTTP_BLOCKED_STATUS if blocked else HTTP_OK_STATUS, RESPONSE_SIZE, USER_AGENT, \
+                request_id, waf_stub.BLOCKED_TYPE if blocked else waf_stub.NOT_BLOCKED_TYPE))
+            if number % WRITE_BATCH == 0 or number == requests:
+                for name, (file, lines) in files.items():
+                    data = "".join(lines)
+                    file.write(data)
+                    sizes[name][0] += len(lines)
+                    sizes[name][1] += len(data)
+                    lines.clear()
+                written_lines.update(number)
+        written_lines.done(requests)
+    return {name: {"lines": lines, "bytes": size} for name, (lines, size) in sizes.items()}
+
+def get_peak_rss():
+    """Gets the peak resident set size of the current process
+
+    :return: peak resident set size in kilobytes
+    :rtype: int
+    """
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * RSS_UNIT // 1024
+
+def run_stage(stage, folder):
+    """Runs a stage over the files of the folder, measuring its time. It is run in a new
+    process, so the peak resident set size is the one of the stage
+
+    :param stage: name of the stage
+    :type stage: string
+    :param folder: folder with the synthetic files
+    :type folder: string
+
+    :return: seconds spent and peak resident set size in kilobytes
+    :rtype: tuple
+    """
+    os.chdir(folder)
+    progress.set_batch_mode(True)
+    log.output = open(os.devnull, 'w')
+    log.terminal = False
+    statistics = analyzer.RunStatistics()
+    start_time = time.perf_counter()
+    if stage == GENERATOR_STAGE:
+        generator.main(argparse.Namespace(input=RAW_FILE, output=URI_FILE))
+    elif stage == ACCESS_LOG_STAGE:
+        analyzer.access_log_analysis(ACCESS_LOG_FILE, INDEX_FILE, CLEAN_FILE, statistics)
+    elif stage == ERROR_LOG_STAGE:
+        analyzer.error_log_analysis(ERROR_LOG_FILE, INDEX_FILE, statistics)
+    else:
+        comparer.compare_access_log_and_index(ACCESS_LOG_FILE, INDEX_FILE, open(ATTACKS_FILE, 'w'), statistics)
+    return time.perf_counter() - start_time, get_peak_rss()
+
+def get_stages_to_run(stages):
+    """Gets the stages to run in pipeline order, adding the ones the measured stages depend on
+
+    :param stages: measured stages
+    :type stages: list
+
+    :return: stages to run
+    :rtype: list
+    """
+    required_stages = set(stages)
+    for stage in stages:
+        required_stages.update(STAGE_REQUIREMENTS.get(stage, []))
+    return [stage for stage in STAGES if stage in required_stages]
+
+def get_stage_input(stage, file_sizes):
+    """Gets the lines and bytes of the main input of a stage
+
+    :param stage: name of the stage
+    :type stage: string
+    :param file_sizes: number of lines and bytes of every synthetic file by name
+    :type file_sizes: dict
+
+    :return: number of lines and bytes
+    :rtype: dict
+    """
+    if stage == GENERATOR_STAGE:
+        return file_sizes[RAW_FILE]
+    if stage == ERROR_LOG_STAGE:
+        return file_sizes[ERROR_LOG_FILE]
+    return file_sizes[ACCESS_LOG_FILE]
+
+def benchmark_size(folder, requests, args):
+    """Writes the synthetic files of a number of requests and measures the stages with them
+
+    :param folder: folder where the files are written
+    :type folder: string
+    :param requests: number of requests
+    :type requests: int
+    :param args: command-line retrieved arguments
+    :type args: ArgumentParser.parse_args()
+
+    :return: time spent writing the synthetic files and measures of every stage by name
+    :rtype: tuple
+    """
+    start_time = time.perf_counter()
+    file_sizes = synthesize_files(folder, requests, args.blocked_ratio, args.rules_per_request, args.seed)
+    synthesis = {"requests": requests, "seconds": time.perf_counter() - start_time, "files": file_sizes}
+    log.info(LOG_INFO_SYNTHESIS.format(requests, synthesis["seconds"], \
+        ", ".join("%s %s lines" % (name, sizes["lines"]) for name, sizes in file_sizes.items())))
+
+    measures = dict()
+    context = multiprocessing.get_context("spawn")
+    for repeat in range(args.repeats):
+        for stage in get_stages_to_run(args.stages):
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                seconds, peak_rss = executor.submit(run_stage, stage, folder).result()
+            if stage in args.stages and (stage not in measures or seconds < measures[stage]["seconds"]):
+                measures[stage] = {"seconds": seconds, "peak_rss_kb": peak_rss}
+
+    for stage, measure in measures.items():
+        stage_input = get_stage_input(stage, file_sizes)
+        measure.update({"requests": requests, "lines": stage_input["lines"], "bytes": stage_input["bytes"]})
+        measure["lines_per_second"] = measure["lines"] / measure["seconds"]
+        measure["bytes_per_second"] = measure["bytes"] / measure["seconds"]
+        log.info(LOG_INFO_STAGE.format(stage, measure["lines"], measure["seconds"], measure["lines_per_second"], \
+            measure["bytes_per_second"] / MEGABYTE, measure["peak_rss_kb"] / 1024))
+    return synthesis, measures
+
+def get_git_revision():
+    """Gets the commit of the repository where the scripts are
+
+    :return: commit hash and if there are uncommitted changes, None if it is not a git repository
+    :rtype: tuple
+    """
+    folder = path.dirname(path.abspath(__file__))
+    try:
+        revision = subprocess.run(["git", "rev-parse", "HEAD"], cwd=folder, capture_output=True, text=True, \
+            check=True).stdout.strip()
+        changes = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=folder, \
+            capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None, None
+    return revision, bool(changes)
+
+def compare_results(previous_file_name, results):
+    """Writes the throughput of every stage before and now for the sizes measured in both runs
+
+    :param previous_file_name: JSON file written by a previous run
+    :type previous_file_name: string
+    :param results: measures of every stage by name, a list with one measure for every size
+    :type results: dict
+    """
+    with open(previous_file_name) as previous_file:
+        previous_results = json.load(previous_file)["results"]
+    for stage, measures in results.items():
+        previous_measures = {measure["requests"]: measure for measure in previous_results.get(stage, [])}
+        for measure in measures:
+            previous_measure = previous_measures.get(measure["requests"])
+            if previous_measure is not None:
+                log.info(LOG_INFO_COMPARISON.format(stage, measure["lines"], previous_measure["lines_per_second"], \
+                    measure["lines_per_second"], measure["lines_per_second"] / previous_measure["lines_per_second"]))
+
+def main(args):
+    """Main function.
+
+    Writes synthetic files for every size and measures every stage in a new process with them,
+    from the smallest size to the greatest one, so the measures make a scaling curve. Results
+    are written in a JSON file with the commit of the scripts and compared with a previous
+    run if indicated
+
+    :param args: command-line retrieved arguments
+    :type args: ArgumentParser.parse_args()
+
+    :raises LogError: if an argument is not valid
+    """
+    check_arguments(args)
+    log.info(LOG_INFO_MAIN.format(", ".join(args.stages), ", ".join(str(size) for size in sorted(args.sizes))))
+    folder = args.folder or tempfile.mkdtemp(prefix=FILE_PREFIX, dir=os.getcwd())
+    os.makedirs(folder, exist_ok=True)
+    folder = path.abspath(folder)
+    synthesis = list()
+    results = {stage: list() for stage in STAGES if stage in args.stages}
+    try:
+        for requests in sorted(args.sizes):
+            size_synthesis, measures = benchmark_size(folder, requests, args)
+            synthesis.append(size_synthesis)
+            for stage, measure in measures.items():
+                results[stage].append(measure)
+    finally:
+        if args.folder is None:
+            shutil.rmtree(folder)
+
+    revision, uncommitted_changes = get_git_revision()
+    with open(args.output, 'w') as output_file:
+        json.dump({
+            "commit": revision,
+            "uncommitted_changes": uncommitted_changes,
+            "date": datetime.now().isoformat(timespec='seconds'),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "parameters": {"blocked_ratio": args.blocked_ratio, "rules_per_request": args.rules_per_request, \
+                "repeats": args.repeats, "seed": args.seed},
+            "synthesis": synthesis,
+            "results": results
+        }, output_file, indent=4)
+    if args.previous is not None:
+        compare_results(args.previous, results)
+    log.info(LOG_INFO_END.format(args.output))
+
+# =====================================
+# Main
+# =====================================
+if __name__ == "__main__":
+    args = init_parser().parse_args()
+    progress.set_batch_mode(args.batch)
+    main(args)
@@ -0,0 +1,656 @@
+"""Script that converts .index and .attacks files of an analysis run to a compact binary columnar
+file, analysis-'id'.columns, and back to the same text files. The columnar file is memory mapped,
+so its rows are read by position or packet number without parsing any line.
+
+Usage: columnar.py [-h] [-t folder] [-p packets [packets ...]] [-b] -id id
+
+optional arguments:
+  -h, --help            show this help message and exit
+  -t folder             Writes .index and .attacks files of the columnar file
+                        in the indicated folder, identical to the files it was
+                        converted from. By default the columnar file is
+                        written from .index and .attacks files
+  -p packets [packets ...]
+                        Shows the .attacks lines of the indicated packets,
+                        read from the columnar file
+  -b                    Batch mode, progress of the analysis is not shown. It
+                        is not shown either when the output is not a terminal
+
+required arguments:
+  -id id                Numeric value added to idenfity generated files
+
+Author: Carlos Cagigao Bravo
+"""
+
+import argparse
+import array
+import bisect
+import calendar
+from logger import log
+import mmap
+import os.path as path
+import re
+import struct
+import sys
+import time
+import analyzer
+import comparer
+import progress
+
+# =====================================
+# Constant variables
+# =====================================
+DESCRIPTION = "Script that converts .index and .attacks files of an analysis run to a compact binary columnar \
+file, analysis-'id'.columns, and back to the same text files. The columnar file is memory mapped, so its rows are \
+read by position or packet number without parsing any line"
+REQUIRED_ARGS = "required arguments"
+
+IDENTIFIER_ARG = "-id"
+IDENTIFIER_HELP = "Numeric value added to idenfity generated files"
+IDENTIFIER_VARIABLE_NAME = "id"
+
+TEXT_ARG = "-t"
+TEXT_HELP = "Writes .index and .attacks files of the columnar file in the indicated folder, identical to the \
+files it was converted from. By default the columnar file is written from .index and .attacks files"
+TEXT_VARIABLE_NAME = "folder"
+
+PACKETS_ARG = "-p"
+PACKETS_HELP = "Shows the .attacks lines of the indicated packets, read from the columnar file"
+PACKETS_VARIABLE_NAME = "packets"
+
+COLUMNAR_ARG = "-cl"
+COLUMNAR_HELP = "Writes also analysis-'id'.columns, a binary columnar file of .index and .attacks files whose \
+rows are read by packet number without parsing them. It is converted back to text with columnar.py"
+COLUMNAR_VARIABLE_NAME = "columnar"
+
+LOG_INFO_WRITE = "Converting {} and {} to columnar file {}"
+LOG_INFO_WRITTEN = "File {} written: {} rows in {} bytes, {} bytes of text files"
+LOG_INFO_TEXT = "Writing text files of columnar file {}"
+LOG_INFO_TEXT_WRITTEN = "File {} written"
+PACKET_NOT_FOUND = "Packet {} is not in {}"
+CONVERTING_ROWS = "Converting rows of {}"
+FILE_NOT_EXISTS_ERROR = "File %s does not exist"
+FOLDER_NOT_EXISTS_ERROR = "Folder %s does not exist"
+LINE_NOT_SUPPORTED_ERROR = "Line {} of {} can not be converted without loss: {}"
+ATTACKS_NOT_IN_INDEX_ERROR = "Line {} of {} is not in {} in the same order"
+NOT_COLUMNAR_ERROR = "File {} is not a columnar file of version {}"
+BYTE_ORDER_ERROR = "File {} was written in a machine with a different byte order"
+
+COLUMNAR_EXT = "columns"
+MAGIC = b"NWAFCOL\x00"
+VERSION = 2
+HAS_INDEX = 1
+HAS_ATTACKS = 2
+BIG_ENDIAN = 4
+HEADER = struct.Struct("<8sHHIQQQQ")
+SECTION = struct.Struct("<QQ")
+ALIGNMENT = 8
+SECTIONS = ("packets", "timestamps", "time_offsets", "block_types", "request_ids", "rule_offsets", "rule_ids", \
+    "uri_offsets", "uris", "packet_rows", "text_id_rows", "text_id_offsets", "text_ids")
+SECTIONS_BY_VERSION = {1: 10, 2: 13}
+TYPECODES = {
+    "packets": 'I',
+    "timestamps": 'q',
+    "time_offsets": 'h',
+    "block_types": 'B',
+    "request_ids": 'B',
+    "rule_offsets": 'Q',
+    "rule_ids": 'I',
+    "uri_offsets": 'Q',
+    "uris": 'B',
+    "packet_rows": 'I',
+    "text_id_rows": 'I',
+    "text_id_offsets": 'Q',
+    "text_ids": 'B'
+}
+REQUEST_ID_SIZE = 16
+MAX_UINT32 = 2 ** 32 - 1
+TIMESTAMP_UNKNOWN = -2 ** 63
+PACKET_UNKNOWN = 0
+
+TIMESTAMP_CP = re.compile(r'^\[(?P<day>\d{2})/(?P<month>\w{3})/(?P<year>\d{4}):(?P<hour>\d{2}):(?P<minute>\d{2}):'
+    r'(?P<second>\d{2}) (?P<sign>[+-])(?P<offset_hours>\d{2})(?P<offset_minutes>\d{2})\]$')
+ROW_DATA_CP = re.compile(
+    r'^Uri \[(?P<uri>.*)\]\t'
+    r'RequestID \[(?P<id>[^\t\]]*)\]\t'
+    r'BT \[(?P<bt>\d)\]\t'
+    r'Nattacks \[\d+\](?P<rule_ids>(\t\[\d+\])*)\n$'
+)
+ATTACKS_LINE_CP = re.compile(r'^Packet \[(?P<packet>[1-9]\d*)\]\t')
+ATTACKS_HEADER_CP = re.compile(r'^\[(?P<input>\d+)\] input, \[(?P<clean>\d+)\] clean, \[(?P<attacks>\d+)\] attacks$', \
+    re.MULTILINE)
+RULE_ID_CP = re.compile(r'\[(\d+)\]')
+HEX_REQUEST_ID_CP = re.compile(r'^[0-9a-f]{32}$')
+MONTHS = ("Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec")
+TIMESTAMP_FORMAT = "[{:02d}/{}/{:04d}:{:02d}:{:02d}:{:02d} {}{:02d}{:02d}]"
+TIMESTAMP_END = "]\t"
+HEADER_LINES = 3
+ISO_8859_1 = "ISO-8859-1"
+
+# =====================================
+# Classes
+# =====================================
+class ColumnarFile:
+    """Columnar file of an analysis run memory mapped for reading.
+
+    Every column is a fixed width array of the rows in .index file order: packet number (0 if
+    it is not in .attacks file), timestamp in seconds since epoch and its UTC offset in minutes,
+    block type and request ID in 16 bytes. Rule IDs and URIs are packed one after another, the
+    ones of a row start at the offset of the row and end at the offset of the next one. Packet
+    rows table has the row plus one of every packet number, 0 for the packets that are not
+    attacks, so rows are found by packet number in constant time. Request IDs that are not 32
+    hexadecimal digits, as the ones of cached verdicts, are packed as text of the rows listed in
+    text ID rows table, and their 16 bytes are zeros. Files of version 1 do not have these tables
+    """
+
+    def __init__(self, file_name):
+        """Maps the file and casts every section to a memoryview of its type, without copying it
+
+        :param file_name: name of the columnar file
+        :type file_name: string
+
+        :raises LogError: if the file does not exist, is not a columnar file or was written with other byte order
+        """
+        self.file_name = file_name
+        if not path.isfile(file_name):
+            log.error(FILE_NOT_EXISTS_ERROR % file_name)
+        self.file = open(file_name, 'rb')
+        try:
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, version, self.flags, _, self.rows, self.input_lines, self.clean_lines, self.attack_lines = \
+                HEADER.unpack_from(self.map)
+        except (ValueError, struct.error):
+            self.file.close()
+            log.error(NOT_COLUMNAR_ERROR.format(file_name, VERSION))
+        if magic != MAGIC or version not in SECTIONS_BY_VERSION:
+            self.close()
+            log.error(NOT_COLUMNAR_ERROR.format(file_name, VERSION))
+        if bool(self.flags & BIG_ENDIAN) != (sys.byteorder == 'big'):
+            self.close()
+            log.error(BYTE_ORDER_ERROR.format(file_name))
+
+        self.view = memoryview(self.map)
+        self.columns = list()
+        for number, name in enumerate(SECTIONS):
+            offset = size = 0
+            if number < SECTIONS_BY_VERSION[version]:
+                offset, size = SECTION.unpack_from(self.map, HEADER.size + number * SECTION.size)
+            column = self.view[offset:offset + size].cast(TYPECODES[name])
+            setattr(self, name, column)
+            self.columns.append(column)
+
+    def __len__(self):
+        return self.rows
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        self.close()
+
+    def close(self):
+        """Releases the views of the columns before closing the map, which can not be closed while they exist"""
+        for column in getattr(self, 'columns', []):
+            column.release()
+        if hasattr(self, 'view'):
+            self.view.release()
+        self.map.close()
+        self.file.close()
+
+    def has_index(self):
+        return bool(self.flags & HAS_INDEX)
+
+    def has_attacks(self):
+        return bool(self.flags & HAS_ATTACKS)
+
+    def find_packet(self, packet):
+        """Finds the row of a packet number in the packet rows table
+
+        :param packet: packet number
+        :type packet: int
+
+        :return: row of the packet, None if it is not an attack
+        :rtype: int
+        """
+        if 0 < packet < len(self.packet_rows) and self.packet_rows[packet] != 0:
+            return self.packet_rows[packet] - 1
+        return None
+
+    def get_uri(self, row):
+        return self.uris[self.uri_offsets[row]:self.uri_offsets[row + 1]].tobytes().decode(ISO_8859_1)
+
+    def get_request_id(self, row):
+        """Gets the request ID of a row from its 16 bytes, or from its text if it is in text ID rows table
+
+        :param row: row number
+        :type row: int
+
+        :rtype: string
+        """
+        text_id = bisect.bisect_left(self.text_id_rows, row)
+        if text_id < len(self.text_id_rows) and self.text_id_rows[text_id] == row:
+            return self.text_ids[self.text_id_offsets[text_id]:self.text_id_offsets[text_id + 1]].tobytes() \
+                .decode(ISO_8859_1)
+        return self.request_ids[row * REQUEST_ID_SIZE:(row + 1) * REQUEST_ID_SIZE].hex()
+
+    def get_rule_ids(self, row):
+        return [str(rule_id) for rule_id in self.rule_ids[self.rule_offsets[row]:self.rule_offsets[row + 1]]]
+
+    def get_timestamp(self, row):
+        """Gets the timestamp of a row as it is written in .index file
+
+        :param row: row number
+        :type row: int
+
+        :return: timestamp between brackets, None if .index file was not converted
+        :rtype: string
+        """
+        if self.timestamps[row] == TIMESTAMP_UNKNOWN:
+            return None
+        return format_timestamp(self.timestamps[row], self.time_offsets[row])
+
+    def get_row(self, row):
+        """Gets the fields of a row, as store.read_attack_rows does from the text files
+
+        :param row: row number
+        :type row: int
+
+        :return: packet (None if it is not in .attacks file), timestamp, URI, request ID, block type and rule IDs
+        :rtype: tuple
+        """
+        packet = self.packets[row]
+        return packet if packet != PACKET_UNKNOWN else None, self.get_timestamp(row), self.get_uri(row), \
+            self.get_request_id(row), self.block_types[row], self.get_rule_ids(row)
+
+    def read_rows(self):
+        """Reads every row in .index file order
+
+        :return: generator of rows returned by get_row
+        :rtype: generator
+        """
+        for row in range(self.rows):
+            yield self.get_row(row)
+
+    def get_row_data(self, row):
+        """Gets a line of .index file of a row without its timestamp, which is also the end of its
+        .attacks line
+
+        :param row: row number
+        :type row: int
+
+        :rtype: string
+        """
+        return format_row_data(self.get_uri(row), self.get_request_id(row), self.block_types[row], \
+            self.get_rule_ids(row))
+
+    def get_index_line(self, row):
+        return self.get_timestamp(row) + "\t" + self.get_row_data(row)
+
+    def get_attacks_line(self, row):
+        return comparer.PACKET_DATA.format(self.packets[row]) + self.get_row_data(row)
+
+# =====================================
+# Functions
+# =====================================
+def init_parser():
+    """Retrieves the parameters with which it has been executed
+
+    :rtype: ArgumentParser
+    :return: arguments prepared to be parsed
+    """
+    parser = argparse.ArgumentParser(description=DESCRIPTION)
+    required_arguments = parser.add_argument_group(REQUIRED_ARGS)
+    parser.add_argument(TEXT_ARG, help=TEXT_HELP, metavar=TEXT_VARIABLE_NAME, dest=TEXT_VARIABLE_NAME)
+    parser.add_argument(PACKETS_ARG, help=PACKETS_HELP, metavar=PACKETS_VARIABLE_NAME, \
+        dest=PACKETS_VARIABLE_NAME, type=int, nargs='+')
+    progress.add_optional_arguments(parser)
+    required_arguments.add_argument(IDENTIFIER_ARG, help=IDENTIFIER_HELP, dest=IDENTIFIER_VARIABLE_NAME, \
+        metavar=IDENTIFIER_VARIABLE_NAME, type=int, required=True)
+    return parser
+
+def add_optional_arguments(parser):
+    """Add optional arguments to parser
+
+    :param parser: parser to add arguments
+    :type parser: ArgumentParser
+    """
+    parser.add_argument(COLUMNAR_ARG, help=COLUMNAR_HELP, dest=COLUMNAR_VARIABLE_NAME, action='store_true')
+
+def parse_timestamp(timestamp):
+    """Gets the seconds since epoch and the UTC offset of a timestamp of .index file
+
+    :param timestamp: timestamp between brackets
+    :type timestamp: string
+
+    :return: seconds since epoch and UTC offset in minutes, None if the timestamp is not valid
+    :rtype: tuple
+
+    Example:
+        '[18/Oct/2026:14:44:59 +0200]' => (1792248299, 120)
+    """
+    result = TIMESTAMP_CP.match(timestamp)
+    if result is None or result.group('month') not in MONTHS:
+        return None
+    offset = int(result.group('offset_hours')) * 60 + int(result.group('offset_minutes'))
+    if result.group('sign') == '-':
+        offset = -offset
+    seconds = calendar.timegm((int(result.group('year')), MONTHS.index(result.group('month')) + 1, \
+        int(result.group('day')), int(result.group('hour')), int(result.group('minute')), int(result.group('second'))))
+    return seconds - offset * 60, offset
+
+def format_timestamp(seconds, offset):
+    """Formats a timestamp as Nginx writes it in its logs
+
+    :param seconds: seconds since epoch
+    :type seconds: int
+    :param offset: UTC offset in minutes
+    :type offset: int
+
+    :return: timestamp between brackets
+    :rtype: string
+    """
+    local_time = time.gmtime(seconds + offset * 60)
+    return TIMESTAMP_FORMAT.format(local_time.tm_mday, MONTHS[local_time.tm_mon - 1], local_time.tm_year, \
+        local_time.tm_hour, local_time.tm_min, local_time.tm_sec, '-' if offset < 0 else '+', abs(offset) // 60, \
+        abs(offset) % 60)
+
+def parse_row_data(row_data):
+    """Gets the fields of a line of .index file after its timestamp
+
+    :param row_data: end of the line after the timestamp and its tab
+    :type row_data: string
+
+    :return: URI, request ID, block type and rule IDs, None if the line is not valid
+    :rtype: tuple
+    """
+    result = ROW_DATA_CP.match(row_data)
+    if result is None:
+        return None
+    return result.group('uri'), result.group('id'), int(result.group('bt')), \
+        RULE_ID_CP.findall(result.group('rule_ids'))
+
+def format_row_data(uri, request_id, block_type, rule_ids):
+    """Formats the fields of a row as the end of its .index line, after the timestamp
+
+    :param uri: decoded URI
+    :type uri: string
+    :param request_id: request ID
+    :type request_id: string
+    :param block_type: block type
+    :type block_type: int
+    :param rule_ids: rule IDs in .index file order
+    :type rule_ids: list
+
+    :rtype: string
+    """
+    index_line = analyzer.INDEX_FILE_LINE.format("", uri, request_id, block_type)
+    return index_line[1:-1] + analyzer.NATTACKS_COUNT.format(len(rule_ids)) + \
+        "".join(analyzer.INDEX_NATTACKS_LINE.format(rule_id) for rule_id in rule_ids) + "\n"
+
+def read_row_data(row_data, line_number, file_name):
+    """Parses the end of a line after its timestamp checking that it is formatted back without loss
+
+    :param row_data: end of the line after the timestamp and its tab
+    :type row_data: string
+    :param line_number: number of the line in its file
+    :type line_number: int
+    :param file_name: name of the file
+    :type file_name: string
+
+    :raises LogError: if the line is not valid or it would change formatted back
+
+    :return: URI, request ID, block type and rule IDs
+    :rtype: tuple
+    """
+    fields = parse_row_data(row_data)
+    if fields is None or format_row_data(*fields[:3], [int(rule_id) for rule_id in fields[3]]) != row_data or \
+        any(int(rule_id) > MAX_UINT32 for rule_id in fields[3]):
+        log.error(LINE_NOT_SUPPORTED_ERROR.format(line_number, file_name, row_data.rstrip("\n")))
+    return fields
+
+def read_attacks_header(attacks_file, attacks_file_name):
+    """Reads the header of .attacks file
+
+    :param attacks_file: .attacks file at its beginning
+    :type attacks_file: file in read mode
+    :param attacks_file_name: name of .attacks file
+    :type attacks_file_name: string
+
+    :raises LogError: if the header would change formatted back
+
+    :return: input, clean and attack lines of the run
+    :rtype: tuple
+    """
+    header = "".join(attacks_file.readline() for _ in range(HEADER_LINES))
+    result = ATTACKS_HEADER_CP.search(header)
+    lines = tuple(int(count) for count in result.groups()) if result is not None else None
+    if lines is None or comparer.ATTACKS_FILE_HEADER.format(*lines) != header:
+        log.error(LINE_NOT_SUPPORTED_ERROR.format(1, attacks_file_name, header.split("\n")[0]))
+    return lines
+
+def read_attacks_line(attacks_line, line_number, attacks_file_name):
+    """Splits a line of .attacks file in its packet and the end of its .index line
+
+    :param attacks_line: line of .attacks file
+    :type attacks_line: string
+    :param line_number: number of the line in .attacks file
+    :type line_number: int
+    :param attacks_file_name: name of .attacks file
+    :type attacks_file_name: string
+
+    :raises LogError: if the line is not valid
+
+    :return: packet and end of the line after it
+    :rtype: tuple
+    """
+    result = ATTACKS_LINE_CP.match(attacks_line)
+    if result is None or int(result.group('packet')) > MAX_UINT32:
+        log.error(LINE_NOT_SUPPORTED_ERROR.format(line_number, attacks_file_name, attacks_line.rstrip("\n")))
+    return int(result.group('packet')), attacks_line[result.end():]
+
+def read_text_rows(index_file_name, attacks_file_name):
+    """Reads the rows of .index and .attacks files, which have their lines in the same order:
+    packets come from .attacks file and timestamps from .index file. Only one of them is needed,
+    missing fields are PACKET_UNKNOWN and TIMESTAMP_UNKNOWN
+
+    :param index_file_name: .index file or None
+    :type index_file_name: string
+    :param attacks_file_name: .attacks file or None
+    :type attacks_file_name: string
+
+    :raises LogError: if a line can not be converted without loss
+
+    :return: generator of (packet, seconds, UTC offset, URI, request ID, block type, rule IDs) tuples
+    :rtype: generator
+    """
+    attacks_file = open(attacks_file_name, encoding=ISO_8859_1, errors='ignore') if attacks_file_name else None
+    index_file = open(index_file_name, encoding=ISO_8859_1, errors='ignore') if index_file_name else None
+    try:
+        attacks = iter(())
+        if attacks_file is not None:
+            read_attacks_header(attacks_file, attacks_file_name)
+            attacks = enumerate(attacks_file, HEADER_LINES + 1)
+        if index_file is None:
+            for line_number, attacks_line in attacks:
+                packet, row_data = read_attacks_line(attacks_line, line_number, attacks_file_name)
+                yield (packet, TIMESTAMP_UNKNOWN, 0) + read_row_data(row_data, line_number, attacks_file_name)
+            return
+
+        attack = next(attacks, None)
+        for line_number, index_line in enumerate(index_file, 1):
+            timestamp_end = index_line.find(TIMESTAMP_END) + 1
+            timestamp = index_line[:timestamp_end]
+            row_data = index_line[timestamp_end + 1:]
+            seconds_offset = parse_timestamp(timestamp)
+            if seconds_offset is None or format_timestamp(*seconds_offset) != timestamp:
+                log.error(LINE_NOT_SUPPORTED_ERROR.format(line_number, index_file_name, index_line.rstrip("\n")))
+            fields = read_row_data(row_data, line_number, index_file_name)
+            packet = PACKET_UNKNOWN
+            if attack is not None:
+                attacks_packet, attacks_row_data = read_attacks_line(attack[1], attack[0], attacks_file_name)
+                if attacks_row_data == row_data:
+                    packet = attacks_packet
+                    attack = next(attacks, None)
+            yield (packet,) + seconds_offset + fields
+        if attack is not None:
+            log.error(ATTACKS_NOT_IN_INDEX_ERROR.format(attack[0], attacks_file_name, index_file_name))
+    finally:
+        for file in (attacks_file, index_file):
+            if file is not None:
+                file.close()
+
+def write_columnar_file(columnar_file_name, index_file_name, attacks_file_name):
+    """Converts .index and .attacks files to a columnar file. The columns are built in memory as
+    arrays and written after the header and the table of their offsets and sizes, every one
+    aligned to 8 bytes so it can be cast from the memory map
+
+    :param columnar_file_name: name of the columnar file
+    :type columnar_file_name: string
+    :param index_file_name: name of .index file, not converted if it does not exist
+    :type index_file_name: string
+    :param attacks_file_name: name of .attacks file, not converted if it does not exist
+    :type attacks_file_name: string
+
+    :raises LogError: if none of the files exists or a line can not be converted without loss
+    """
+    if not path.isfile(index_file_name) and not path.isfile(attacks_file_name):
+        log.error(FILE_NOT_EXISTS_ERROR % index_file_name)
+    index_file_name = index_file_name if path.isfile(index_file_name) else None
+    attacks_file_name = attacks_file_name if path.isfile(attacks_file_name) else None
+    log.info(LOG_INFO_WRITE.format(index_file_name, attacks_file_name, columnar_file_name))
+
+    columns = {name: array.array(TYPECODES[name]) for name in SECTIONS}
+    columns["rule_offsets"].append(0)
+    columns["uri_offsets"].append(0)
+    columns["text_id_offsets"].append(0)
+    converted_rows = progress.Progress(CONVERTING_ROWS.format(index_file_name or attacks_file_name))
+    rows = 0
+    for packet, seconds, offset, uri, request_id, block_type, rule_ids in read_text_rows(index_file_name, \
+        attacks_file_name):
+        columns["packets"].append(packet)
+        columns["timestamps"].append(seconds)
+        columns["time_offsets"].append(offset)
+        columns["block_types"].append(block_type)
+        if HEX_REQUEST_ID_CP.match(request_id):
+            columns["request_ids"].frombytes(bytes.fromhex(request_id))
+        else:
+            columns["request_ids"].frombytes(bytes(REQUEST_ID_SIZE))
+            columns["text_id_rows"].append(rows)
+            columns["text_ids"].frombytes(request_id.encode(ISO_8859_1))
+            columns["text_id_offsets"].append(len(columns["text_ids"]))
+        columns["rule_ids"].extend(int(rule_id) for rule_id in rule_ids)
+        columns["rule_offsets"].append(len(columns["rule_ids"]))
+        columns["uris"].frombytes(uri.encode(ISO_8859_1))
+        columns["uri_offsets"].append(len(columns["uris"]))
+        rows += 1
+        converted_rows.update(rows)
+    converted_rows.done(rows)
+
+    packet_rows = columns["packet_rows"]
+    packet_rows.frombytes(bytes(packet_rows.itemsize * (max(columns["packets"], default=0) + 1)))
+    for row, packet in enumerate(columns["packets"]):
+        if packet != PACKET_UNKNOWN and packet_rows[packet] == 0:
+            packet_rows[packet] = row + 1
+
+    input_lines = clean_lines = attack_lines = 0
+    if attacks_file_name is not None:
+        with open(attacks_file_name, encoding=ISO_8859_1, errors='ignore') as attacks_file:
+            input_lines, clean_lines, attack_lines = read_attacks_header(attacks_file, attacks_file_name)
+    flags = (HAS_INDEX if index_file_name else 0) | (HAS_ATTACKS if attacks_file_name else 0) | \
+        (BIG_ENDIAN if sys.byteorder == 'big' else 0)
+
+    sections = list()
+    position = HEADER.size + SECTION.size * len(SECTIONS)
+    for name in SECTIONS:
+        position += -position % ALIGNMENT
+        size = len(columns[name]) * columns[name].itemsize
+        sections.append((position, size))
+        position += size
+    with open(columnar_file_name, 'wb') as columnar_file:
+        columnar_file.write(HEADER.pack(MAGIC, VERSION, flags, 0, rows, input_lines, clean_lines, attack_lines))
+        for section in sections:
+            columnar_file.write(SECTION.pack(*section))
+        for name, (offset, _) in zip(SECTIONS, sections):
+            columnar_file.write(bytes(offset - columnar_file.tell()))
+            columns[name].tofile(columnar_file)
+    text_size = sum(path.getsize(file_name) for file_name in (index_file_name, attacks_file_name) if file_name)
+    log.info(LOG_INFO_WRITTEN.format(columnar_file_name, rows, position, text_size))
+
+def write_text_files(columnar_file_name, index_file_name, attacks_file_name):
+    """Writes back the .index and .attacks files a columnar file was converted from
+
+    :param columnar_file_name: name of the columnar file
+    :type columnar_file_name: string
+    :param index_file_name: name of .index file, written if it was converted
+    :type index_file_name: string
+    :param attacks_file_name: name of .attacks file, written if it was converted
+    :type attacks_file_name: string
+
+    :raises LogError: if the columnar file does not exist or is not valid
+    """
+    log.info(LOG_INFO_TEXT.format(columnar_file_name))
+    with ColumnarFile(columnar_file_name) as columnar_file:
+        if columnar_file.has_index():
+            with open(index_file_name, 'w', encoding=ISO_8859_1, errors='ignore') as index_file:
+                for row in range(len(columnar_file)):
+                    index_file.write(columnar_file.get_index_line(row))
+            log.info(LOG_INFO_TEXT_WRITTEN.format(index_file_name))
+        if columnar_file.has_attacks():
+            with open(attacks_file_name, 'w', encoding=ISO_8859_1, errors='ignore') as attacks_file:
+                attacks_file.write(comparer.ATTACKS_FILE_HEADER.format(columnar_file.input_lines, \
+                    columnar_file.clean_lines, columnar_file.attack_lines))
+                for row in range(len(columnar_file)):
+                    if columnar_file.packets[row] != PACKET_UNKNOWN:
+                        attacks_file.write(columnar_file.get_attacks_line(row))
+            log.info(LOG_INFO_TEXT_WRITTEN.format(attacks_file_name))
+
+def show_packets(columnar_file_name, packets):
+    """Prints the .attacks lines of the indicated packets
+
+    :param columnar_file_name: name of the columnar file
+    :type columnar_file_name: string
+    :param packets: packet numbers
+    :type packets: list
+
+    :raises LogError: if the columnar file does not exist or is not valid
+    """
+    with ColumnarFile(columnar_file_name) as columnar_file:
+        for packet in packets:
+            row = columnar_file.find_packet(packet)
+            if row is None:
+                log.warn(PACKET_NOT_FOUND.format(packet, columnar_file_name))
+            else:
+                print(columnar_file.get_attacks_line(row), end='')
+
+def main(args):
+    """Main function.
+
+    Converts .index and .attacks files of the run to its columnar file, or writes them back
+    from it, or shows the lines of the indicated packets
+
+    :param args: command-line retrieved arguments
+    :type args: ArgumentParser.parse_args()
+
+    :raises LogError: if files do not exist or can not be converted without loss
+    """
+    columnar_file_name = comparer.ANALYSIS_FILE_NAME.format(args.id, COLUMNAR_EXT)
+    index_file_name = comparer.ANALYSIS_FILE_NAME.format(args.id, comparer.INDEX_EXT)
+    attacks_file_name = comparer.ANALYSIS_FILE_NAME.format(args.id, comparer.ATTACKS_EXT)
+    folder = getattr(args, TEXT_VARIABLE_NAME, None)
+    packets = getattr(args, PACKETS_VARIABLE_NAME, None)
+    if packets:
+        show_packets(columnar_file_name, packets)
+    elif folder is not None:
+        if not path.isdir(folder):
+            log.error(FOLDER_NOT_EXISTS_ERROR % folder)
+        write_text_files(columnar_file_name, path.join(folder, index_file_name), path.join(folder, attacks_file_name))
+    else:
+        write_columnar_file(columnar_file_name, index_file_name, attacks_file_name)
+
+# =====================================
+# Main
+# =====================================
+if __name__ == "__main__":
+    args = init_parser().parse_args()
+    progress.set_batch_mode(args.batch)
+    main(args)
@@ -1,23 +1,33 @@
 """Script that creates .attacks file from .index, .clean and access.log files
 
-Usage: comparer.py [-h] [-a access_log] -id id
+Usage: comparer.py [-h] [-a access_log] [-r results] [-dt] [-b] -id id
 
 optional arguments:
-  -h, --help        show this help message and exit
-  -a access_log     Nginx access log file which contains information about
-                    access to the server. By default:
-                    /var/log/nginx/access.log
+  -h, --help     show this help message and exit
+  -a access_log  Nginx access log file which contains information about access
+                 to the server. By default: /var/log/nginx/access.log
+  -r results     Results file written by launcher. If indicated, packet
+                 numbers are recovered from it without reading access log
+  -dt            Decompresses compressed logs and reads rotated ones in a
+                 separate thread, overlapping it with the parsing of their
+                 lines. Logs may be a glob of a rotated series, e.g.
+                 'access.log*', read from the oldest file to the newest one,
+                 compressed with gzip (.gz) or zstd (.zst)
+  -b             Batch mode, progress of the analysis is not shown. It is not
+                 shown either when the output is not a terminal
 
 required arguments:
-  -id id            Numeric value added to idenfity generated files
+  -id id         Numeric value added to idenfity generated files
 
 Author: Carlos Cagigao Bravo
 """
 
 import argparse
-from pwn import log
-import subprocess
+from logger import log
 import re
+import analyzer
+import logfiles
+import progress
 
 # =====================================
 # Constant variables
@@ -35,9 +45,15 @@ ACCESS_LOG_HELP = "Nginx access log file which contains information about access
      % ACCESS_LOG_DEFAULT
 ACCESS_LOG_VARIABLE_NAME = "access_log"
 
+RESULTS_ARG = "-r"
+RESULTS_HELP = "Results file written by launcher. If indicated, packet numbers are recovered from it \
+without reading access log"
+RESULTS_VARIABLE_NAME = "results"
+
 LOG_INFO_MAIN = "Starting comparison between .index, .clean and .uri files..."
 LOG_INFO_END = "Files compared successfully. Created file {}"
 CHECK_INDEX_URI_IN_RAW = "Matching .index URIs with access log file"
+CHECK_INDEX_URI_IN_RESULTS = "Matching .index URIs with results file"
 FILE_NOT_EXISTS_ERROR = "File %s does not exist"
 ATTACKS_EXT = "attacks"
 CLEAN_EXT = "clean"
@@ -48,7 +64,13 @@ ATTACKS_FILE_HEADER = \
     "[{}] input, [{}] clean, [{}] attacks\n" + \
     "--------------------------- Analysis results -----------------------------\n"
 ISO_8859_1 = "ISO-8859-1"
+STATISTICS_EXT = "json"
+STATISTICS_NOT_FOUND = "Statistics file {} not found, counting lines of analysis files"
+COMPARISON_STAGE = "comparison"
+LINE_BREAK = b"\n"
+BUFFER_SIZE = 1024 * 1024
 PACKET_DATA = "Packet [{}]\t"
+TIMESTAMP_END = "]\t"
 
 # =====================================
 # Functions
@@ -62,6 +84,8 @@ def init_parser():
     parser = argparse.ArgumentParser(description=DESCRIPTION)
     required_arguments = parser.add_argument_group(REQUIRED_ARGS)
     add_optional_arguments(parser)
+    logfiles.add_optional_arguments(parser)
+    progress.add_optional_arguments(parser)
     add_required_arguments(required_arguments)
     return parser
 
@@ -73,6 +97,8 @@ def add_optional_arguments(parser):
     """
     parser.add_argument(ACCESS_LOG_ARG, help=ACCESS_LOG_HELP, default=ACCESS_LOG_DEFAULT, \
         metavar=ACCESS_LOG_VARIABLE_NAME, dest=ACCESS_LOG_VARIABLE_NAME)
+    parser.add_argument(RESULTS_ARG, help=RESULTS_HELP, metavar=RESULTS_VARIABLE_NAME, \
+        dest=RESULTS_VARIABLE_NAME)
 
 def add_required_arguments(required_arguments_group):
     """Add required arguments to argument parser group created and 
@@ -85,21 +111,18 @@ def add_required_arguments(required_arguments_group):
         dest=IDENTIFIER_VARIABLE_NAME, metavar=IDENTIFIER_VARIABLE_NAME, type=int, required=True)
 
 def get_index_file_cp():
-    """Creates the compiled pattern for .index file
+    """Creates the compiled pattern for the request ID of .index file, matched together with the
+    end of the URI before it and the block type after it as analyzer writes them
     
     :return: compiled pattern
     :rtype: compiled pattern in re library
 
     Example of valid pattern:
-        '[17/Aug/2021:19:27:10 +0200]\t'
-        'Uri [/wp-admin/admin-ajax.php]\t'
+        ']\t'
         'RequestID [e90f9480d500cad488650afb3a73c854]\t'
+        'BT ['
     """
-    return re.compile(
-        r'(?P<timestamp>\[\d{2}\/\w{3}\/\d{4}:\d{2}:\d{2}:\d{2} \+\d{4}\]\t)'
-        r'Uri \[(?P<uri>.+)\]\t'
-        r'RequestID \[(?P<id>[a-zA-Z0-9]+)\]\t'
-    )
+    return re.compile(r'\]\tRequestID \[(?P<id>[a-zA-Z0-9]+)\]\tBT \[')
 
 def get_access_log_compiled_pattern():
     """Creates the compiled pattern for Nginx access.log
@@ -112,31 +135,155 @@ def get_access_log_compiled_pattern():
     """
     return re.compile(r'"request_id\":\"(?P<id>[a-zA-Z0-9]+)\" ')
 
-def get_attacks_header(index_file_name, clean_file_name, access_log_file):
-    """Defines the header for .attack file
+def count_lines(file_name):
+    """Counts the line breaks of a file, as wc -l does, reading it in binary blocks
 
+    :param file_name: name of the file
+    :type file_name: string
+
+    :return: number of lines
+    :rtype: int
+    """
+    line_numbers = 0
+    with open(file_name, 'rb') as file:
+        block = file.read(BUFFER_SIZE)
+        while block:
+            line_numbers += block.count(LINE_BREAK)
+            block = file.read(BUFFER_SIZE)
+    return line_numbers
+
+def get_run_statistics(statistics_file_name, index_file_name, clean_file_name, input_file_name):
+    """Recovers the statistics written by analyzer. If they do not exist, lines of .index,
+    .clean and input (access log or results file) files are counted, decompressing the files of
+    a compressed or rotated access log
+
+    :param statistics_file_name: name of the JSON file written by analyzer
+    :type statistics_file_name: string
     :param index_file_name: name of .index file
     :type index_file_name: string
     :param clean_file_name: name of .clean file
     :type clean_file_name: string
-    :param uri_file_location: location of .uri file
-    :type uri_file_location: string
+    :param input_file_name: access log or results file analyzed
+    :type input_file_name: string
+
+    :rtype: analyzer.RunStatistics
+    """
+    try:
+        return analyzer.RunStatistics.load(statistics_file_name)
+    except FileNotFoundError:
+        log.info(STATISTICS_NOT_FOUND.format(statistics_file_name))
+        statistics = analyzer.RunStatistics()
+        statistics.input_lines = logfiles.count_lines(input_file_name)
+        statistics.clean_lines = count_lines(clean_file_name)
+        statistics.attack_lines = count_lines(index_file_name)
+        return statistics
+
+def get_attacks_header(statistics):
+    """Defines the header for .attack file
+
+    :param statistics: statistics of the analysis run
+    :type statistics: analyzer.RunStatistics
 
     :return: header, constant ATTACKS_FILE_HEADER formatted
     :rtype: string
     """
-    index_line_numbers = subprocess.check_output(['wc', '-l', index_file_name]).__str__()
-    index_line_numbers = index_line_numbers.split(' ')[0].replace("b'", "")
-    clean_line_numbers = subprocess.check_output(['wc', '-l', clean_file_name]).__str__()
-    clean_line_numbers = clean_line_numbers.split(' ')[0].replace("b'", "")
-    uri_line_numbers = subprocess.check_output(['wc', '-l', access_log_file]).__str__()
-    uri_line_numbers = int(uri_line_numbers.split(' ')[0].replace("b'", ""))
+    return ATTACKS_FILE_HEADER.format(statistics.input_lines, statistics.clean_lines, statistics.attack_lines)
+
+def get_index_request_ids(index_file_name, statistics):
+    """Reads the request ID of every line of .index file
+
+    :param index_file_name: name of .index file
+    :type index_file_name: string
+    :param statistics: statistics where bytes read are counted
+    :type statistics: analyzer.RunStatistics
+
+    :return: request ID of every line in file order, None for lines that are not valid
+    :rtype: list
+    """
+    index_file_cp = get_index_file_cp()
+    request_ids = list()
+    with open(index_file_name, encoding=ISO_8859_1, errors='ignore') as index_file:
+        for index_line in index_file:
+            statistics.bytes_read += len(index_line)
+            result = index_file_cp.search(index_line)
+            request_ids.append(result.group('id') if result is not None else None)
+    return request_ids
+
+def get_packets_by_request_id(access_log_arg, packets, statistics):
+    """Reads the access log once numbering its lines, and sets the packet number of the
+    requests whose request ID is already a key of packets, wherever they are logged. Files of a
+    compressed or rotated access log are numbered in order as a single one
+
+    :param access_log_arg: access.log location as an argument
+    :type access_log_arg: string
+    :param packets: packet number by request ID of .index file, None until it is found
+    :type packets: dict
+    :param statistics: statistics where bytes read are counted
+    :type statistics: analyzer.RunStatistics
+    """
+    access_log_cp = get_access_log_compiled_pattern()
+    read_lines = progress.Progress(analyzer.READING_FILE.format(access_log_arg), total=logfiles.get_size(access_log_arg))
+    line_count = 0
+    position = 0
+    with logfiles.open_log(access_log_arg) as access_log:
+        for access_log_count, access_log_line in analyzer.number_access_log_lines(access_log):
+            line_count += 1
+            position += len(access_log_line)
+            read_lines.update(line_count, position)
+            result_access_log = access_log_cp.search(access_log_line)
+            if result_access_log is not None and result_access_log.group('id') in packets:
+                packets[result_access_log.group('id')] = access_log_count
+    statistics.bytes_read += position
+    read_lines.done(line_count)
+
+def get_line_numbers_by_request_id(results_file_name):
+    """Gets the line of the launched file of every request of the results file written by launcher
 
-    return ATTACKS_FILE_HEADER.format(uri_line_numbers, clean_line_numbers, index_line_numbers)
+    :param results_file_name: results file written by launcher
+    :type results_file_name: string
 
-def compare_access_log_and_index(access_log_arg, index_file_name, attacks_file):
+    :return: line number by request ID
+    :rtype: dict
+    """
+    return {result[3]: result[0] for result in analyzer.read_results_file(results_file_name)}
+
+def write_attacks_lines(index_file_name, request_ids, packets, attacks_file, statistics, message):
+    """Copies .index file to .attacks file replacing the timestamp with Packet[NUM] information at
+    the beginning of the line, being NUM the packet number of its request ID. Lines whose request
+    ID has no packet number are not copied
+
+    :param index_file_name: name of .index file
+    :type index_file_name: string
+    :param request_ids: request ID of every line of .index file, returned by get_index_request_ids
+    :type request_ids: list
+    :param packets: packet number by request ID
+    :type packets: dict
+    :param attacks_file: previosly created .attack file
+    :type attacks_file: file
+    :param statistics: statistics where bytes read are counted
+    :type statistics: analyzer.RunStatistics
+    :param message: message of the progress
+    :type message: string
+    """
+    with open(index_file_name, encoding=ISO_8859_1, errors='ignore') as index_file:
+        progress_index_file = progress.Progress(message, total=statistics.attack_lines)
+        for index_count, (index_line, request_id) in enumerate(zip(index_file, request_ids), 1):
+            progress_index_file.update(index_count, index_count)
+            statistics.bytes_read += len(index_line)
+            packet = packets.get(request_id)
+            if packet is not None:
+                attacks_file.write(PACKET_DATA.format(packet) + \
+                    index_line[index_line.find(TIMESTAMP_END) + len(TIMESTAMP_END):])
+        progress_index_file.done(statistics.attack_lines)
+
+def compare_access_log_and_index(access_log_arg, index_file_name, attacks_file, statistics):
     """Compares access.log and .index files adding Packet[NUM] information at the beginning
-    of the line. NUM represents the line which contains the URI in original .uri file
+    of the line. NUM represents the line which contains the URI in original .uri file, numbered
+    again after the run marker of every resumed launch.
+
+    Lines are matched by request ID, so .index lines and access log lines may be in any order.
+    NUM is the position of the request in the access log, which is the line of the URI only if
+    URIs were launched one by one; results file gives it for concurrent launches
 
     :param access_log_arg: access.log location as an argument
     :type access_log_arg: string
@@ -144,44 +291,60 @@ def compare_access_log_and_index(access_log_arg, index_file_name, attacks_file):
     :type index_file_name: string
     :param attacks_file: previosly created .attack file
     :type attacks_file: file
+    :param statistics: statistics where bytes read are counted
+    :type statistics: analyzer.RunStatistics
+
+    :raises LogError: if a file does not exist
     """
-    access_log_arg = access_log_arg
-    index_file_cp = get_index_file_cp()
-    access_log_cp = get_access_log_compiled_pattern()
+    if not logfiles.exists(access_log_arg):
+        log.error(FILE_NOT_EXISTS_ERROR % access_log_arg)
     try:
-        with open(index_file_name, encoding=ISO_8859_1, errors='ignore') as index_file:
-            access_log = open(access_log_arg, encoding=ISO_8859_1, errors='ignore')
-            access_log_line = access_log.readline()
-            access_log_count = 1
-            progress_index_file = log.progress(CHECK_INDEX_URI_IN_RAW)
-            for index_count, index_line in enumerate(index_file):
-                progress_index_file.status("%s" % str(index_count + 1))
-                result = index_file_cp.search(index_line)
-                if result is not None:
-                    last_timestamp_index = result.span('timestamp')[1]
-                    request_id = result.group('id')
-                    searching_uri = True
-                    while(access_log_line and searching_uri):
-                        result_access_log = access_log_cp.search(access_log_line)
-                        if result_access_log is not None:
-                            request_id_access_log = result_access_log.group('id')
-                            if request_id == request_id_access_log:
-                                searching_uri = False
-                                attack_line = PACKET_DATA.format(access_log_count) + index_line[last_timestamp_index:]
-                                attacks_file.write(attack_line)
-                        access_log_count += 1
-                        access_log_line = access_log.readline()
-        access_log.close()
+        request_ids = get_index_request_ids(index_file_name, statistics)
+        packets = dict.fromkeys(request_ids)
+        packets.pop(None, None)
+        get_packets_by_request_id(access_log_arg, packets, statistics)
+        write_attacks_lines(index_file_name, request_ids, packets, attacks_file, statistics, CHECK_INDEX_URI_IN_RAW)
         attacks_file.close()
-    except FileNotFoundError:
-        log.error(FILE_NOT_EXISTS_ERROR % args.file_location)
+    except FileNotFoundError as file_not_found:
+        log.error(FILE_NOT_EXISTS_ERROR % file_not_found.filename)
+
+def compare_results_and_index(results_file_name, index_file_name, attacks_file, statistics):
+    """Compares results file written by launcher and .index file adding Packet[NUM] information
+    at the beginning of the line. NUM is the line of the URI in the launched file, recovered by
+    request ID
+
+    :param results_file_name: results file written by launcher
+    :type results_file_name: string
+    :param index_file_name: name of .index file
+    :type index_file_name: string
+    :param attacks_file: previosly created .attack file
+    :type attacks_file: file
+    :param statistics: statistics where bytes read are counted
+    :type statistics: analyzer.RunStatistics
 
-def main(args):
+    :raises LogError: if a file does not exist
+    """
+    try:
+        line_numbers = get_line_numbers_by_request_id(results_file_name)
+        write_attacks_lines(index_file_name, get_index_request_ids(index_file_name, statistics), line_numbers, \
+            attacks_file, statistics, CHECK_INDEX_URI_IN_RESULTS)
+        attacks_file.close()
+    except FileNotFoundError as file_not_found:
+        log.error(FILE_NOT_EXISTS_ERROR % file_not_found.filename)
+
+def main(args, statistics=None):
     """Main function.
 
-    Looks for lines number in files .index, .clean, .uri using wc -l command on linux shell, then
-    puts the comparison header in file .attacks and completes it with a copy of .index file adding
-    PACKET[NUM] information at the beginning of the line
+    Recovers lines number of files .index, .clean and access log from the statistics of the
+    analysis run, then puts the comparison header in file .attacks and completes it with a copy
+    of .index file adding PACKET[NUM] information at the beginning of the line. If results file
+    written by launcher is indicated, it is used instead of access log
+
+    :param args: command-line retrieved arguments
+    :type args: ArgumentParser.parse_args()
+    :param statistics: statistics of the analysis run. By default they are read from the JSON
+        file written by analyzer
+    :type statistics: analyzer.RunStatistics
 
     :raises FileNotFoundError: if file does not exist
     """
@@ -189,11 +352,21 @@ def main(args):
     index_file_name = ANALYSIS_FILE_NAME.format(args.id, INDEX_EXT)
     clean_file_name = ANALYSIS_FILE_NAME.format(args.id, CLEAN_EXT)
     attacks_file_name = ANALYSIS_FILE_NAME.format(args.id, ATTACKS_EXT)
+    statistics_file_name = ANALYSIS_FILE_NAME.format(args.id, STATISTICS_EXT)
+
+    results_file_name = getattr(args, RESULTS_VARIABLE_NAME, None)
+    input_file_name = results_file_name or args.access_log
+    if statistics is None:
+        statistics = get_run_statistics(statistics_file_name, index_file_name, clean_file_name, input_file_name)
 
-    header = get_attacks_header(index_file_name, clean_file_name, args.access_log)
-    attacks_file = open(attacks_file_name, 'w')
-    attacks_file.write(header)
-    compare_access_log_and_index(args.access_log, index_file_name, attacks_file)
+    with statistics.stage(COMPARISON_STAGE):
+        attacks_file = open(attacks_file_name, 'w')
+        attacks_file.write(get_attacks_header(statistics))
+        if results_file_name is not None:
+            compare_results_and_index(results_file_name, index_file_name, attacks_file, statistics)
+        else:
+            compare_access_log_and_index(args.access_log, index_file_name, attacks_file, statistics)
+    statistics.save(statistics_file_name)
 
     log.info(LOG_INFO_END.format(attacks_file_name))
 
@@ -202,4 +375,6 @@ def main(args):
 # =====================================
 if __name__ == "__main__":
     args = init_parser().parse_args()
+    logfiles.set_decompression_thread(args.decompression_thread)
+    progress.set_batch_mode(args.batch)
     main(args)
\ No newline at end of file
@@ -0,0 +1,404 @@
+"""Script that loops into dataset location and launches and analyzes every .uri file
+contained in the folder against a pool of running Nemesida WAF containers
+
+Usage: dataset_looper.py [-h] [-n instances] [-p port] [-i image]
+                         [-w waf_config] [-c concurrency] [-sp] [-t timeout]
+                         [-vc cache] -d dataset_name -l dataset_location
+
+optional arguments:
+  -h, --help           show this help message and exit
+  -n instances         Number of Nemesida WAF containers launched in parallel,
+                       every one on its own port. By default: 1
+  -p port              Port of the first Nemesida WAF container, the following
+                       ones use the next ports. By default: 80
+  -i image             Docker image of Nemesida WAF. By default:
+                       nemesida/nwaf-dyn-free-1.18:latest
+  -w waf_config        Nemesida WAF configuration folder mounted in every
+                       container. By default: /opt/nwaf/waf-config
+  -c concurrency       Number of URIs launched concurrently to every container
+                       through keep-alive connections. By default URIs are
+                       launched one by one
+  -sp                  Analyzes access log and error log of every file in a
+                       single streaming pass
+  -t timeout           Seconds waiting for a container to answer HTTP requests
+                       before giving up. By default: 120
+  -vc cache            SQLite file where the verdicts of the Docker image are
+                       cached, so URIs repeated in several dataset files or
+                       runs are launched only once. Launcher results are
+                       written in results.tsv of every output folder
+
+required arguments:
+  -d dataset_name      Name of dataset, valid values: "biblio" and "inves"
+  -l dataset_location  Dataset location (Biblio.uri or INVES.uri folder)
+
+Author: Carlos Cagigao Bravo
+"""
+
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import glob
+from logger import log
+import os
+import queue
+import re
+import shutil
+import subprocess
+import sys
+import time
+from urllib import request, error
+
+# =====================================
+# Constant variables
+# =====================================
+DESCRIPTION = "Script that loops into dataset location and launches and analyzes every .uri file contained \
+in the folder against a pool of running Nemesida WAF containers"
+REQUIRED_ARGS = "required arguments"
+
+DATASET_ARG = "-d"
+BIBLIO = "biblio"
+INVES = "inves"
+DATASET_HELP = "Name of dataset, valid values: \"%s\" and \"%s\"" % (BIBLIO, INVES)
+DATASET_VARIABLE_NAME = "dataset_name"
+
+LOCATION_ARG = "-l"
+LOCATION_HELP = "Dataset location (Biblio.uri or INVES.uri folder)"
+LOCATION_VARIABLE_NAME = "dataset_location"
+
+INSTANCES_ARG = "-n"
+INSTANCES_DEFAULT = 1
+INSTANCES_HELP = "Number of Nemesida WAF containers launched in parallel, every one on its own port. \
+By default: %s" % INSTANCES_DEFAULT
+INSTANCES_VARIABLE_NAME = "instances"
+
+PORT_ARG = "-p"
+PORT_DEFAULT = 80
+PORT_HELP = "Port of the first Nemesida WAF container, the following ones use the next ports. By default: %s" \
+    % PORT_DEFAULT
+PORT_VARIABLE_NAME = "port"
+
+IMAGE_ARG = "-i"
+IMAGE_DEFAULT = "nemesida/nwaf-dyn-free-1.18:latest"
+IMAGE_HELP = "Docker image of Nemesida WAF. By default: %s" % IMAGE_DEFAULT
+IMAGE_VARIABLE_NAME = "image"
+
+WAF_CONFIG_ARG = "-w"
+WAF_CONFIG_DEFAULT = "/opt/nwaf/waf-config"
+WAF_CONFIG_HELP = "Nemesida WAF configuration folder mounted in every container. By default: %s" \
+    % WAF_CONFIG_DEFAULT
+WAF_CONFIG_VARIABLE_NAME = "waf_config"
+
+CONCURRENCY_ARG = "-c"
+CONCURRENCY_HELP = "Number of URIs launched concurrently to every container through keep-alive connections. \
+By default URIs are launched one by one"
+CONCURRENCY_VARIABLE_NAME = "concurrency"
+
+SINGLE_PASS_ARG = "-sp"
+SINGLE_PASS_HELP = "Analyzes access log and error log of every file in a single streaming pass"
+SINGLE_PASS_VARIABLE_NAME = "single_pass"
+
+TIMEOUT_ARG = "-t"
+TIMEOUT_DEFAULT = 120
+TIMEOUT_HELP = "Seconds waiting for a container to answer HTTP requests before giving up. By default: %s" \
+    % TIMEOUT_DEFAULT
+TIMEOUT_VARIABLE_NAME = "timeout"
+
+RESULTS_FILE = "results.tsv"
+
+CACHE_ARG = "-vc"
+CACHE_HELP = "SQLite file where the verdicts of the Docker image are cached, so URIs repeated in several \
+dataset files or runs are launched only once. Launcher results are written in %s of every output folder" \
+    % RESULTS_FILE
+CACHE_VARIABLE_NAME = "cache"
+
+PARENT_LOCATION_OUTPUT = "./data"
+BIBLIO_OUTPUT_FOLDER = "Biblio"
+BIBLIO_SSL_FOLDER = "ssl"
+BIBLIO_NO_SSL_FOLDER = "no-ssl"
+BIBLIO_SSL_PREFIX = "ssl"
+INVES_OUTPUT_FOLDER = "INVES"
+URI_FILES = "*.uri"
+URI_EXT = ".uri"
+LOGS_FOLDER = "logs-{}"
+ACCESS_LOG = "access.log"
+ERROR_LOG = "error.log"
+START_LOG = "start.log"
+START_SCRIPT = "start.py"
+START_STREAM_ARGS = ["-sg", "-nu"]
+CONTAINER_NAME = "nemesida-waf-{}"
+CONTAINER_LOGS = "/var/log/nginx"
+CONTAINER_CONFIG = "/nginx.configs"
+CONTAINER_TIMEZONE = "TZ=Europe/Madrid"
+LOCALHOST = "http://localhost"
+READINESS_URL = LOCALHOST + ":{}/"
+READINESS_INTERVAL = 0.5
+
+LOG_INFO_MAIN = "Processing {} files of {} with {} Nemesida WAF containers"
+LOG_INFO_CONTAINER = "Starting container {} on port {}"
+LOG_INFO_CONTAINER_READY = "Container on port {} ready after {:.1f} seconds"
+LOG_INFO_PROCESSING = "Processing file {} on port {}"
+LOG_INFO_PROCESSED = "File {} processed, results moved to {}"
+LOG_INFO_REMOVING = "Removing containers..."
+LOG_INFO_END = "Dataset processed successfully"
+LOG_WARN_FAILED = "Analysis of file {} failed, check {}"
+LOCATION_NOT_EXISTS_ERROR = "Dataset location: %s does not exist"
+CONTAINER_NOT_READY_ERROR = "Container on port %s not ready after %s seconds"
+INVALID_INSTANCES_ERROR = "Number of instances must be greater than 0"
+SINGLE_PASS_CACHE_ERROR = "Single pass analysis can not be used with verdict cache"
+
+# =====================================
+# Functions
+# =====================================
+def init_parser():
+    """Retrieves the parameters with which it has been executed
+
+    :rtype: ArgumentParser
+    :return: arguments prepared to be parsed
+    """
+    parser = argparse.ArgumentParser(description=DESCRIPTION)
+    required_arguments = parser.add_argument_group(REQUIRED_ARGS)
+    add_optional_arguments(parser)
+    add_required_arguments(required_arguments)
+    return parser
+
+def add_optional_arguments(parser):
+    """Add optional arguments to parser
+
+    :param parser: parser to add arguments
+    :type parser: ArgumentParser
+    """
+    parser.add_argument(INSTANCES_ARG, help=INSTANCES_HELP, default=INSTANCES_DEFAULT, \
+        metavar=INSTANCES_VARIABLE_NAME, dest=INSTANCES_VARIABLE_NAME, type=int)
+    parser.add_argument(PORT_ARG, help=PORT_HELP, default=PORT_DEFAULT, metavar=PORT_VARIABLE_NAME, \
+        dest=PORT_VARIABLE_NAME, type=int)
+    parser.add_argument(IMAGE_ARG, help=IMAGE_HELP, default=IMAGE_DEFAULT, metavar=IMAGE_VARIABLE_NAME, \
+        dest=IMAGE_VARIABLE_NAME)
+    parser.add_argument(WAF_CONFIG_ARG, help=WAF_CONFIG_HELP, default=WAF_CONFIG_DEFAULT, \
+        metavar=WAF_CONFIG_VARIABLE_NAME, dest=WAF_CONFIG_VARIABLE_NAME)
+    parser.add_argument(CONCURRENCY_ARG, help=CONCURRENCY_HELP, metavar=CONCURRENCY_VARIABLE_NAME, \
+        dest=CONCURRENCY_VARIABLE_NAME, type=int)
+    parser.add_argument(SINGLE_PASS_ARG, help=SINGLE_PASS_HELP, dest=SINGLE_PASS_VARIABLE_NAME, \
+        action='store_true')
+    parser.add_argument(TIMEOUT_ARG, help=TIMEOUT_HELP, default=TIMEOUT_DEFAULT, metavar=TIMEOUT_VARIABLE_NAME, \
+        dest=TIMEOUT_VARIABLE_NAME, type=int)
+    parser.add_argument(CACHE_ARG, help=CACHE_HELP, metavar=CACHE_VARIABLE_NAME, dest=CACHE_VARIABLE_NAME)
+
+def add_required_arguments(required_arguments_group):
+    """Add required arguments to argument parser group created and added previosly to the parser parent
+
+    :param required_arguments_group: group added to ArgumentParser
+    :type required_arguments_group: ArgumentParser.add_argument_group()
+    """
+    required_arguments_group.add_argument(DATASET_ARG, help=DATASET_HELP, metavar=DATASET_VARIABLE_NAME, \
+        dest=DATASET_VARIABLE_NAME, choices=[BIBLIO, INVES], required=True)
+    required_arguments_group.add_argument(LOCATION_ARG, help=LOCATION_HELP, metavar=LOCATION_VARIABLE_NAME, \
+        dest=LOCATION_VARIABLE_NAME, required=True)
+
+def get_file_date(file_name):
+    """Retrieves the date of the dataset file keeping only the digits of its name
+
+    :param file_name: file name without extension
+    :type file_name: string
+
+    :return: date
+    :rtype: string
+
+    Example:
+        'ssl-access-20170115' => '20170115'
+    """
+    return re.sub(r'[^0-9]', '', file_name)
+
+def get_run_definition(dataset_name, file_location):
+    """Defines the identifier, .uri file name and output folder of a dataset file, following
+    the ./data/Biblio/{ssl,no-ssl}/month/date and ./data/INVES/month/date layout
+
+    :param dataset_name: name of dataset, biblio or inves
+    :type dataset_name: string
+    :param file_location: dataset file
+    :type file_location: string
+
+    :return: identifier, .uri file name and output folder
+    :rtype: tuple
+
+    Examples:
+        ('biblio', 'ssl-access-20170115.uri') => ('20170115', 'ssl-20170115.uri', './data/Biblio/ssl/201701/20170115')
+        ('inves', 'inves.20180501.uri') => ('20180501', 'inves-20180501.uri', './data/INVES/201805/20180501')
+    """
+    file_name = os.path.splitext(os.path.basename(file_location))[0]
+    file_date = get_file_date(file_name)
+    if dataset_name == BIBLIO:
+        uri_file_name = file_name.split("-")[0] + "-" + file_date + URI_EXT
+        ssl_folder = BIBLIO_SSL_FOLDER if file_name.startswith(BIBLIO_SSL_PREFIX) else BIBLIO_NO_SSL_FOLDER
+        output_location = os.path.join(PARENT_LOCATION_OUTPUT, BIBLIO_OUTPUT_FOLDER, ssl_folder, file_date[:6], \
+            file_date)
+    else:
+        uri_file_name = file_name.split(".")[0] + "-" + file_date + URI_EXT
+        output_location = os.path.join(PARENT_LOCATION_OUTPUT, INVES_OUTPUT_FOLDER, file_date[:6], file_date)
+
+    return file_date, uri_file_name, output_location
+
+def start_container(instance, port, image, waf_config):
+    """Starts a Nemesida WAF container writing its Nginx logs in its own folder
+
+    :param instance: number of the container
+    :type instance: int
+    :param port: port of the host where the container listens
+    :type port: int
+    :param image: Docker image of Nemesida WAF
+    :type image: string
+    :param waf_config: Nemesida WAF configuration folder
+    :type waf_config: string
+
+    :return: logs folder of the container
+    :rtype: string
+    """
+    container_name = CONTAINER_NAME.format(instance)
+    logs_folder = os.path.abspath(LOGS_FOLDER.format(instance))
+    os.makedirs(logs_folder, exist_ok=True)
+    log.info(LOG_INFO_CONTAINER.format(container_name, port))
+    subprocess.run(['docker', 'rm', '-f', container_name], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    subprocess.run(['docker', 'run', '-d', '--name', container_name, '-e', CONTAINER_TIMEZONE, \
+        '-p', "%s:80" % port, '-v', "%s:%s" % (os.path.abspath(waf_config), CONTAINER_CONFIG), \
+        '-v', "%s:%s" % (logs_folder, CONTAINER_LOGS), image], check=True, stdout=subprocess.DEVNULL)
+    return logs_folder
+
+def remove_container(instance):
+    """Removes a Nemesida WAF container started previously
+
+    :param instance: number of the container
+    :type instance: int
+    """
+    subprocess.run(['docker', 'rm', '-f', CONTAINER_NAME.format(instance)], stdout=subprocess.DEVNULL, \
+        stderr=subprocess.DEVNULL)
+
+def wait_until_ready(port, timeout):
+    """Waits until the container listening on the port answers an HTTP request, whatever its status
+
+    :param port: port of the host where the container listens
+    :type port: int
+    :param timeout: maximum seconds to wait
+    :type timeout: int
+
+    :raises LogError: if container does not answer before timeout
+    """
+    start_time = time.monotonic()
+    while True:
+        try:
+            request.urlopen(READINESS_URL.format(port), timeout=1)
+            break
+        except error.HTTPError:
+            break
+        except OSError:
+            if time.monotonic() - start_time > timeout:
+                log.error(CONTAINER_NOT_READY_ERROR % (port, timeout))
+            time.sleep(READINESS_INTERVAL)
+    log.info(LOG_INFO_CONTAINER_READY.format(port, time.monotonic() - start_time))
+
+def truncate_logs(logs_folder):
+    """Empties the Nginx logs of a container so that the next run starts from byte 0.
+    Nginx keeps writing at the end of the truncated files as they are opened in append mode
+
+    :param logs_folder: logs folder of the container
+    :type logs_folder: string
+    """
+    for log_name in (ACCESS_LOG, ERROR_LOG):
+        open(os.path.join(logs_folder, log_name), 'w').close()
+
+def process_file(args, file_location, port, logs_folder):
+    """Launches and analyzes a dataset file with start.py against a running container.
+    start.py runs inside the output folder, so generated files of parallel runs do not collide,
+    launching the URIs while they are generated without writing the .uri file, then Nginx logs
+    are copied there and truncated for the next run
+
+    :param args: command-line retrieved arguments
+    :type args: ArgumentParser.parse_args()
+    :param file_location: dataset file
+    :type file_location: string
+    :param port: port of the host where the container listens
+    :type port: int
+    :param logs_folder: logs folder of the container
+    :type logs_folder: string
+    """
+    file_identifier, uri_file_name, output_location = get_run_definition(args.dataset_name, file_location)
+    os.makedirs(output_location, exist_ok=True)
+    log.info(LOG_INFO_PROCESSING.format(file_location, port))
+    access_log = os.path.join(logs_folder, ACCESS_LOG)
+    error_log = os.path.join(logs_folder, ERROR_LOG)
+    truncate_logs(logs_folder)
+
+    command = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), START_SCRIPT), \
+        '-i', os.path.abspath(file_location), '-o', uri_file_name, '-f', uri_file_name, '-e', error_log, \
+        '-a', access_log, '-id', file_identifier, '-u', LOCALHOST, '-p', str(port)] + START_STREAM_ARGS
+    if args.concurrency is not None:
+        command += [CONCURRENCY_ARG, str(args.concurrency)]
+    if args.single_pass:
+        command.append(SINGLE_PASS_ARG)
+    if args.cache is not None:
+        command += ['-r', RESULTS_FILE, CACHE_ARG, os.path.abspath(args.cache), '-rs', args.image]
+    start_log = os.path.join(output_location, START_LOG)
+    with open(start_log, 'w') as start_output:
+        completed = subprocess.run(command, cwd=output_location, stdout=start_output, stderr=subprocess.STDOUT)
+    if completed.returncode != 0:
+        log.warn(LOG_WARN_FAILED.format(file_location, start_log))
+
+    shutil.copy(access_log, output_location)
+    shutil.copy(error_log, output_location)
+    truncate_logs(logs_folder)
+    uri_file_location = os.path.join(output_location, uri_file_name)
+    if os.path.isfile(uri_file_location):
+        os.remove(uri_file_location)
+    shutil.move(file_location, output_location)
+    log.info(LOG_INFO_PROCESSED.format(file_location, output_location))
+
+def main(args):
+    """Main function.
+
+    Starts the pool of containers once, waiting until every one answers HTTP requests, and
+    processes the dataset files in parallel, every one against the first container available.
+    Containers are not restarted between files, their logs are truncated instead
+
+    :param args: command-line retrieved arguments
+    :type args: ArgumentParser.parse_args()
+
+    :raises LogError: if dataset location does not exist, a container is not ready or single pass is
+        indicated with verdict cache
+    """
+    if not os.path.isdir(args.dataset_location):
+        log.error(LOCATION_NOT_EXISTS_ERROR % args.dataset_location)
+    if args.instances < 1:
+        log.error(INVALID_INSTANCES_ERROR)
+    if args.single_pass and args.cache is not None:
+        log.error(SINGLE_PASS_CACHE_ERROR)
+
+    file_locations = sorted(glob.glob(os.path.join(args.dataset_location, URI_FILES)))
+    log.info(LOG_INFO_MAIN.format(len(file_locations), args.dataset_location, args.instances))
+    available_containers = queue.Queue()
+    try:
+        for instance in range(args.instances):
+            port = args.port + instance
+            logs_folder = start_container(instance, port, args.image, args.waf_config)
+            available_containers.put((port, logs_folder))
+        for port, _ in list(available_containers.queue):
+            wait_until_ready(port, args.timeout)
+
+        def process_in_available_container(file_location):
+            port, logs_folder = available_containers.get()
+            try:
+                process_file(args, file_location, port, logs_folder)
+            finally:
+                available_containers.put((port, logs_folder))
+
+        with ThreadPoolExecutor(max_workers=args.instances) as executor:
+            list(executor.map(process_in_available_container, file_locations))
+    finally:
+        log.info(LOG_INFO_REMOVING)
+        for instance in range(args.instances):
+            remove_container(instance)
+
+    log.info(LOG_INFO_END)
+
+# =====================================
+# Main
+# =====================================
+if __name__ == "__main__":
+    args = init_parser().parse_args()
+    main(args)
\ No newline at end of file
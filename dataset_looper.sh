@@ -126,7 +126,7 @@ launchBiblio() {
         getFileName $file
         getFileDate $fileName
         fileNameSplitted=${fileName%%-*}
-        python start.py -i $file -o "$fileNameSplitted-$fileDate.uri" -f "$fileNameSplitted-$fileDate.uri" -e "logs/error.log" -a "logs/access.log" -id "$fileDate"
+        python start.py -i $file -o "$fileNameSplitted-$fileDate.uri" -f "$fileNameSplitted-$fileDate.uri" -e "logs/error.log" -a "logs/access.log" -id "$fileDate" -sg -nu
 
         parentDateFolder="${fileDate:0:6}/"
         if [[ $fileName =~ ^'ssl' ]]; then
@@ -137,7 +137,7 @@ launchBiblio() {
         postStartScript $outputLocation $fileDate
 
         mv $file $outputLocation
-        rm *.uri
+        rm -f *.uri
     done
 }
 
@@ -148,13 +148,13 @@ launchInves() {
         getFileName $file
         getFileDate $fileName
         fileNameSplitted=${fileName%%.*}
-        python start.py -i $file -o "$fileNameSplitted-$fileDate.uri" -f "$fileNameSplitted-$fileDate.uri" -e "logs/error.log" -a "logs/access.log" -id "$fileDate"
+        python start.py -i $file -o "$fileNameSplitted-$fileDate.uri" -f "$fileNameSplitted-$fileDate.uri" -e "logs/error.log" -a "logs/access.log" -id "$fileDate" -sg -nu
         
         parentDateFolder="/${fileDate:0:6}/"
         outputLocation=$PARENT_LOCATION_OUTPUT$INVES_OUTPUT_FOLDER$parentDateFolder$fileDate
         postStartScript $outputLocation $fileDate
         mv $file $outputLocation
-        rm *.uri
+        rm -f *.uri
     done
 }
 
@@ -0,0 +1,420 @@
+"""Script that compares two analysis runs of the same .uri file, e.g. before and after an
+update of the rules of Nemesida WAF, reporting the URIs whose verdict or rule IDs changed.
+
+Usage: differ.py [-h] [-o output] [-m memory] [-b] -old old -new new
+
+optional arguments:
+  -h, --help  show this help message and exit
+  -o output   File where the changed URIs are written separated by tabs. By
+              default: analysis-diff.tsv
+  -m memory   Memory in megabytes used to sort .attacks files whose packets
+              are not in increasing order, spilling sorted runs to temporary
+              files when it is exceeded. By default: 256
+  -b          Batch mode, progress of the analysis is not shown. It is not
+              shown either when the output is not a terminal
+
+required arguments:
+  -old old    Analysis files of the old run, as .attacks file or as the path
+              without extension (e.g. rdb/analysis-20210930). Its .clean file
+              is read from the same folder
+  -new new    Analysis files of the new run, in the same way as the old run
+
+Author: Carlos Cagigao Bravo
+"""
+
+import argparse
+from collections import Counter
+from logger import log
+import os.path as path
+import re
+import shutil
+import tempfile
+import comparer
+import extsort
+import progress
+import verdict_cache
+
+# =====================================
+# Constant variables
+# =====================================
+DESCRIPTION = "Script that compares two analysis runs of the same .uri file, e.g. before and after an update of \
+the rules of Nemesida WAF, reporting the URIs whose verdict or rule IDs changed"
+REQUIRED_ARGS = "required arguments"
+
+OLD_ARG = "-old"
+OLD_HELP = "Analysis files of the old run, as .attacks file or as the path without extension \
+(e.g. rdb/analysis-20210930). Its .clean file is read from the same folder"
+OLD_VARIABLE_NAME = "old"
+
+NEW_ARG = "-new"
+NEW_HELP = "Analysis files of the new run, in the same way as the old run"
+NEW_VARIABLE_NAME = "new"
+
+OUTPUT_ARG = "-o"
+OUTPUT_DEFAULT = "analysis-diff.tsv"
+OUTPUT_HELP = "File where the changed URIs are written separated by tabs. By default: %s" % OUTPUT_DEFAULT
+OUTPUT_VARIABLE_NAME = "output"
+
+MEMORY_ARG = "-m"
+MEMORY_DEFAULT = 256
+MEMORY_HELP = "Memory in megabytes used to sort .attacks files whose packets are not in increasing order, \
+spilling sorted runs to temporary files when it is exceeded. By default: %s" % MEMORY_DEFAULT
+MEMORY_VARIABLE_NAME = "memory"
+
+LOG_INFO_MAIN = "Comparing run {} with run {}..."
+LOG_INFO_SORTING = "Packets of {} are not in increasing order, sorting it with {} MB of memory"
+LOG_INFO_COUNT = "{}: {}"
+LOG_INFO_RULES = "Rule {}: detects {} more and {} less URIs"
+LOG_INFO_MISMATCH = "{} packets have different URIs, runs may not come from the same .uri file"
+LOG_INFO_END = "Runs compared successfully. Created file {}"
+COMPARING_PACKETS = "Comparing packets"
+FILE_NOT_EXISTS_ERROR = "File %s does not exist"
+INVALID_MEMORY_ERROR = "Memory must be greater than 0"
+
+ANALYSIS_EXTENSION_CP = re.compile(r'\.(%s|%s|%s)$' % (comparer.ATTACKS_EXT, comparer.CLEAN_EXT, comparer.INDEX_EXT))
+ATTACKS_LINE_CP = re.compile(
+    r'^Packet \[(?P<packet>\d+)\]\t'
+    r'Uri \[(?P<uri>.*)\]\t'
+    r'RequestID \[[a-zA-Z0-9]+\]\t'
+    r'BT \[\d\]\t'
+    r'Nattacks \[\d+\]'
+)
+RULE_ID_CP = re.compile(r'\[(\d+)\]')
+ANALYSIS_FILE = "{}.{}"
+ISO_8859_1 = "ISO-8859-1"
+PACKET_START = len("Packet [")
+PACKET_END = "]"
+SORT_RECORD = "{}\t{}"
+POSITION_FORMAT = "%012d"
+RECORD_SEPARATOR = "\t"
+TOP_RULES = 10
+
+DETECTED = "detected"
+MISSED = "missed"
+RULES = "rules"
+MISMATCH = "mismatch"
+ONLY_OLD = "only_old"
+ONLY_NEW = "only_new"
+UNCHANGED = "unchanged"
+CHANGES = (DETECTED, MISSED, RULES, MISMATCH, ONLY_OLD, ONLY_NEW, UNCHANGED)
+CHANGE_NAMES = {
+    DETECTED: "Newly detected",
+    MISSED: "Newly missed",
+    RULES: "Rule IDs changed",
+    MISMATCH: "Different URI",
+    ONLY_OLD: "Only in old run",
+    ONLY_NEW: "Only in new run",
+    UNCHANGED: "Unchanged"
+}
+DIFF_HEADER = "change\tpacket\told_rule_ids\tnew_rule_ids\turi\n"
+DIFF_LINE = "{}\t{}\t{}\t{}\t{}\n"
+
+# =====================================
+# Functions
+# =====================================
+def init_parser():
+    """Retrieves the parameters with which it has been executed
+
+    :rtype: ArgumentParser
+    :return: arguments prepared to be parsed
+    """
+    parser = argparse.ArgumentParser(description=DESCRIPTION)
+    required_arguments = parser.add_argument_group(REQUIRED_ARGS)
+    add_optional_arguments(parser)
+    progress.add_optional_arguments(parser)
+    add_required_arguments(required_arguments)
+    return parser
+
+def add_optional_arguments(parser):
+    """Add optional arguments to parser
+
+    :param parser: parser to add arguments
+    :type parser: ArgumentParser
+    """
+    parser.add_argument(OUTPUT_ARG, help=OUTPUT_HELP, default=OUTPUT_DEFAULT, metavar=OUTPUT_VARIABLE_NAME, \
+        dest=OUTPUT_VARIABLE_NAME)
+    parser.add_argument(MEMORY_ARG, help=MEMORY_HELP, default=MEMORY_DEFAULT, metavar=MEMORY_VARIABLE_NAME, \
+        dest=MEMORY_VARIABLE_NAME, type=int)
+
+def add_required_arguments(required_arguments_group):
+    """Add required arguments to argument parser group created and
+    added previosly to the parser parent
+
+    :param required_arguments_group: group added to ArgumentParser
+    :type required_arguments_group: ArgumentParser.add_argument_group()
+    """
+    required_arguments_group.add_argument(OLD_ARG, help=OLD_HELP, metavar=OLD_VARIABLE_NAME, \
+        dest=OLD_VARIABLE_NAME, required=True)
+    required_arguments_group.add_argument(NEW_ARG, help=NEW_HELP, metavar=NEW_VARIABLE_NAME, \
+        dest=NEW_VARIABLE_NAME, required=True)
+
+def get_run_files(run):
+    """Gets the .attacks and .clean files of a run
+
+    :param run: .attacks, .clean or .index file of the run, or its path without extension
+    :type run: string
+
+    :raises LogError: if none of the files exists
+
+    :return: .attacks and .clean files, None if it does not exist
+    :rtype: tuple
+    """
+    run = ANALYSIS_EXTENSION_CP.sub("", run)
+    attacks_file_name = ANALYSIS_FILE.format(run, comparer.ATTACKS_EXT)
+    clean_file_name = ANALYSIS_FILE.format(run, comparer.CLEAN_EXT)
+    if not path.isfile(attacks_file_name) and not path.isfile(clean_file_name):
+        log.error(FILE_NOT_EXISTS_ERROR % attacks_file_name)
+    return attacks_file_name if path.isfile(attacks_file_name) else None, \
+        clean_file_name if path.isfile(clean_file_name) else None
+
+def get_packet(attacks_line):
+    """Gets the packet of a .attacks line
+
+    :param attacks_line: line of .attacks file after its header
+    :type attacks_line: string
+
+    :return: packet number
+    :rtype: int
+    """
+    return int(attacks_line[PACKET_START:attacks_line.index(PACKET_END)])
+
+def read_attacks_lines(attacks_file_name):
+    """Reads the lines of .attacks file after its header
+
+    :param attacks_file_name: .attacks file
+    :type attacks_file_name: string
+
+    :return: generator of lines
+    :rtype: generator
+    """
+    with open(attacks_file_name, encoding=ISO_8859_1, errors='ignore') as attacks_file:
+        for attacks_line in attacks_file:
+            if ATTACKS_LINE_CP.match(attacks_line) is not None:
+                yield attacks_line
+
+def is_sorted(attacks_file_name):
+    """Checks if the packets of .attacks file are in increasing order, as they are when it
+    is built from the access log. Built from the results file of concurrent requests, they
+    are in the order of the responses
+
+    :param attacks_file_name: .attacks file
+    :type attacks_file_name: string
+
+    :return: if packets are in increasing order
+    :rtype: boolean
+    """
+    last_packet = 0
+    for attacks_line in read_attacks_lines(attacks_file_name):
+        packet = get_packet(attacks_line)
+        if packet < last_packet:
+            return False
+        last_packet = packet
+    return True
+
+def get_sorted_attacks_lines(attacks_file_name, memory, temporary_folder):
+    """Reads the lines of .attacks file sorted by packet, sorting them with a bounded amount
+    of memory if they are not in increasing order
+
+    :param attacks_file_name: .attacks file
+    :type attacks_file_name: string
+    :param memory: megabytes of memory used by the sort
+    :type memory: int
+    :param temporary_folder: folder where sorted runs are spilled
+    :type temporary_folder: string
+
+    :return: generator of lines
+    :rtype: generator
+    """
+    if is_sorted(attacks_file_name):
+        yield from read_attacks_lines(attacks_file_name)
+        return
+    log.info(LOG_INFO_SORTING.format(attacks_file_name, memory))
+    records = (SORT_RECORD.format(POSITION_FORMAT % get_packet(attacks_line), attacks_line) \
+        for attacks_line in read_attacks_lines(attacks_file_name))
+    for record in extsort.sort_lines(records, memory * extsort.MEGABYTE, temporary_folder):
+        yield record.split(RECORD_SEPARATOR, 1)[1]
+
+def read_run(attacks_lines, clean_file_name):
+    """Reads the rows of a run in packet order. Clean rows take the packets not used by
+    attacks, as .clean file keeps the order of the .uri file
+
+    :param attacks_lines: .attacks lines sorted by packet
+    :type attacks_lines: iterable
+    :param clean_file_name: .clean file or None
+    :type clean_file_name: string
+
+    :return: generator of (packet, URI, rule IDs) tuples, rule IDs are None for clean rows
+    :rtype: generator
+    """
+    attacks_lines = iter(attacks_lines)
+    clean_file = open(clean_file_name, encoding=ISO_8859_1, errors='ignore') if clean_file_name else None
+    try:
+        clean_lines = clean_file if clean_file is not None else iter(())
+        attacks_line = next(attacks_lines, None)
+        packet = 1
+        while True:
+            while attacks_line is not None and get_packet(attacks_line) < packet:
+                attacks_line = next(attacks_lines, None)
+            if attacks_line is not None and get_packet(attacks_line) == packet:
+                result = ATTACKS_LINE_CP.match(attacks_line)
+                yield packet, result.group('uri'), sorted(RULE_ID_CP.findall(attacks_line, result.end()), key=int)
+                attacks_line = next(attacks_lines, None)
+            else:
+                clean_line = next(clean_lines, None)
+                if clean_line is not None:
+                    yield packet, clean_line.rstrip('\n'), None
+                elif attacks_line is not None:
+                    packet = get_packet(attacks_line)
+                    continue
+                else:
+                    return
+            packet += 1
+    finally:
+        if clean_file is not None:
+            clean_file.close()
+
+def get_change(old_row, new_row):
+    """Classifies the change of a packet between both runs
+
+    :param old_row: row of the old run, None if it is missing
+    :type old_row: tuple
+    :param new_row: row of the new run, None if it is missing
+    :type new_row: tuple
+
+    :return: change of CHANGES
+    :rtype: string
+    """
+    if new_row is None:
+        return ONLY_OLD
+    if old_row is None:
+        return ONLY_NEW
+    if old_row[1] != new_row[1]:
+        return MISMATCH
+    old_rule_ids, new_rule_ids = old_row[2], new_row[2]
+    if old_rule_ids is None:
+        return UNCHANGED if new_rule_ids is None else DETECTED
+    if new_rule_ids is None:
+        return MISSED
+    return UNCHANGED if old_rule_ids == new_rule_ids else RULES
+
+def join_runs(old_rows, new_rows):
+    """Merge joins the rows of both runs by packet
+
+    :param old_rows: rows of the old run sorted by packet
+    :type old_rows: iterable
+    :param new_rows: rows of the new run sorted by packet
+    :type new_rows: iterable
+
+    :return: generator of (old row, new row) tuples, None when the packet is missing in a run
+    :rtype: generator
+    """
+    old_rows, new_rows = iter(old_rows), iter(new_rows)
+    old_row, new_row = next(old_rows, None), next(new_rows, None)
+    while old_row is not None or new_row is not None:
+        if new_row is None or (old_row is not None and old_row[0] < new_row[0]):
+            yield old_row, None
+            old_row = next(old_rows, None)
+        elif old_row is None or new_row[0] < old_row[0]:
+            yield None, new_row
+            new_row = next(new_rows, None)
+        else:
+            yield old_row, new_row
+            old_row, new_row = next(old_rows, None), next(new_rows, None)
+
+def diff_runs(old_rows, new_rows, diff_file):
+    """Writes the packets that changed between both runs and counts the changes
+
+    :param old_rows: rows of the old run sorted by packet
+    :type old_rows: iterable
+    :param new_rows: rows of the new run sorted by packet
+    :type new_rows: iterable
+    :param diff_file: previously opened file where changes are written
+    :type diff_file: file in write mode
+
+    :return: packets by change, and URIs detected more and less by every rule ID
+    :rtype: tuple
+    """
+    changes = Counter({change: 0 for change in CHANGES})
+    rules_added, rules_removed = Counter(), Counter()
+    compared_packets = progress.Progress(COMPARING_PACKETS)
+    diff_file.write(DIFF_HEADER)
+    for count, (old_row, new_row) in enumerate(join_runs(old_rows, new_rows), 1):
+        change = get_change(old_row, new_row)
+        changes[change] += 1
+        compared_packets.update(count)
+        if change == UNCHANGED:
+            continue
+        old_rule_ids = set(old_row[2] or ()) if old_row is not None else set()
+        new_rule_ids = set(new_row[2] or ()) if new_row is not None else set()
+        if change != MISMATCH:
+            rules_added.update(new_rule_ids - old_rule_ids)
+            rules_removed.update(old_rule_ids - new_rule_ids)
+        row = old_row or new_row
+        diff_file.write(DIFF_LINE.format(change, row[0], \
+            verdict_cache.format_rule_ids(old_row[2] or []) if old_row is not None else verdict_cache.EMPTY_VALUE, \
+            verdict_cache.format_rule_ids(new_row[2] or []) if new_row is not None else verdict_cache.EMPTY_VALUE, \
+            row[1] if change != MISMATCH else new_row[1]))
+    compared_packets.done(sum(changes.values()))
+    return changes, rules_added, rules_removed
+
+def show_summary(changes, rules_added, rules_removed):
+    """Logs the packets by change and the rule IDs that changed most
+
+    :param changes: packets by change
+    :type changes: Counter
+    :param rules_added: URIs detected more by every rule ID
+    :type rules_added: Counter
+    :param rules_removed: URIs detected less by every rule ID
+    :type rules_removed: Counter
+    """
+    for change in CHANGES:
+        log.info(LOG_INFO_COUNT.format(CHANGE_NAMES[change], changes[change]))
+    rule_changes = Counter(rules_added)
+    rule_changes.update(rules_removed)
+    for rule_id, _ in rule_changes.most_common(TOP_RULES):
+        log.info(LOG_INFO_RULES.format(rule_id, rules_added[rule_id], rules_removed[rule_id]))
+    if changes[MISMATCH]:
+        log.info(LOG_INFO_MISMATCH.format(changes[MISMATCH]))
+
+def main(args):
+    """Main function.
+
+    Streams the rows of both runs in packet order, recovering the packets of clean rows from
+    the ones not used by attacks, and merge joins them by packet. Packets whose verdict or rule
+    IDs changed are written in the output file, with the old and new rule IDs, and the number of
+    packets by change is logged. Only .attacks files whose packets are not in increasing order
+    are sorted, in temporary files when they exceed the indicated memory
+
+    :param args: command-line retrieved arguments
+    :type args: ArgumentParser.parse_args()
+
+    :raises LogError: if files of a run do not exist or memory is not valid
+    """
+    if args.memory < 1:
+        log.error(INVALID_MEMORY_ERROR)
+    old_attacks_file_name, old_clean_file_name = get_run_files(args.old)
+    new_attacks_file_name, new_clean_file_name = get_run_files(args.new)
+    log.info(LOG_INFO_MAIN.format(args.old, args.new))
+
+    temporary_folder = tempfile.mkdtemp(dir=path.dirname(path.abspath(args.output)))
+    try:
+        old_attacks_lines, new_attacks_lines = iter(()), iter(())
+        if old_attacks_file_name is not None:
+            old_attacks_lines = get_sorted_attacks_lines(old_attacks_file_name, max(1, args.memory // 2), temporary_folder)
+        if new_attacks_file_name is not None:
+            new_attacks_lines = get_sorted_attacks_lines(new_attacks_file_name, max(1, args.memory // 2), temporary_folder)
+        with open(args.output, 'w', encoding=ISO_8859_1, errors='ignore') as diff_file:
+            summary = diff_runs(read_run(old_attacks_lines, old_clean_file_name), \
+                read_run(new_attacks_lines, new_clean_file_name), diff_file)
+    finally:
+        shutil.rmtree(temporary_folder)
+    show_summary(*summary)
+    log.info(LOG_INFO_END.format(args.output))
+
+# =====================================
+# Main
+# =====================================
+if __name__ == "__main__":
+    args = init_parser().parse_args()
+    progress.set_batch_mode(args.batch)
+    main(args)
@@ -0,0 +1,114 @@
+"""Functions that sort text lines bigger than the available memory, spilling sorted runs
+to temporary files and merging them afterwards, at most MERGE_FAN_IN at a time. Used by
+the analysis scripts to join logs by request ID with a bounded amount of memory
+
+Author: Carlos Cagigao Bravo
+"""
+
+import heapq
+import os
+import sys
+import tempfile
+
+# =====================================
+# Constant variables
+# =====================================
+RUN_PREFIX = "run-"
+RUN_ENCODING = "utf-8"
+RUN_ERRORS = "surrogateescape"
+POINTER_SIZE = 8
+MEGABYTE = 1024 * 1024
+MERGE_FAN_IN = 64
+
+# =====================================
+# Functions
+# =====================================
+def write_run(lines, temporary_folder):
+    """Sorts the lines and writes them in a new temporary file
+
+    :param lines: lines to sort, every one finished with a line break
+    :type lines: list
+    :param temporary_folder: folder where the file is created
+    :type temporary_folder: string
+
+    :return: name of the temporary file
+    :rtype: string
+    """
+    lines.sort()
+    run_descriptor, run_file_name = tempfile.mkstemp(prefix=RUN_PREFIX, dir=temporary_folder)
+    with open(run_descriptor, 'w', encoding=RUN_ENCODING, errors=RUN_ERRORS) as run_file:
+        run_file.writelines(lines)
+    return run_file_name
+
+def merge_runs(run_file_names, temporary_folder):
+    """Merges sorted runs in a new temporary file, removing them
+
+    :param run_file_names: names of the temporary files of the runs
+    :type run_file_names: list
+    :param temporary_folder: folder where the file is created
+    :type temporary_folder: string
+
+    :return: name of the temporary file
+    :rtype: string
+    """
+    run_descriptor, merged_file_name = tempfile.mkstemp(prefix=RUN_PREFIX, dir=temporary_folder)
+    run_files = [open(run_file_name, encoding=RUN_ENCODING, errors=RUN_ERRORS) for run_file_name in run_file_names]
+    try:
+        with open(run_descriptor, 'w', encoding=RUN_ENCODING, errors=RUN_ERRORS) as merged_file:
+            merged_file.writelines(heapq.merge(*run_files))
+    finally:
+        for run_file in run_files:
+            run_file.close()
+        for run_file_name in run_file_names:
+            os.remove(run_file_name)
+    return merged_file_name
+
+def sort_lines(lines, memory_budget, temporary_folder):
+    """Sorts the lines keeping in memory at most memory_budget bytes of them.
+
+    Lines are accumulated until the budget is reached, then they are sorted and written in a
+    temporary file (a run). Finally the runs are merged reading one line of every run at a
+    time. Only MERGE_FAN_IN runs are opened at once, so while there are more, groups of them
+    are merged in new runs, keeping the open files under the system limit with any number of
+    runs. If every line fits in the budget no file is written
+
+    :param lines: iterable of lines, every one finished with a line break
+    :type lines: iterable
+    :param memory_budget: bytes of lines kept in memory
+    :type memory_budget: int
+    :param temporary_folder: folder where the runs are created
+    :type temporary_folder: string
+
+    :return: generator of sorted lines
+    :rtype: generator
+    """
+    run_file_names = list()
+    chunk = list()
+    chunk_size = 0
+    for line in lines:
+        chunk.append(line)
+        chunk_size += sys.getsizeof(line) + POINTER_SIZE
+        if chunk_size >= memory_budget:
+            run_file_names.append(write_run(chunk, temporary_folder))
+            chunk = list()
+            chunk_size = 0
+
+    if not run_file_names:
+        chunk.sort()
+        yield from chunk
+        return
+
+    if chunk:
+        run_file_names.append(write_run(chunk, temporary_folder))
+    chunk = None
+    while len(run_file_names) > MERGE_FAN_IN:
+        run_file_names = [merge_runs(run_file_names[index:index + MERGE_FAN_IN], temporary_folder) \
+            for index in range(0, len(run_file_names), MERGE_FAN_IN)]
+    run_files = [open(run_file_name, encoding=RUN_ENCODING, errors=RUN_ERRORS) for run_file_name in run_file_names]
+    try:
+        yield from heapq.merge(*run_files)
+    finally:
+        for run_file in run_files:
+            run_file.close()
+        for run_file_name in run_file_names:
+            os.remove(run_file_name)
@@ -0,0 +1,507 @@
+"""Script that follows Nemesida log files while they are being written, appending new
+lines to .index, .clean and .attacks files. A checkpoint with the inode and the offset
+of every log is saved after each read, so a stopped run resumes where it was left and
+rotated logs are drained before reading the new ones.
+
+Usage: follower.py [-h] [-e error_log] [-a access_log] [-s seconds] [-b] -id
+                   id
+
+optional arguments:
+  -h, --help     show this help message and exit
+  -e error_log   Nginx error log file which contains information about
+                 Nemesida blocked urls. By default: /var/log/nginx/error.log
+  -a access_log  Nginx access log file which contains information about access
+                 to the server. By default: /var/log/nginx/access.log
+  -s seconds     Seconds waited between two reads of the log files. By
+                 default: 1.0
+  -b             Batch mode, progress of the analysis is not shown. It is not
+                 shown either when the output is not a terminal
+
+required arguments:
+  -id id         Numeric value added to idenfity generated files
+
+Author: Carlos Cagigao Bravo
+"""
+
+import argparse
+from logger import log
+import json
+import os
+import signal
+import time
+from urllib import parse
+import analyzer
+import comparer
+import progress
+
+# =====================================
+# Constant variables
+# =====================================
+DESCRIPTION = "Script that follows Nemesida log files while they are being written, appending new lines to \
+.index, .clean and .attacks files"
+REQUIRED_ARGS = "required arguments"
+
+INTERVAL_ARG = "-s"
+INTERVAL_DEFAULT = 1.0
+INTERVAL_HELP = "Seconds waited between two reads of the log files. By default: %s" % INTERVAL_DEFAULT
+INTERVAL_VARIABLE_NAME = "seconds"
+
+CHECKPOINT_EXT = "checkpoint"
+CHECKPOINT_TEMPORARY_EXT = ".tmp"
+ROTATED_SUFFIX = ".1"
+ACCESS_LOG = "access_log"
+ERROR_LOG = "error_log"
+INODE = "inode"
+OFFSET = "offset"
+FILES = "files"
+ATTACKS_HEADER = "attacks_header"
+STATISTICS = "statistics"
+RULE_IDS = "rule_ids"
+ERROR_LINES = "error_lines"
+NUMBERING = "numbering"
+RULE_IDS_EXPIRATION_LINES = 10000
+LINE_BREAK = "\n"
+BUFFER_SIZE = 1024 * 1024
+
+FOLLOW_START = "Following {} and {} files, press Ctrl+C to stop"
+CHECKPOINT_LOADED = "Resuming from checkpoint {}: {} lines of access log already analyzed"
+ROTATION_DETECTED = "File {} has been rotated, reading the rest of {}"
+ROTATED_FILE_NOT_FOUND = "File {} has been rotated but the previous file was not found, some lines may be lost"
+TRUNCATION_DETECTED = "File {} has been truncated, reading it from the beginning"
+RULE_IDS_EXPIRED = "Rule IDs of {} requests removed, their access log lines were not found after {} lines of error log"
+FOLLOW_END = "Files {}, {} and {} updated. Checkpoint written in {}"
+
+# =====================================
+# Functions
+# =====================================
+def init_parser():
+    """Retrieves the parameters with which it has been executed
+
+    :rtype: ArgumentParser
+    :return: arguments prepared to be parsed
+    """
+    parser = argparse.ArgumentParser(description=DESCRIPTION)
+    required_arguments = parser.add_argument_group(REQUIRED_ARGS)
+    parser.add_argument(analyzer.ERROR_LOG_ARG, help=analyzer.ERROR_LOG_HELP, default=analyzer.ERROR_LOG_DEFAULT, \
+        metavar=analyzer.ERROR_LOG_VARIABLE_NAME, dest=analyzer.ERROR_LOG_VARIABLE_NAME)
+    parser.add_argument(analyzer.ACCESS_LOG_ARG, help=analyzer.ACCESS_LOG_HELP, default=analyzer.ACCESS_LOG_DEFAULT, \
+        metavar=analyzer.ACCESS_LOG_VARIABLE_NAME, dest=analyzer.ACCESS_LOG_VARIABLE_NAME)
+    parser.add_argument(INTERVAL_ARG, help=INTERVAL_HELP, default=INTERVAL_DEFAULT, \
+        metavar=INTERVAL_VARIABLE_NAME, dest=INTERVAL_VARIABLE_NAME, type=float)
+    progress.add_optional_arguments(parser)
+    analyzer.add_required_arguments(required_arguments)
+    return parser
+
+def get_inode(file_name):
+    """Gets the inode of a file
+
+    :param file_name: name of the file
+    :type file_name: string
+
+    :return: inode of the file or None if it does not exist
+    :rtype: int
+    """
+    try:
+        return os.stat(file_name).st_ino
+    except FileNotFoundError:
+        return None
+
+def get_stat(file_name):
+    """Gets the inode and the size of a file
+
+    :param file_name: name of the file
+    :type file_name: string
+
+    :return: inode and size of the file as a position, inode is None if it does not exist
+    :rtype: dict
+    """
+    try:
+        file_stat = os.stat(file_name)
+        return {INODE: file_stat.st_ino, OFFSET: file_stat.st_size}
+    except FileNotFoundError:
+        return {INODE: None, OFFSET: 0}
+
+def read_chunk(log_file, size):
+    """Reads the next chunk of a file without going beyond size
+
+    :param log_file: file being read
+    :type log_file: file in binary read mode
+    :param size: offset where reading stops, None to read until the end of the file
+    :type size: int
+
+    :rtype: bytes
+    """
+    if size is None:
+        return log_file.read(BUFFER_SIZE)
+    return log_file.read(max(0, min(BUFFER_SIZE, size - log_file.tell())))
+
+def read_complete_lines(file_name, position, size=None):
+    """Reads the lines written in a file from the offset of position. A line is only
+    returned when its line break has been written, and the offset is moved after it
+    once the next line is requested
+
+    :param file_name: name of the file
+    :type file_name: string
+    :param position: inode and offset of the file, offset is updated while reading
+    :type position: dict
+    :param size: offset where reading stops, None to read until the end of the file
+    :type size: int
+
+    :return: generator of complete lines, every one finished with a line break
+    :rtype: generator
+    """
+    with open(file_name, 'rb') as log_file:
+        log_file.seek(position[OFFSET])
+        pending = b""
+        chunk = read_chunk(log_file, size)
+        while chunk:
+            pending += chunk
+            end = pending.rfind(comparer.LINE_BREAK) + 1
+            if end:
+                lines = pending[:end].decode(analyzer.ISO_8859_1).split(LINE_BREAK)
+                for line in lines[:-1]:
+                    line += LINE_BREAK
+                    yield line
+                    position[OFFSET] += len(line)
+                pending = pending[end:]
+            chunk = read_chunk(log_file, size)
+
+def read_new_lines(file_name, position, end=None):
+    """Reads the lines appended to a log file since the last read.
+
+    If the inode of the file has changed, the log has been rotated, so the rest of the
+    previous file (file_name.1) is read before starting the new one from the beginning.
+    If the file is smaller than the offset it has been truncated and is read again. When
+    end is indicated, only the lines written before it are read: nothing if the file has
+    been created or rotated after it
+
+    :param file_name: name of the log file
+    :type file_name: string
+    :param position: inode and offset of the file in the last read, updated while reading
+    :type position: dict
+    :param end: inode and size of the file where reading stops, returned by get_stat
+    :type end: dict
+
+    :return: generator of complete lines
+    :rtype: generator
+    """
+    inode = get_inode(file_name)
+    if inode is None or end is not None and end[INODE] != inode:
+        return
+    if position[INODE] is not None and position[INODE] != inode:
+        rotated_file_name = file_name + ROTATED_SUFFIX
+        if get_inode(rotated_file_name) == position[INODE]:
+            log.info(ROTATION_DETECTED.format(file_name, rotated_file_name))
+            yield from read_complete_lines(rotated_file_name, position)
+        else:
+            log.warn(ROTATED_FILE_NOT_FOUND.format(file_name))
+        position[OFFSET] = 0
+    elif os.path.getsize(file_name) < position[OFFSET]:
+        log.warn(TRUNCATION_DETECTED.format(file_name))
+        position[OFFSET] = 0
+    position[INODE] = inode
+    yield from read_complete_lines(file_name, position, end[OFFSET] if end is not None else None)
+
+def get_new_checkpoint():
+    """Creates the checkpoint of a run that has not read anything yet
+
+    :return: checkpoint
+    :rtype: dict
+    """
+    return {
+        ACCESS_LOG: {INODE: None, OFFSET: 0},
+        ERROR_LOG: {INODE: None, OFFSET: 0},
+        FILES: {comparer.INDEX_EXT: 0, comparer.CLEAN_EXT: 0, comparer.ATTACKS_EXT: 0},
+        ATTACKS_HEADER: 0,
+        STATISTICS: analyzer.RunStatistics().to_dict(),
+        RULE_IDS: dict(),
+        ERROR_LINES: dict(),
+        NUMBERING: analyzer.AccessLogNumbering().to_dict()
+    }
+
+def load_checkpoint(checkpoint_file_name):
+    """Loads the checkpoint saved by a previous run
+
+    :param checkpoint_file_name: name of the checkpoint file
+    :type checkpoint_file_name: string
+
+    :return: checkpoint, or a new one if the file does not exist
+    :rtype: dict
+    """
+    if not os.path.isfile(checkpoint_file_name):
+        return get_new_checkpoint()
+    with open(checkpoint_file_name) as checkpoint_file:
+        return json.load(checkpoint_file)
+
+def get_checkpoint_statistics(checkpoint):
+    """Recovers the statistics saved in the checkpoint
+
+    :param checkpoint: checkpoint
+    :type checkpoint: dict
+
+    :return: statistics of the run until the checkpoint
+    :rtype: analyzer.RunStatistics
+    """
+    statistics = analyzer.RunStatistics()
+    for name, value in checkpoint[STATISTICS].items():
+        setattr(statistics, name, value)
+    return statistics
+
+def save_checkpoint(checkpoint, checkpoint_file_name):
+    """Writes the checkpoint in a temporary file and renames it, so a stopped run
+    never leaves a partial checkpoint
+
+    :param checkpoint: checkpoint to save
+    :type checkpoint: dict
+    :param checkpoint_file_name: name of the checkpoint file
+    :type checkpoint_file_name: string
+    """
+    temporary_file_name = checkpoint_file_name + CHECKPOINT_TEMPORARY_EXT
+    with open(temporary_file_name, 'w') as checkpoint_file:
+        json.dump(checkpoint, checkpoint_file)
+        checkpoint_file.flush()
+        os.fsync(checkpoint_file.fileno())
+    os.replace(temporary_file_name, checkpoint_file_name)
+
+def truncate_analysis_files(file_names, file_sizes):
+    """Truncates analysis files to the sizes saved in the checkpoint, removing the lines
+    written after it by a run that was stopped
+
+    :param file_names: analysis file names by extension
+    :type file_names: dict
+    :param file_sizes: analysis file sizes by extension
+    :type file_sizes: dict
+    """
+    for extension, file_name in file_names.items():
+        with open(file_name, 'a') as analysis_file:
+            analysis_file.truncate(file_sizes[extension])
+
+def write_attacks_header(attacks_file_name, checkpoint):
+    """Writes the header of .attacks file with the statistics of the checkpoint, replacing
+    the header written when the previous run was stopped
+
+    :param attacks_file_name: name of .attacks file
+    :type attacks_file_name: string
+    :param checkpoint: checkpoint whose sizes are updated with the new header
+    :type checkpoint: dict
+    """
+    header = comparer.get_attacks_header(get_checkpoint_statistics(checkpoint))
+    temporary_file_name = attacks_file_name + CHECKPOINT_TEMPORARY_EXT
+    with open(attacks_file_name, encoding=analyzer.ISO_8859_1) as attacks_file, \
+        open(temporary_file_name, 'w', encoding=analyzer.ISO_8859_1) as temporary_file:
+        attacks_file.seek(checkpoint[ATTACKS_HEADER])
+        temporary_file.write(header)
+        for line in attacks_file:
+            temporary_file.write(line)
+    os.replace(temporary_file_name, attacks_file_name)
+    checkpoint[FILES][comparer.ATTACKS_EXT] += len(header) - checkpoint[ATTACKS_HEADER]
+    checkpoint[ATTACKS_HEADER] = len(header)
+
+def analyze_access_log_line(line, access_log_cp, rule_ids_by_request_id, error_lines_by_request_id, analysis_files, \
+    statistics, numbering):
+    """Writes an access log line completed to .clean file or to .index and .attacks files,
+    being its number in the launched file the packet number. Run markers of resumed launches
+    and lines launched again whose number was already read are not written, as analyzer does
+
+    :param line: access log line
+    :type line: string
+    :param access_log_cp: compiled pattern for access log
+    :type access_log_cp: compiled pattern in re library
+    :param rule_ids_by_request_id: rule IDs of error log not yet written by request ID
+    :type rule_ids_by_request_id: dict
+    :param error_lines_by_request_id: error log line of the first rule ID not yet written by request ID
+    :type error_lines_by_request_id: dict
+    :param analysis_files: opened analysis files by extension
+    :type analysis_files: dict
+    :param statistics: statistics where lines and bytes read are counted
+    :type statistics: analyzer.RunStatistics
+    :param numbering: numbering of the access log lines read
+    :type numbering: analyzer.AccessLogNumbering
+    """
+    line_number = numbering.number(line)
+    result = access_log_cp.search(line)
+    if result is not None:
+        request_id = result.group('id')
+        rule_ids = rule_ids_by_request_id.pop(request_id, [])
+        error_lines_by_request_id.pop(request_id, None)
+    if line_number is None:
+        return
+    statistics.input_lines += 1
+    statistics.bytes_read += len(line)
+    if result is None:
+        return
+    decoded_uri = parse.unquote(result.group('uri'))
+    if result.group('http_status') == analyzer.HTTP_BLOCKED_STATUS:
+        timestamp = result.group('timestamp')
+        index_line = analyzer.INDEX_FILE_LINE.format(timestamp, decoded_uri, request_id, result.group('bt'))
+        index_line = analyzer.add_string_from_index(index_line, len(index_line) - 1, \
+            analyzer.get_nattacks_string(rule_ids))
+        analysis_files[comparer.INDEX_EXT].write(index_line)
+        analysis_files[comparer.ATTACKS_EXT].write(comparer.PACKET_DATA.format(line_number) + \
+            index_line[len(timestamp) + 1:])
+        statistics.attack_lines += 1
+    else:
+        analysis_files[comparer.CLEAN_EXT].write(analyzer.CLEAN_FILE_LINE.format(decoded_uri))
+        statistics.clean_lines += 1
+
+def analyze_error_log_line(line, error_log_cp, rule_ids_by_request_id, error_lines_by_request_id, statistics):
+    """Keeps the rule ID of an error log line until the access log line of its request is read
+
+    :param line: error log line
+    :type line: string
+    :param error_log_cp: compiled pattern for error log
+    :type error_log_cp: compiled pattern in re library
+    :param rule_ids_by_request_id: rule IDs of error log not yet written by request ID
+    :type rule_ids_by_request_id: dict
+    :param error_lines_by_request_id: error log line of the first rule ID not yet written by request ID
+    :type error_lines_by_request_id: dict
+    :param statistics: statistics where lines and bytes read are counted
+    :type statistics: analyzer.RunStatistics
+    """
+    statistics.error_log_lines += 1
+    statistics.bytes_read += len(line)
+    result = error_log_cp.search(line)
+    if result is not None:
+        rule_ids_by_request_id.setdefault(result.group('id'), list()).append(result.group('rule_id'))
+        error_lines_by_request_id.setdefault(result.group('id'), statistics.error_log_lines)
+
+def expire_rule_ids(rule_ids_by_request_id, error_lines_by_request_id, error_log_lines):
+    """Removes the rule IDs of the requests whose access log line has not been read after
+    RULE_IDS_EXPIRATION_LINES lines of error log, which would be kept in every checkpoint
+    otherwise. Requests are kept in the order of their first error log line, so only the
+    oldest ones are checked
+
+    :param rule_ids_by_request_id: rule IDs of error log not yet written by request ID
+    :type rule_ids_by_request_id: dict
+    :param error_lines_by_request_id: error log line of the first rule ID not yet written by request ID
+    :type error_lines_by_request_id: dict
+    :param error_log_lines: lines of error log read
+    :type error_log_lines: int
+    """
+    expired_request_ids = list()
+    for request_id, error_line in error_lines_by_request_id.items():
+        if error_line > error_log_lines - RULE_IDS_EXPIRATION_LINES:
+            break
+        expired_request_ids.append(request_id)
+    for request_id in expired_request_ids:
+        del error_lines_by_request_id[request_id]
+        rule_ids_by_request_id.pop(request_id, None)
+    if expired_request_ids:
+        log.warn(RULE_IDS_EXPIRED.format(len(expired_request_ids), RULE_IDS_EXPIRATION_LINES))
+
+def follow_logs(access_log_arg, error_log_arg, file_identifier, interval):
+    """Reads the new lines of error log and access log every interval seconds until the
+    script is stopped.
+
+    Error log is read first because Nemesida writes the rule IDs of a request before its
+    access log line, and access log is only read up to the size it had before reading error
+    log, so the rule IDs of every access log line read have already been read. After every
+    read the analysis files are flushed and synced to disk before the checkpoint is saved,
+    so when the script is stopped the files are truncated to the last checkpoint,
+    the header of .attacks file is rewritten and the statistics are saved
+
+    :param access_log_arg: access log retrieved from command line
+    :type access_log_arg: string
+    :param error_log_arg: error log retrieved from command line
+    :type error_log_arg: string
+    :param file_identifier: numeric value added to identify generated files
+    :type file_identifier: int
+    :param interval: seconds waited between two reads
+    :type interval: float
+
+    :return: statistics of the run
+    :rtype: analyzer.RunStatistics
+    """
+    file_names = {extension: comparer.ANALYSIS_FILE_NAME.format(file_identifier, extension) \
+        for extension in (comparer.INDEX_EXT, comparer.CLEAN_EXT, comparer.ATTACKS_EXT)}
+    checkpoint_file_name = comparer.ANALYSIS_FILE_NAME.format(file_identifier, CHECKPOINT_EXT)
+    statistics_file_name = comparer.ANALYSIS_FILE_NAME.format(file_identifier, comparer.STATISTICS_EXT)
+
+    checkpoint = load_checkpoint(checkpoint_file_name)
+    if checkpoint[STATISTICS]["input_lines"]:
+        log.info(CHECKPOINT_LOADED.format(checkpoint_file_name, checkpoint[STATISTICS]["input_lines"]))
+    truncate_analysis_files(file_names, checkpoint[FILES])
+    statistics = get_checkpoint_statistics(checkpoint)
+    rule_ids_by_request_id = checkpoint[RULE_IDS]
+    error_lines_by_request_id = checkpoint.setdefault(ERROR_LINES, \
+        dict.fromkeys(rule_ids_by_request_id, statistics.error_log_lines))
+    numbering = analyzer.AccessLogNumbering(**checkpoint.setdefault(NUMBERING, \
+        analyzer.AccessLogNumbering(line=statistics.input_lines, last_line=statistics.input_lines).to_dict()))
+    positions = {ACCESS_LOG: dict(checkpoint[ACCESS_LOG]), ERROR_LOG: dict(checkpoint[ERROR_LOG])}
+    access_log_cp = analyzer.get_access_log_compiled_pattern()
+    error_log_cp = analyzer.get_error_log_compiled_pattern()
+    read_lines = progress.Progress(analyzer.READING_FILE.format(access_log_arg))
+
+    log.info(FOLLOW_START.format(access_log_arg, error_log_arg))
+    analysis_files = {extension: open(file_name, 'a') for extension, file_name in file_names.items()}
+    try:
+        while True:
+            access_log_end = get_stat(access_log_arg)
+            for line in read_new_lines(error_log_arg, positions[ERROR_LOG]):
+                analyze_error_log_line(line, error_log_cp, rule_ids_by_request_id, error_lines_by_request_id, \
+                    statistics)
+            for line in read_new_lines(access_log_arg, positions[ACCESS_LOG], access_log_end):
+                analyze_access_log_line(line, access_log_cp, rule_ids_by_request_id, error_lines_by_request_id, \
+                    analysis_files, statistics, numbering)
+            expire_rule_ids(rule_ids_by_request_id, error_lines_by_request_id, statistics.error_log_lines)
+            for analysis_file in analysis_files.values():
+                analysis_file.flush()
+                os.fsync(analysis_file.fileno())
+            checkpoint[ACCESS_LOG] = positions[ACCESS_LOG]
+            checkpoint[ERROR_LOG] = positions[ERROR_LOG]
+            checkpoint[FILES] = {extension: analysis_file.tell() \
+                for extension, analysis_file in analysis_files.items()}
+            checkpoint[STATISTICS] = statistics.to_dict()
+            checkpoint[NUMBERING] = numbering.to_dict()
+            save_checkpoint(checkpoint, checkpoint_file_name)
+            read_lines.update(statistics.input_lines)
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        print()
+    finally:
+        for analysis_file in analysis_files.values():
+            analysis_file.close()
+        checkpoint = load_checkpoint(checkpoint_file_name)
+        truncate_analysis_files(file_names, checkpoint[FILES])
+        write_attacks_header(file_names[comparer.ATTACKS_EXT], checkpoint)
+        save_checkpoint(checkpoint, checkpoint_file_name)
+
+    statistics = get_checkpoint_statistics(checkpoint)
+    statistics.save(statistics_file_name)
+    read_lines.done(statistics.input_lines)
+    log.info(analyzer.ANALYZED_URIS.format(statistics.attack_lines, statistics.clean_lines))
+    log.info(FOLLOW_END.format(file_names[comparer.INDEX_EXT], file_names[comparer.CLEAN_EXT], \
+        file_names[comparer.ATTACKS_EXT], checkpoint_file_name))
+    return statistics
+
+def stop(signal_number, frame):
+    """Stops following the logs when the script is terminated, as Ctrl+C does
+
+    :param signal_number: number of the received signal
+    :type signal_number: int
+    :param frame: current stack frame
+    :type frame: frame
+    """
+    raise KeyboardInterrupt()
+
+def main(args):
+    """Main function.
+
+    Follows access log and error log until the script is interrupted or terminated
+
+    :param args: command-line retrieved arguments
+    :type args: ArgumentParser.parse_args()
+
+    :return: statistics of the run
+    :rtype: analyzer.RunStatistics
+    """
+    signal.signal(signal.SIGTERM, stop)
+    return follow_logs(args.access_log, args.error_log, args.id, args.seconds)
+
+# =====================================
+# Main
+# =====================================
+if __name__ == "__main__":
+    args = init_parser().parse_args()
+    progress.set_batch_mode(args.batch)
+    main(args)
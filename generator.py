@@ -1,12 +1,14 @@
 """Script that generates a .uri file from a -raw.uri file. This script has been
 developed in order to work with the dataset provided by the university
 
-Usage: generator.py [-h] -i input [-o output]
+Usage: generator.py [-h] [-o output] [-b] -i input
 
 optional arguments:
   -h, --help  show this help message and exit
   -o output   Output file parsed with specifics uris every line break. By
               default: ''input_file_name'.uri'
+  -b          Batch mode, progress of the analysis is not shown. It is not
+              shown either when the output is not a terminal
 
 required arguments:
   -i input    Input file to be parsed in RAW format (fileName-raw.uri)
@@ -16,8 +18,10 @@ Author: Carlos Cagigao Bravo
 """
 
 import argparse
-from pwn import log
+from logger import log
+import os
 import re
+import progress
 
 # =====================================
 # Constant variables
@@ -42,7 +46,13 @@ LOG_INFO_MAIN = "Generating URI file..."
 URI_LOG_WARN = "WARNING: Unrecognized uris detected. Check {} file".format(WARN_FILE)
 URI_WARN = "WARNING: In line {}\tUnrecognized URI: {}"
 LOG_INFO_END = "File %s created"
+LOG_PROGRESS = "Parsing URIs"
+LOG_INFO_STREAM = "Generating URIs of {} while they are launched"
+URI_FILE_WARN = "WARNING: URI file {} could not be written: {}"
 FILE_NOT_EXISTS_ERROR = "File %s does not exist"
+ISO_8859_1 = "ISO-8859-1"
+URI_BATCH_SIZE = 1024
+QUEUE_BATCHES = 16
 
 # =====================================
 # Functions
@@ -77,6 +87,7 @@ def init_parser():
     parser = argparse.ArgumentParser(description=DESCRIPTION)
     required_arguments = parser.add_argument_group(REQUIRED_ARGS)
     add_optional_arguments(parser)
+    progress.add_optional_arguments(parser)
     add_required_arguments(required_arguments)
     return parser
 
@@ -127,6 +138,118 @@ def uri_fixer(uri):
         return SLASH + uri
     return uri
 
+def parse_raw_line(line, raw_cp):
+    """Parses a line of a -raw.uri file removing the length number at its beginning
+
+    :param line: line of the file with its line break
+    :type line: string
+    :param raw_cp: compiled pattern of get_raw_uri_file_compiled_pattern
+    :type raw_cp: compiled pattern in re library
+
+    :return: fixed uri with the line break of the line, empty if the line is empty
+    :rtype: string
+
+    Examples:
+    '15 /..//etc/passwd' => '/..//etc/passwd'
+    '21 html/en/xprtCmd.html' => '/html/en/xprtCmd.html'
+    """
+    result = raw_cp.search(line)
+    if result is not None:
+        uri_first_index = result.span('uri')[0]
+        return uri_fixer(line[uri_first_index:])
+    elif len(line)>0:
+        return uri_fixer(line)
+    return ''
+
+def read_raw_uris(input_file_name):
+    """Reads the fixed uris of a -raw.uri file one by one, the same lines that main writes in
+    .uri file. Empty lines are skipped
+
+    :param input_file_name: input file in RAW format
+    :type input_file_name: string
+
+    :return: generator of uris with their line break
+    :rtype: generator
+    """
+    raw_cp = get_raw_uri_file_compiled_pattern()
+    with open(input_file_name, 'r', encoding=ISO_8859_1, errors='ignore') as file:
+        for line in file:
+            uri = parse_raw_line(line, raw_cp)
+            if len(uri) > 0:
+                yield uri
+
+def write_uris_in_thread(uris, output_file_name):
+    """Yields the uris while a separate thread writes them in .uri file in batches, so the file
+    is written at the same time they are launched. If the file can not be written the uris are
+    still yielded and a warning is shown at the end
+
+    :param uris: iterable of uris with their line break
+    :type uris: iterable
+    :param output_file_name: .uri file
+    :type output_file_name: string
+
+    :return: generator of the same uris
+    :rtype: generator
+    """
+    import queue
+    import threading
+    batches = queue.Queue(maxsize=QUEUE_BATCHES)
+    write_errors = list()
+
+    def write():
+        batch = batches.get()
+        try:
+            with open(output_file_name, 'w') as file_out:
+                while batch is not None:
+                    file_out.write("".join(batch))
+                    batch = batches.get()
+        except OSError as write_error:
+            write_errors.append(write_error)
+            while batch is not None:
+                batch = batches.get()
+
+    thread = threading.Thread(target=write, daemon=True)
+    thread.start()
+    batch = list()
+    try:
+        for uri in uris:
+            yield uri
+            batch.append(uri)
+            if len(batch) >= URI_BATCH_SIZE:
+                batches.put(batch)
+                batch = list()
+    finally:
+        batches.put(batch)
+        batches.put(None)
+        thread.join()
+        if write_errors:
+            log.warn(URI_FILE_WARN.format(output_file_name, write_errors[0]))
+        else:
+            log.info(LOG_INFO_END % output_file_name)
+
+def generate_uris(input_file_name, output_file_name=None):
+    """Generates the fixed uris of a -raw.uri file one by one, so they can be launched while
+    the file is being read instead of after writing the whole .uri file. If output file is
+    indicated the uris are also written in it in a separate thread
+
+    :param input_file_name: input file in RAW format
+    :type input_file_name: string
+    :param output_file_name: .uri file, not written by default
+    :type output_file_name: string
+
+    :raises LogError: if input file does not exist
+
+    :return: generator of uris with their line break
+    :rtype: generator
+    """
+    if not os.path.isfile(input_file_name):
+        log.error(FILE_NOT_EXISTS_ERROR % input_file_name)
+    log.info(LOG_INFO_STREAM.format(input_file_name))
+    uris = read_raw_uris(input_file_name)
+    if output_file_name is None:
+        return uris
+    return write_uris_in_thread(uris, output_file_name)
+
 def main(args):
     """Main function.
     
@@ -147,22 +270,22 @@ def main(args):
     file_warn = open(WARN_FILE, 'w')
     exist_warnings = False
     try:
-        with open(args.input, 'r', encoding='ISO-8859-1', errors='ignore') as file:
+        with open(args.input, 'r', encoding=ISO_8859_1, errors='ignore') as file:
             count = 1
+            position = 0
             raw_cp = get_raw_uri_file_compiled_pattern()
+            parsed_lines = progress.Progress(LOG_PROGRESS, total=os.path.getsize(args.input))
             for line in file:
-                result = raw_cp.search(line)
-                uri = ''
-                if result is not None:
-                    uri_first_index = result.span('uri')[0]
-                    uri = uri_fixer(line[uri_first_index:])
-                elif len(line)>0:
-                    uri = uri_fixer(line)
+                position += len(line)
+                parsed_lines.update(count, position)
+                uri = parse_raw_line(line, raw_cp)
+                if len(uri) > 0:
+                    file_out.write(uri)
                 else:
                     exist_warnings = True
                     file_warn.write(URI_WARN.format(count, line))
-                if len(uri) > 0: file_out.write(uri)
                 count += 1
+            parsed_lines.done(count - 1)
             file.close()
         file_out.close()
         file_warn.close()
@@ -179,4 +302,5 @@ def main(args):
 # =====================================
 if __name__ == "__main__":
     args = init_parser().parse_args()
+    progress.set_batch_mode(args.batch)
     main(args)
\ No newline at end of file
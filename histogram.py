@@ -0,0 +1,170 @@
+"""Histogram of integer values with a fixed relative precision, in the style of HdrHistogram.
+
+Values are counted in buckets whose width grows with the value, so any value between one
+and hours of microseconds is recorded with the indicated number of significant digits using
+a few thousand counters. Used by launcher to record the latency of every request
+
+Author: Carlos Cagigao Bravo
+"""
+
+import math
+
+# =====================================
+# Constant variables
+# =====================================
+SIGNIFICANT_DIGITS = 3
+PERCENTILES = (50, 90, 99, 99.9)
+PERCENTILE_NAME = "p{}"
+MICROSECONDS = 1000000
+MILLISECONDS = 1000
+
+# =====================================
+# Classes
+# =====================================
+class Histogram:
+    """Counts of recorded values by bucket.
+
+    Values lower than twice the sub-bucket size are counted exactly. Greater values are shifted
+    to the right until they fit in half of the sub-buckets, so the error of every recorded value
+    is lower than 1 / 10^significant_digits
+    """
+
+    def __init__(self, significant_digits=SIGNIFICANT_DIGITS):
+        """Creates an empty histogram
+
+        :param significant_digits: number of significant digits kept of every value
+        :type significant_digits: int
+        """
+        self.significant_digits = significant_digits
+        self.half_magnitude = math.ceil(math.log2(2 * 10 ** significant_digits)) - 1
+        self.half_count = 1 << self.half_magnitude
+        self.counts = dict()
+        self.total = 0
+        self.sum = 0
+        self.min = None
+        self.max = None
+
+    def get_index(self, value):
+        """Gets the index of the counter of a value
+
+        :param value: non-negative value
+        :type value: int
+
+        :return: index of the counter
+        :rtype: int
+        """
+        shift = max(0, value.bit_length() - self.half_magnitude - 1)
+        return shift * self.half_count + (value >> shift)
+
+    def get_highest_value(self, index):
+        """Gets the highest value counted in a counter
+
+        :param index: index of the counter
+        :type index: int
+
+        :return: highest value equivalent to the ones of the counter
+        :rtype: int
+        """
+        shift = max(0, index // self.half_count - 1)
+        return ((index - shift * self.half_count) << shift) + (1 << shift) - 1
+
+    def record(self, value, count=1):
+        """Records a value
+
+        :param value: non-negative value, negative values are recorded as 0
+        :type value: int
+        :param count: times the value is recorded
+        :type count: int
+        """
+        value = max(0, int(value))
+        index = self.get_index(value)
+        self.counts[index] = self.counts.get(index, 0) + count
+        self.total += count
+        self.sum += value * count
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def merge(self, histogram):
+        """Adds the counts of other histogram with the same significant digits
+
+        :param histogram: histogram to add
+        :type histogram: Histogram
+        """
+        for index, count in histogram.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.total += histogram.total
+        self.sum += histogram.sum
+        for value in (histogram.min, histogram.max):
+            if value is not None:
+                self.min = value if self.min is None else min(self.min, value)
+                self.max = value if self.max is None else max(self.max, value)
+
+    def get_percentile(self, percentile):
+        """Gets the value below which the indicated percentage of recorded values are
+
+        :param percentile: percentage between 0 and 100
+        :type percentile: float
+
+        :return: highest value equivalent to the one of the percentile, None if it is empty
+        :rtype: int
+        """
+        if self.total == 0:
+            return None
+        target = max(1, math.ceil(percentile * self.total / 100))
+        accumulated = 0
+        for index in sorted(self.counts):
+            accumulated += self.counts[index]
+            if accumulated >= target:
+                return min(self.get_highest_value(index), self.max)
+        return self.max
+
+    def get_summary(self, unit=MILLISECONDS):
+        """Summarizes the histogram of values recorded in microseconds
+
+        :param unit: units per second of the summary values
+        :type unit: int
+
+        :return: count, mean, min, max and percentiles converted to unit
+        :rtype: dict
+
+        Example:
+            {'count': 3, 'mean': 1.2, 'min': 0.9, 'max': 1.6, 'p50': 1.1, ...}
+        """
+        divisor = MICROSECONDS / unit
+        summary = {"count": self.total}
+        summary["mean"] = self.sum / self.total / divisor if self.total else None
+        summary["min"] = self.min / divisor if self.min is not None else None
+        summary["max"] = self.max / divisor if self.max is not None else None
+        for percentile in PERCENTILES:
+            value = self.get_percentile(percentile)
+            summary[PERCENTILE_NAME.format(percentile).replace(".", "")] = \
+                value / divisor if value is not None else None
+        return summary
+
+    def to_dict(self):
+        """Gets the histogram as a dictionary that can be written in a JSON file
+
+        :return: significant digits, counts by index, total, sum, min and max
+        :rtype: dict
+        """
+        return {"significant_digits": self.significant_digits, "counts": self.counts, "total": self.total, \
+            "sum": self.sum, "min": self.min, "max": self.max}
+
+    @classmethod
+    def from_dict(cls, values):
+        """Creates a histogram from the dictionary returned by to_dict, also after being read
+        from a JSON file
+
+        :param values: dictionary returned by to_dict
+        :type values: dict
+
+        :return: histogram
+        :rtype: Histogram
+        """
+        histogram = cls(values["significant_digits"])
+        histogram.counts = {int(index): count for index, count in values["counts"].items()}
+        histogram.total = values["total"]
+        histogram.sum = values["sum"]
+        histogram.min = values["min"]
+        histogram.max = values["max"]
+        return histogram
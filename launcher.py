@@ -1,6 +1,8 @@
 """Script that launches some URIs to specific URL
 
-Usage: launcher.py [-h] [-u url] [-p port] -f file_location
+Usage: launcher.py [-h] [-u url] [-p port] [-c concurrency] [-r results]
+                   [-rt rate] [-re] [-pr processes] [-id id] [-vc cache]
+                   [-rs ruleset] [-vcs cache_size] [-b] -f file_location
 
 optional arguments:
   -h, --help        show this help message and exit
@@ -8,6 +10,47 @@ optional arguments:
                     configuration file. By default: 'http://localhost'
   -p port           Specific port to launch the URIs from the file. By
                     default: '80'
+  -c concurrency    Number of URIs launched concurrently through persistent
+                    HTTP/1.1 keep-alive connections. By default URIs are
+                    launched one by one opening a new connection for each one
+  -r results        File where the line number, HTTP status, latency and
+                    request ID of every launched URI are written. Request ID
+                    and block type are recovered from X-Request-ID and
+                    X-Block-Type response headers
+  -rt rate          Requests per second launched at fixed intervals without
+                    waiting for the responses (open loop). Latency is measured
+                    from the time every request was scheduled and its
+                    percentiles are written in analysis-'id'.latency.json.
+                    Concurrency limits the number of open connections, by
+                    default: 512
+  -re               Resumes an interrupted launch of the same file and id
+                    after the last line whose response, and the ones of all
+                    previous lines, had been received, appending to the
+                    results file. Checkpoints of that line are written in
+                    analysis-'id'.launcher.checkpoint while launching, or in
+                    'file'.launcher.checkpoint when id is not indicated, and a
+                    run marker request is sent so analyzer can separate the
+                    attempts in the access log
+  -pr processes     Number of processes launching line ranges of the file in
+                    parallel, each one through its own connections as
+                    concurrency indicates and at the rate divided between
+                    them. Results of every process are merged by line number
+                    and the combined throughput is shown. By default the file
+                    is launched by a single process
+  -id id            Numeric value added to idenfity generated files. By
+                    default is the current timestamp: ${current_timestamp}
+  -vc cache         SQLite file where the verdicts of launched URIs are kept
+                    by URI and ruleset. Launcher does not launch the URIs
+                    whose verdict is cached, writing it in the results file
+                    instead, and analyzer adds the verdicts of the results
+                    file to the cache
+  -rs ruleset       Identifier of the ruleset of Nemesida WAF whose verdicts
+                    are cached, e.g. its Docker image. Required with verdict
+                    cache
+  -vcs cache_size   Maximum number of verdicts kept in the cache, the least
+                    recently used ones are removed. By default: 1000000
+  -b                Batch mode, progress of the analysis is not shown. It is
+                    not shown either when the output is not a terminal
 
 required arguments:
   -f file_location  File that contains some URIs to launch. This file must be
@@ -17,9 +60,22 @@ Author: Carlos Cagigao Bravo
 """
 
 import argparse
-from urllib import parse, request, error
-from pwn import log
+import array
+import contextlib
+from datetime import datetime
+import itertools
+import json
+from email import utils
+from urllib import parse
+from logger import log
+import os
 import re
+import shutil
+import tempfile
+import time
+import histogram
+import progress
+import verdict_cache
 
 # =====================================
 # Constant variables
@@ -37,15 +93,267 @@ PORT_DEFAULT = 80
 PORT_HELP = "Specific port to launch the URIs from the file. By default: '%s'" % PORT_DEFAULT
 PORT_VARIABLE_NAME = "port"
 
+MAX_CONNECTIONS_DEFAULT = 512
+
+CONCURRENCY_ARG = "-c"
+CONCURRENCY_HELP = "Number of URIs launched concurrently through persistent HTTP/1.1 keep-alive connections. \
+By default URIs are launched one by one opening a new connection for each one"
+CONCURRENCY_VARIABLE_NAME = "concurrency"
+
+RESULTS_ARG = "-r"
+RESULTS_HELP = "File where the line number, HTTP status, latency and request ID of every launched URI are \
+written. Request ID and block type are recovered from X-Request-ID and X-Block-Type response headers"
+RESULTS_VARIABLE_NAME = "results"
+
+RATE_ARG = "-rt"
+RATE_HELP = "Requests per second launched at fixed intervals without waiting for the responses (open loop). \
+Latency is measured from the time every request was scheduled and its percentiles are written in \
+analysis-'id'.latency.json. Concurrency limits the number of open connections, by default: %s" % MAX_CONNECTIONS_DEFAULT
+RATE_VARIABLE_NAME = "rate"
+
+IDENTIFIER_ARG = "-id"
+IDENTIFIER_DEFAULT = int(datetime.timestamp(datetime.now()))
+IDENTIFIER_HELP = "Numeric value added to idenfity generated files. By default is the current timestamp: %s" \
+    % IDENTIFIER_DEFAULT
+IDENTIFIER_VARIABLE_NAME = "id"
+
+RESUME_ARG = "-re"
+RESUME_HELP = "Resumes an interrupted launch of the same file and id after the last line whose response, and \
+the ones of all previous lines, had been received, appending to the results file. Checkpoints of that line are \
+written in analysis-'id'.launcher.checkpoint while launching, or in 'file'.launcher.checkpoint when id is not \
+indicated, and a run marker request is sent so analyzer can separate the attempts in the access log"
+RESUME_VARIABLE_NAME = "resume"
+
+PROCESSES_ARG = "-pr"
+PROCESSES_HELP = "Number of processes launching line ranges of the file in parallel, each one through its own \
+connections as concurrency indicates and at the rate divided between them. Results of every process are merged by \
+line number and the combined throughput is shown. By default the file is launched by a single process"
+PROCESSES_VARIABLE_NAME = "processes"
+
 FILE_ARG = "-f"
 FILE_HELP = "File that contains some URIs to launch. This file must be formatted previously"
 FILE_VARIABLE_NAME = "file_location"
 
 LOG_INFO_MAIN = "Sending attacks to {} on port {}"
 LOG_PROGRESS_FILE = "File line number"
-LOG_PROGRESS_URL = "Launching URL"
 LOG_INFO_MAIN_END = "File launched successfully"
+LOG_INFO_CONCURRENCY = "Launching {} URIs concurrently through keep-alive connections"
+LOG_INFO_RESPONSES = "[{}] blocked, [{}] not blocked, [{}] without response"
 FILE_NOT_EXISTS_ERROR = "File %s does not exist"
+INVALID_CONCURRENCY_ERROR = "Concurrency must be greater than 0"
+INVALID_RATE_ERROR = "Rate must be greater than 0"
+INVALID_PROCESSES_ERROR = "Processes must be greater than 0"
+LOG_INFO_PROCESSES = "Launching {} line ranges of {} in {} processes"
+LOG_INFO_PROCESS_THROUGHPUT = "Process {}: {} responses in {:.1f}s, {:.1f} responses/s"
+LOG_INFO_THROUGHPUT = "{} responses in {:.1f}s by {} processes: {:.1f} responses/s, {:.1f} responses/s per process"
+LAUNCHED_SHARDS = "Launched line ranges"
+SHARDS_UNIT = "ranges"
+SHARDS_PER_PROCESS = 4
+SHARD_RESULTS_FILE = "results-%d"
+LOG_INFO_RATE = "Launching {} URIs per second through at most {} keep-alive connections"
+LOG_INFO_LATENCY = "{}: {} responses, {:.1f} responses/s, latency in ms p50 {}, p90 {}, p99 {}, p999 {}, max {}"
+LOG_INFO_LATENCY_FILE = "Latency report written in {}"
+LOG_INFO_RESUME = "Resuming attempt {} from checkpoint {}: {} lines launched, {} later lines already launched"
+LOG_INFO_NO_CHECKPOINT = "Checkpoint {} not found, launching from the first line"
+LOG_INFO_CHECKPOINT = "Launch interrupted, checkpoint written in {} after line {}. Resume it with %s" % RESUME_ARG
+LOG_INFO_OFFSETS = "Line offsets of {} written in {}"
+RUN_MARKER_ERROR = "Run marker could not be sent: {}"
+CHECKPOINT_FILE_ERROR = "Checkpoint {} was written launching {} of {} bytes, not {}"
+CHECKPOINT_RESULTS_ERROR = "Checkpoint {} was written without results file, resume it without %s" % RESULTS_ARG
+LOG_WARN_ORDER = "Nginx logs URIs launched concurrently in a different order than the lines of the file, \
+indicate a results file with %s so the analysis recovers their line numbers" % RESULTS_ARG
+LOG_INFO_CACHE = "Verdicts of {} URIs recovered from cache {}, {} URIs launched"
+LOG_WARN_REQUEST_ID_HEADER = "Response of line {} has no X-Request-ID header, add it in nginx.conf as README \
+shows, results file can not be analyzed without it"
+CACHE_WITHOUT_RESULTS_ERROR = "Results file must be indicated with %s to use the verdict cache" % RESULTS_ARG
+URIS_STREAM_ERROR = "URIs generated while they are launched can not be resumed with %s nor launched in processes \
+with %s, they need the file to launch" % (RESUME_ARG, PROCESSES_ARG)
+LOG_INFO_STREAM_INTERRUPTED = "Launch interrupted, URIs generated while they were launched can not be resumed"
+LATENCY_FILE = "analysis-%s.latency.json"
+BLOCKED = "blocked"
+NOT_BLOCKED = "not_blocked"
+LATENCY_GROUPS = {BLOCKED: "Blocked (403)", NOT_BLOCKED: "Not blocked"}
+
+HTTPS_SCHEME = "https"
+HTTP_DEFAULT_PORTS = {"http": 80, HTTPS_SCHEME: 443}
+HTTP_REQUEST = "GET {} HTTP/1.1\r\nHost: {}\r\nUser-Agent: {}\r\nAccept-Encoding: identity\r\n\
+Connection: keep-alive\r\n\r\n"
+HTTP_USER_AGENT = "Python-urllib-keepalive"
+HTTP_BLOCKED_STATUS = 403
+HTTP_INFORMATIONAL_STATUSES = range(100, 200)
+HTTP_NO_BODY_STATUSES = (204, 304)
+HTTP_ENCODING = "ISO-8859-1"
+TIMEOUT = 5
+REQUEST_ID_HEADER = "x-request-id"
+BLOCK_TYPE_HEADER = "x-block-type"
+DATE_HEADER = "date"
+RESULT_LINE = "{}\t{}\t{:.3f}\t{}\t{}\t{}\t{}\n"
+CACHED_RESULT_LINE = "{}\t{}\t{:.3f}\t{}\t{}\t{}\t{}\t{}\n"
+CACHED_REQUEST_ID = "cached{}"
+RESULT_EMPTY_VALUE = "-"
+TIMESTAMP_FORMAT = "[%d/%b/%Y:%H:%M:%S %z]"
+CHECKPOINT_FILE = "analysis-%s.launcher.checkpoint"
+FILE_CHECKPOINT_FILE = "%s.launcher.checkpoint"
+CHECKPOINT_TEMPORARY_EXT = ".tmp"
+CHECKPOINT_INTERVAL = 2
+CHECKPOINT_FILE_KEY = "file"
+CHECKPOINT_SIZE_KEY = "size"
+CHECKPOINT_ATTEMPT_KEY = "attempt"
+CHECKPOINT_LINE_KEY = "line"
+CHECKPOINT_ACKNOWLEDGED_KEY = "acknowledged"
+CHECKPOINT_RESULTS_KEY = "results"
+OFFSETS_EXT = ".offsets"
+OFFSETS_STEP = 1024
+OFFSETS_HEADER = 3
+LINE_BREAK = b"\n"
+BUFFER_SIZE = 1024 * 1024
+RUN_MARKER_PATH = "/nemesida-analysis-run-marker"
+RUN_MARKER_URI = RUN_MARKER_PATH + "?attempt={}&line={}"
+RUN_MARKER_SKIP = "&skip={}"
+RUN_MARKER_RANGES = 200
+RUN_MARKER_RANGE = "{}-{}"
+RUN_MARKER_RANGE_SEPARATOR = ","
+RUN_MARKER_CP = re.compile(RUN_MARKER_PATH + r'\?attempt=(?P<attempt>\d+)&line=(?P<line>\d+)(?:&skip=(?P<skip>[\d,-]+))?')
+
+request_id_header_missing = False
+
+# =====================================
+# Classes
+# =====================================
+class LaunchCheckpoint:
+    """Last line of the launched file whose response, and the responses of all previous lines,
+    have been received, together with the later lines already answered when URIs are launched
+    concurrently.
+
+    It is saved every few seconds after flushing the results file to disk, keeping the size of
+    the results file, so a resumed launch truncates the results written after the checkpoint
+    and launches again only the lines not answered before it
+    """
+
+    def __init__(self, file_name, file_location, attempt=1, line=0, acknowledged=(), results_size=None):
+        """Creates the checkpoint of a launch
+
+        :param file_name: checkpoint file
+        :type file_name: string
+        :param file_location: launched file
+        :type file_location: string
+        :param attempt: number of the attempt, 1 for the first launch of the file
+        :type attempt: int
+        :param line: last line answered with all the previous ones
+        :type line: int
+        :param acknowledged: later lines already answered
+        :type acknowledged: iterable
+        :param results_size: size of the results file when the checkpoint was saved, None if there is not one
+        :type results_size: int
+        """
+        self.file_name = file_name
+        self.file_location = file_location
+        self.attempt = attempt
+        self.line = line
+        self.acknowledged = set(acknowledged)
+        self.results_size = results_size
+        self.results_file = None
+        self.saved_time = time.monotonic()
+
+    def acknowledge(self, line_number):
+        """Records that the URI of a line has been answered, saving the checkpoint if the
+        last one was saved more than CHECKPOINT_INTERVAL seconds ago
+
+        :param line_number: line of the URI in the launched file
+        :type line_number: int
+        """
+        if line_number == self.line + 1:
+            self.line = line_number
+            while self.line + 1 in self.acknowledged:
+                self.line += 1
+                self.acknowledged.remove(self.line)
+        else:
+            self.acknowledged.add(line_number)
+        if time.monotonic() - self.saved_time >= CHECKPOINT_INTERVAL:
+            self.save()
+
+    def acknowledge_range(self, first_line, last_line):
+        """Records that the URIs of a range of lines have been answered, saving the checkpoint as
+        acknowledge does
+
+        :param first_line: first line of the range in the launched file
+        :type first_line: int
+        :param last_line: last line of the range in the launched file
+        :type last_line: int
+        """
+        if first_line > self.line + 1:
+            self.acknowledged.update(range(first_line, last_line + 1))
+        elif last_line > self.line:
+            self.line = last_line
+            self.acknowledged = {line_number for line_number in self.acknowledged if line_number > last_line}
+            while self.line + 1 in self.acknowledged:
+                self.line += 1
+                self.acknowledged.remove(self.line)
+        if time.monotonic() - self.saved_time >= CHECKPOINT_INTERVAL:
+            self.save()
+
+    def is_launched(self, line_number):
+        """Checks if the URI of a line was answered before the checkpoint
+
+        :param line_number: line of the URI in the launched file
+        :type line_number: int
+
+        :rtype: boolean
+        """
+        return line_number <= self.line or line_number in self.acknowledged
+
+    def save(self):
+        """Flushes the results file to disk and writes the checkpoint in a temporary file that
+        is renamed, so a stopped launch never leaves a partial checkpoint"""
+        if self.results_file is not None:
+            self.results_file.flush()
+            os.fsync(self.results_file.fileno())
+            self.results_size = self.results_file.tell()
+        checkpoint = {
+            CHECKPOINT_FILE_KEY: os.path.abspath(self.file_location),
+            CHECKPOINT_SIZE_KEY: os.path.getsize(self.file_location),
+            CHECKPOINT_ATTEMPT_KEY: self.attempt,
+            CHECKPOINT_LINE_KEY: self.line,
+            CHECKPOINT_ACKNOWLEDGED_KEY: sorted(self.acknowledged),
+            CHECKPOINT_RESULTS_KEY: self.results_size
+        }
+        temporary_file_name = self.file_name + CHECKPOINT_TEMPORARY_EXT
+        with open(temporary_file_name, 'w') as checkpoint_file:
+            json.dump(checkpoint, checkpoint_file)
+            checkpoint_file.flush()
+            os.fsync(checkpoint_file.fileno())
+        os.replace(temporary_file_name, self.file_name)
+        self.saved_time = time.monotonic()
+
+    def remove(self):
+        """Removes the checkpoint file once the whole file has been launched"""
+        if os.path.isfile(self.file_name):
+            os.remove(self.file_name)
+
+    @classmethod
+    def load(cls, file_name, file_location):
+        """Loads the checkpoint of an interrupted launch as the checkpoint of the next attempt
+
+        :param file_name: checkpoint file
+        :type file_name: string
+        :param file_location: launched file
+        :type file_location: string
+
+        :raises LogError: if the checkpoint was written launching other file
+
+        :return: checkpoint, None if the file does not exist
+        :rtype: LaunchCheckpoint
+        """
+        if not os.path.isfile(file_name):
+            return None
+        with open(file_name) as checkpoint_file:
+            values = json.load(checkpoint_file)
+        file_size = os.path.getsize(file_location)
+        if values[CHECKPOINT_FILE_KEY] != os.path.abspath(file_location) or values[CHECKPOINT_SIZE_KEY] != file_size:
+            log.error(CHECKPOINT_FILE_ERROR.format(file_name, values[CHECKPOINT_FILE_KEY], \
+                values[CHECKPOINT_SIZE_KEY], file_location))
+        return cls(file_name, file_location, values[CHECKPOINT_ATTEMPT_KEY] + 1, values[CHECKPOINT_LINE_KEY], \
+            values[CHECKPOINT_ACKNOWLEDGED_KEY], values[CHECKPOINT_RESULTS_KEY])
 
 # =====================================
 # Functions
@@ -59,6 +367,10 @@ def init_parser():
     parser = argparse.ArgumentParser(description=DESCRIPTION)
     required_arguments = parser.add_argument_group(REQUIRED_ARGS)
     add_optional_arguments(parser)
+    parser.add_argument(IDENTIFIER_ARG, help=IDENTIFIER_HELP, metavar=IDENTIFIER_VARIABLE_NAME, \
+        dest=IDENTIFIER_VARIABLE_NAME, type=int)
+    verdict_cache.add_optional_arguments(parser)
+    progress.add_optional_arguments(parser)
     add_required_arguments(required_arguments)
     return parser
 
@@ -72,6 +384,14 @@ def add_optional_arguments(parser):
         dest=URL_VARIABLE_NAME)
     parser.add_argument(PORT_ARG, help=PORT_HELP, default=PORT_DEFAULT, metavar=PORT_VARIABLE_NAME, \
         dest=PORT_VARIABLE_NAME, type=int)
+    parser.add_argument(CONCURRENCY_ARG, help=CONCURRENCY_HELP, metavar=CONCURRENCY_VARIABLE_NAME, \
+        dest=CONCURRENCY_VARIABLE_NAME, type=int)
+    parser.add_argument(RESULTS_ARG, help=RESULTS_HELP, metavar=RESULTS_VARIABLE_NAME, \
+        dest=RESULTS_VARIABLE_NAME)
+    parser.add_argument(RATE_ARG, help=RATE_HELP, metavar=RATE_VARIABLE_NAME, dest=RATE_VARIABLE_NAME, type=float)
+    parser.add_argument(RESUME_ARG, help=RESUME_HELP, dest=RESUME_VARIABLE_NAME, action='store_true')
+    parser.add_argument(PROCESSES_ARG, help=PROCESSES_HELP, metavar=PROCESSES_VARIABLE_NAME, \
+        dest=PROCESSES_VARIABLE_NAME, type=int)
 
 def add_required_arguments(required_arguments_group):
     """Add required arguments to argument parser group created and added previosly to the parser parent
@@ -82,49 +402,1072 @@ def add_required_arguments(required_arguments_group):
     required_arguments_group.add_argument(FILE_ARG, help=FILE_HELP, metavar=FILE_VARIABLE_NAME, \
         dest=FILE_VARIABLE_NAME, required=True)
 
-def main(args):
+def get_target(url):
+    """Splits the URL where the URIs are launched in the parts needed to open connections
+
+    :param url: URL with the port already added if it is not the default one
+    :type url: string
+
+    :return: host, port, value of Host header, base path and SSL context (None for http)
+    :rtype: tuple
+
+    Examples:
+        'http://localhost' => ('localhost', 80, 'localhost', '', None)
+        'http://localhost:8080' => ('localhost', 8080, 'localhost:8080', '', None)
+    """
+    import ssl
+    split_url = parse.urlsplit(url)
+    port = split_url.port or HTTP_DEFAULT_PORTS[split_url.scheme]
+    ssl_context = ssl.create_default_context() if split_url.scheme == HTTPS_SCHEME else None
+    return split_url.hostname, port, split_url.netloc, split_url.path.rstrip("/"), ssl_context
+
+def get_line_offsets(file_location):
+    """Gets the byte offsets of every OFFSETS_STEP lines of the file to launch, starting by the
+    first one. They are only needed to resume a launch or to split it in processes, and are kept
+    in a file next to it, which is built again when the size or the modification time of the file
+    to launch change. They are not kept if the file can not be written
+
+    :param file_location: file that contains the URIs
+    :type file_location: string
+
+    :return: offsets of lines 1, OFFSETS_STEP + 1, 2 * OFFSETS_STEP + 1...
+    :rtype: array
+    """
+    offsets_file_name = file_location + OFFSETS_EXT
+    file_stat = os.stat(file_location)
+    header = [file_stat.st_size, file_stat.st_mtime_ns, OFFSETS_STEP]
+    offsets = array.array('q')
+    try:
+        with open(offsets_file_name, 'rb') as offsets_file:
+            offsets.frombytes(offsets_file.read())
+        if offsets[:OFFSETS_HEADER].tolist() == header:
+            return offsets[OFFSETS_HEADER:]
+    except (OSError, ValueError):
+        pass
+
+    offsets = array.array('q', header + [0])
+    line_count = 0
+    position = 0
+    with open(file_location, 'rb') as file:
+        block = file.read(BUFFER_SIZE)
+        while block:
+            block_lines = block.count(LINE_BREAK)
+            if (line_count + block_lines) // OFFSETS_STEP > line_count // OFFSETS_STEP:
+                line_break = block.find(LINE_BREAK)
+                while line_break != -1:
+                    line_count += 1
+                    if line_count % OFFSETS_STEP == 0 and position + line_break + 1 < file_stat.st_size:
+                        offsets.append(position + line_break + 1)
+                    line_break = block.find(LINE_BREAK, line_break + 1)
+            else:
+                line_count += block_lines
+            position += len(block)
+            block = file.read(BUFFER_SIZE)
+    try:
+        with open(offsets_file_name, 'wb') as offsets_file:
+            offsets.tofile(offsets_file)
+        log.info(LOG_INFO_OFFSETS.format(file_location, offsets_file_name))
+    except OSError:
+        pass
+    return offsets[OFFSETS_HEADER:]
+
+def seek_checkpoint(file, file_location, checkpoint):
+    """Moves the file to launch to the first line after the checkpoint, seeking the closest
+    previous line whose offset is known and reading the rest
+
+    :param file: previously opened file with one URI per line
+    :type file: file in read mode
+    :param file_location: file that contains the URIs
+    :type file_location: string
+    :param checkpoint: checkpoint of the launch, the file is not moved if it is None
+    :type checkpoint: LaunchCheckpoint
+
+    :return: number and byte offset of the next line read
+    :rtype: tuple
+    """
+    if checkpoint is None or checkpoint.line == 0:
+        return 1, 0
+    offsets = get_line_offsets(file_location)
+    index = min(checkpoint.line // OFFSETS_STEP, len(offsets) - 1)
+    line_number = index * OFFSETS_STEP + 1
+    position = offsets[index]
+    file.seek(position)
+    while line_number <= checkpoint.line:
+        line = file.readline()
+        if not line:
+            break
+        position += len(line.encode(file.encoding))
+        line_number += 1
+    return line_number, position
+
+def get_checkpoint_file_name(file_location, file_identifier=None):
+    """Gets the name of the checkpoint of a launch, named after the launched file when the id is
+    not indicated, so a launch without id is resumed by launching the same file again
+
+    :param file_location: file that contains the URIs
+    :type file_location: string
+    :param file_identifier: numeric value added to identify generated files, None if it is not indicated
+    :type file_identifier: int
+
+    :return: checkpoint file name
+    :rtype: string
+
+    Examples:
+        ('attacks.uri', 123) => 'analysis-123.launcher.checkpoint'
+        ('datasets/attacks.uri', None) => 'attacks.uri.launcher.checkpoint'
+    """
+    if file_identifier is not None:
+        return CHECKPOINT_FILE % file_identifier
+    return FILE_CHECKPOINT_FILE % os.path.basename(file_location)
+
+def open_file_to_launch(file_location, uris=None):
+    """Opens the file to launch, or wraps the URIs given instead of it so they are read as its
+    lines, e.g. while they are generated from a raw file
+
+    :param file_location: file that contains the URIs
+    :type file_location: string
+    :param uris: iterable of URIs with their line break read instead of the file
+    :type uris: iterable
+
+    :return: context manager of the file in read mode or the URIs
+    :rtype: context manager
+    """
+    if uris is not None:
+        return contextlib.closing(uris) if hasattr(uris, 'close') else contextlib.nullcontext(uris)
+    return open(file_location, 'r')
+
+def read_lines_to_launch(file, first_line=1, checkpoint=None):
+    """Reads the file to launch encoding every URI
+
+    :param file: previously opened file with one URI per line
+    :type file: file in read mode
+    :param first_line: number of the next line read
+    :type first_line: int
+    :param checkpoint: checkpoint of the launch, lines answered before it are not read
+    :type checkpoint: LaunchCheckpoint
+
+    :return: generator of (line number, encoded URI) tuples
+    :rtype: generator
+    """
+    for count, line in enumerate(file, first_line):
+        if checkpoint is not None and checkpoint.is_launched(count):
+            continue
+        line_without_line_break = re.sub(r'\n$', '', line)
+        yield count, parse.quote(line_without_line_break, safe="/:=?&")
+
+def get_launch_shards(file_location, shards_number, checkpoint=None):
+    """Splits the lines of the file to launch after the checkpoint in ranges starting at lines
+    whose offset is known, so every process can seek the first line of its range
+
+    :param file_location: file that contains the URIs
+    :type file_location: string
+    :param shards_number: number of line ranges wanted
+    :type shards_number: int
+    :param checkpoint: checkpoint of the launch, lines before it are not included
+    :type checkpoint: LaunchCheckpoint
+
+    :return: list of (byte offset, first line, last line) tuples, in file order
+    :rtype: list
+    """
+    offsets = get_line_offsets(file_location)
+    with open(file_location, 'r') as file:
+        first_line, position = seek_checkpoint(file, file_location, checkpoint)
+    with open(file_location, 'rb') as file:
+        file.seek(offsets[-1])
+        line_count = (len(offsets) - 1) * OFFSETS_STEP + sum(1 for _ in file)
+    if first_line > line_count:
+        return list()
+
+    boundaries = [(position, first_line)] + [(offset, index * OFFSETS_STEP + 1) for index, offset \
+        in enumerate(offsets) if index * OFFSETS_STEP + 1 > first_line]
+    starts = sorted({boundaries[len(boundaries) * shard // shards_number] for shard in range(shards_number)}, \
+        key=lambda boundary: boundary[1])
+    last_lines = [line_number - 1 for _, line_number in starts[1:]] + [line_count]
+    return [(offset, line_number, last_line) for (offset, line_number), last_line in zip(starts, last_lines)]
+
+def get_line_ranges(line_numbers):
+    """Groups line numbers in ranges of consecutive lines
+
+    :param line_numbers: line numbers
+    :type line_numbers: iterable
+
+    :return: list of (first line, last line) tuples, in file order
+    :rtype: list
+
+    Example:
+        {5, 6, 7, 9} => [(5, 7), (9, 9)]
+    """
+    ranges = list()
+    for line_number in sorted(line_numbers):
+        if ranges and ranges[-1][1] == line_number - 1:
+            ranges[-1] = (ranges[-1][0], line_number)
+        else:
+            ranges.append((line_number, line_number))
+    return ranges
+
+def get_run_marker_uris(attempt, line, acknowledged=()):
+    """Gets the URIs of the run marker of a resumed attempt. The lines answered after the
+    checkpoint, which are not launched again, are sent in it as ranges, in as many URIs as needed
+    to send RUN_MARKER_RANGES ranges in each one, so the access log lines of the attempt can be
+    numbered
+
+    :param attempt: number of the attempt
+    :type attempt: int
+    :param line: last line launched before the attempt with all the previous ones
+    :type line: int
+    :param acknowledged: later lines already launched
+    :type acknowledged: iterable
+
+    :return: URIs of the run marker
+    :rtype: list
+
+    Example:
+        (2, 1500, {1502, 1503, 1510}) => ['/nemesida-analysis-run-marker?attempt=2&line=1500&skip=1502-1503,1510-1510']
+    """
+    ranges = [RUN_MARKER_RANGE.format(first_line, last_line) for first_line, last_line \
+        in get_line_ranges(acknowledged)]
+    if not ranges:
+        return [RUN_MARKER_URI.format(attempt, line)]
+    return [RUN_MARKER_URI.format(attempt, line) + RUN_MARKER_SKIP.format(RUN_MARKER_RANGE_SEPARATOR.join( \
+        ranges[index:index + RUN_MARKER_RANGES])) for index in range(0, len(ranges), RUN_MARKER_RANGES)]
+
+def send_run_marker(url, attempt, line, acknowledged=()):
+    """Sends the requests of the run marker, so the start of a resumed attempt is written in the
+    access log with the lines that are not launched again. Their responses are ignored
+
+    :param url: URL where the URIs are launched
+    :type url: string
+    :param attempt: number of the attempt
+    :type attempt: int
+    :param line: last line launched before the attempt with all the previous ones
+    :type line: int
+    :param acknowledged: later lines already launched
+    :type acknowledged: iterable
+    """
+    from urllib import request, error
+    for marker_uri in get_run_marker_uris(attempt, line, acknowledged):
+        try:
+            request.urlopen(url + marker_uri, timeout=TIMEOUT)
+        except error.HTTPError:
+            pass
+        except (error.URLError, OSError) as url_error:
+            log.warn(RUN_MARKER_ERROR.format(url_error))
+
+def parse_run_marker(line):
+    """Gets the attempt, the last line launched before it and the ranges of later lines not launched
+    again from a log line of the run marker
+
+    :param line: access log line
+    :type line: string
+
+    :return: attempt, line number and list of (first line, last line) ranges, None if it is not a run marker
+    :rtype: tuple
+
+    Examples:
+        '... "GET /nemesida-analysis-run-marker?attempt=2&line=1500 HTTP/1.1" ...' => (2, 1500, [])
+        '... "GET /nemesida-analysis-run-marker?attempt=2&line=1500&skip=1502-1504,1510-1510 HTTP/1.1" ...' =>
+            (2, 1500, [(1502, 1504), (1510, 1510)])
+    """
+    if RUN_MARKER_PATH not in line:
+        return None
+    result = RUN_MARKER_CP.search(line)
+    if result is None:
+        return None
+    ranges = list()
+    if result.group('skip'):
+        for line_range in result.group('skip').split(RUN_MARKER_RANGE_SEPARATOR):
+            first_line, _, last_line = line_range.partition("-")
+            ranges.append((int(first_line), int(last_line or first_line)))
+    return int(result.group('attempt')), int(result.group('line')), ranges
+
+def get_response_timestamp(headers):
+    """Converts the Date header of the response to the local time format used by Nginx logs.
+    Current time is used if the response has no Date header
+
+    :param headers: response headers with lowercase names
+    :type headers: dict
+
+    :return: timestamp
+    :rtype: string
+
+    Example:
+        'Tue, 17 Aug 2021 17:27:10 GMT' => '[17/Aug/2021:19:27:10 +0200]'
+    """
+    date = headers.get(DATE_HEADER)
+    response_datetime = utils.parsedate_to_datetime(date) if date else datetime.now()
+    return response_datetime.astimezone().strftime(TIMESTAMP_FORMAT)
+
+def request_uri(url, encoded_uri):
+    """Launches an URI opening a new connection
+
+    :param url: URL where the URIs are launched
+    :type url: string
+    :param encoded_uri: URI to launch
+    :type encoded_uri: string
+
+    :return: HTTP status, response headers with lowercase names and latency in seconds
+    :rtype: tuple
+    """
+    from urllib import request, error
+    start_time = time.perf_counter()
+    try:
+        response = request.urlopen(url + encoded_uri, timeout=TIMEOUT)
+    except error.HTTPError as http_error:
+        response = http_error
+    return response.status, {name.lower(): value for name, value in response.headers.items()}, \
+        time.perf_counter() - start_time
+
+def write_result(results_file, line_number, encoded_uri, status, headers, latency):
+    """Writes a line in results file separated by tabs with the line number, HTTP status,
+    latency in milliseconds, request ID, block type, timestamp and encoded URI
+
+    :param results_file: previously opened results file, nothing is written if it is None
+    :type results_file: file in write mode
+    :param line_number: line of the URI in the launched file
+    :type line_number: int
+    :param encoded_uri: URI launched
+    :type encoded_uri: string
+    :param status: HTTP status, None if there is no response
+    :type status: int
+    :param headers: response headers with lowercase names
+    :type headers: dict
+    :param latency: seconds elapsed until the response has been received
+    :type latency: float
+    """
+    global request_id_header_missing
+    if results_file is not None:
+        if status is not None and REQUEST_ID_HEADER not in headers and not request_id_header_missing:
+            request_id_header_missing = True
+            log.warn(LOG_WARN_REQUEST_ID_HEADER.format(line_number))
+        results_file.write(RESULT_LINE.format(line_number, RESULT_EMPTY_VALUE if status is None else status, \
+            latency * 1000, headers.get(REQUEST_ID_HEADER, RESULT_EMPTY_VALUE), \
+            headers.get(BLOCK_TYPE_HEADER, RESULT_EMPTY_VALUE), get_response_timestamp(headers), encoded_uri))
+
+def write_cached_result(cache, results_file, line_number, encoded_uri):
+    """Writes the verdict of an URI recovered from the cache in results file, as a result line
+    with a request ID made up from the line number, no latency and the rule IDs added at the end
+
+    :param cache: verdict cache
+    :type cache: verdict_cache.VerdictCache
+    :param results_file: previously opened results file
+    :type results_file: file in write mode
+    :param line_number: line of the URI in the launched file
+    :type line_number: int
+    :param encoded_uri: URI to launch
+    :type encoded_uri: string
+
+    :return: if the verdict was cached, so the URI does not need to be launched
+    :rtype: boolean
+    """
+    verdict = cache.get(encoded_uri)
+    if verdict is None:
+        return False
+    status, block_type, rule_ids = verdict
+    results_file.write(CACHED_RESULT_LINE.format(line_number, status, 0, CACHED_REQUEST_ID.format(line_number), \
+        block_type, get_response_timestamp(dict()), encoded_uri, verdict_cache.format_rule_ids(rule_ids)))
+    return True
+
+def skip_cached_lines(lines, cache, results_file, checkpoint=None):
+    """Writes the verdicts of cached URIs in results file, yielding only the URIs to launch
+
+    :param lines: iterable of (line number, encoded URI) tuples
+    :type lines: iterable
+    :param cache: verdict cache
+    :type cache: verdict_cache.VerdictCache
+    :param results_file: previously opened results file
+    :type results_file: file in write mode
+    :param checkpoint: checkpoint where the lines of cached URIs are acknowledged
+    :type checkpoint: LaunchCheckpoint
+
+    :return: generator of (line number, encoded URI) tuples not cached
+    :rtype: generator
+    """
+    for line_number, encoded_uri in lines:
+        if not write_cached_result(cache, results_file, line_number, encoded_uri):
+            yield line_number, encoded_uri
+        elif checkpoint is not None:
+            checkpoint.acknowledge(line_number)
+
+async def read_http_head(reader, status_line):
+    """Reads the headers of an HTTP/1.1 response after its status line
+
+    :param reader: stream of the open connection
+    :type reader: asyncio.StreamReader
+    :param status_line: status line of the response
+    :type status_line: bytes
+
+    :return: HTTP status and response headers with lowercase names
+    :rtype: tuple
+    """
+    status = int(status_line.split()[1])
+    headers = dict()
+    header_line = await reader.readline()
+    while header_line.strip():
+        name, _, value = header_line.decode(HTTP_ENCODING).partition(":")
+        headers[name.strip().lower()] = value.strip()
+        header_line = await reader.readline()
+    return status, headers
+
+async def read_http_response(reader):
+    """Reads a complete HTTP/1.1 response from an open connection discarding its body.
+    Informational responses (1xx) before it are skipped, and responses that never have a body
+    (1xx, 204 and 304) are not read until the connection is closed
+
+    :param reader: stream of the open connection
+    :type reader: asyncio.StreamReader
+
+    :return: HTTP status, response headers with lowercase names and if connection can be reused,
+        None if the connection was closed before any byte of the response was received
+    :rtype: tuple
+    """
+    try:
+        status_line = await reader.readline()
+    except ConnectionError:
+        return None
+    if not status_line:
+        return None
+    status, headers = await read_http_head(reader, status_line)
+    while status in HTTP_INFORMATIONAL_STATUSES:
+        status, headers = await read_http_head(reader, await reader.readline())
+
+    keep_alive = headers.get("connection", "").lower() != "close"
+    if status in HTTP_NO_BODY_STATUSES:
+        pass
+    elif "chunked" in headers.get("transfer-encoding", "").lower():
+        chunk_size = int((await reader.readline()).split(b";")[0], 16)
+        while chunk_size > 0:
+            await reader.readexactly(chunk_size + 2)
+            chunk_size = int((await reader.readline()).split(b";")[0], 16)
+        while (await reader.readline()).strip():
+            pass
+    elif "content-length" in headers:
+        await reader.readexactly(int(headers["content-length"]))
+    else:
+        await reader.read()
+        keep_alive = False
+
+    return status, headers, keep_alive
+
+async def send_request(target, connection, encoded_uri):
+    """Sends the request of an URI and reads its response. A new connection is opened if there
+    is not one, and the request is sent again through a new connection only if the server closed
+    or reset the reused one before sending any byte of the response, while the request was
+    written or its response awaited, as idle keep-alive connections are. It is not sent again
+    after a timeout or a partial response, since the server may have answered it
+
+    :param target: host, port, Host header, base path and SSL context returned by get_target
+    :type target: tuple
+    :param connection: (reader, writer) of a keep-alive connection or None
+    :type connection: tuple
+    :param encoded_uri: URI launched
+    :type encoded_uri: string
+
+    :return: connection to reuse (None if it has been closed), HTTP status (None if there is no response)
+        and headers with lowercase names
+    :rtype: tuple
+    """
+    import asyncio
+    host, port, host_header, base_path, ssl_context = target
+    http_request = HTTP_REQUEST.format(base_path + encoded_uri, host_header, HTTP_USER_AGENT).encode(HTTP_ENCODING)
+    status, headers = None, dict()
+    reused = connection is not None
+    while True:
+        sent = False
+        try:
+            if connection is None:
+                connection = await asyncio.wait_for(asyncio.open_connection(host, port, ssl=ssl_context), TIMEOUT)
+            reader, writer = connection
+            writer.write(http_request)
+            await asyncio.wait_for(writer.drain(), TIMEOUT)
+            sent = True
+            response = await asyncio.wait_for(read_http_response(reader), TIMEOUT)
+            if response is not None:
+                status, headers, keep_alive = response
+            if response is None or not keep_alive:
+                writer.close()
+                connection = None
+            if response is None and reused:
+                reused = False
+                continue
+        except (OSError, ValueError, IndexError, asyncio.TimeoutError, asyncio.IncompleteReadError) as request_error:
+            if connection is not None:
+                connection[1].close()
+                connection = None
+            if reused and not sent and isinstance(request_error, ConnectionError):
+                reused = False
+                continue
+        return connection, status, headers
+
+async def launch_worker(target, queue, on_response):
+    """Launches the URIs of the queue one after another reusing the same keep-alive connection.
+    Connection is opened again if the server closes it
+
+    :param target: host, port, Host header, base path and SSL context returned by get_target
+    :type target: tuple
+    :param queue: queue of (line number, encoded URI) tuples finished with None
+    :type queue: asyncio.Queue
+    :param on_response: called with line number, encoded URI, HTTP status (None if there is no response),
+        headers and latency in seconds
+    :type on_response: function
+    """
+    connection = None
+    item = await queue.get()
+    while item is not None:
+        line_number, encoded_uri = item
+        start_time = time.perf_counter()
+        connection, status, headers = await send_request(target, connection, encoded_uri)
+        on_response(line_number, encoded_uri, status, headers, time.perf_counter() - start_time)
+        item = await queue.get()
+
+    if connection is not None:
+        connection[1].close()
+
+async def launch_uris_concurrently(url, lines, concurrency, on_response):
+    """Launches the URIs through as many keep-alive connections as concurrency indicates.
+
+    Responses may arrive in a different order than the lines of the file, so every response
+    is reported with the line number of its URI
+
+    :param url: URL where the URIs are launched
+    :type url: string
+    :param lines: iterable of (line number, encoded URI) tuples
+    :type lines: iterable
+    :param concurrency: number of URIs launched at the same time
+    :type concurrency: int
+    :param on_response: called with line number, encoded URI, HTTP status (None if there is no response),
+        headers and latency in seconds
+    :type on_response: function
+    """
+    import asyncio
+    target = get_target(url)
+    queue = asyncio.Queue(maxsize=concurrency * 2)
+    workers = [asyncio.create_task(launch_worker(target, queue, on_response)) for _ in range(concurrency)]
+    for item in lines:
+        await queue.put(item)
+    for _ in workers:
+        await queue.put(None)
+    await asyncio.gather(*workers)
+
+async def launch_uris_at_rate(url, lines, rate, max_connections, on_response):
+    """Launches the URIs at fixed intervals, 1 / rate seconds after the previous one, without
+    waiting for the responses (open loop). Idle keep-alive connections are reused and new ones
+    are opened while there are less than max_connections.
+
+    Latency is measured from the time when the request was scheduled, so the time waiting for a
+    connection or lost by a late launcher is also counted and slow responses do not hide the
+    requests that should have been sent meanwhile
+
+    :param url: URL where the URIs are launched
+    :type url: string
+    :param lines: iterable of (line number, encoded URI) tuples
+    :type lines: iterable
+    :param rate: requests launched per second
+    :type rate: float
+    :param max_connections: maximum number of open connections
+    :type max_connections: int
+    :param on_response: called with line number, encoded URI, HTTP status (None if there is no response),
+        headers and latency in seconds
+    :type on_response: function
+    """
+    import asyncio
+    target = get_target(url)
+    loop = asyncio.get_running_loop()
+    connections = asyncio.Semaphore(max_connections)
+    idle_connections = list()
+    tasks = set()
+
+    async def launch(line_number, encoded_uri, scheduled_time):
+        async with connections:
+            connection = idle_connections.pop() if idle_connections else None
+            connection, status, headers = await send_request(target, connection, encoded_uri)
+            if connection is not None:
+                idle_connections.append(connection)
+        on_response(line_number, encoded_uri, status, headers, loop.time() - scheduled_time)
+
+    start_time = loop.time()
+    for number, (line_number, encoded_uri) in enumerate(lines):
+        scheduled_time = start_time + number / rate
+        delay = scheduled_time - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        task = asyncio.create_task(launch(line_number, encoded_uri, scheduled_time))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+    await asyncio.gather(*tasks)
+    for connection in idle_connections:
+        connection[1].close()
+
+def launch_sequentially(url, file_location, results_file, cache=None, checkpoint=None, uris=None):
+    """Launches the URIs of the file one by one opening a new connection for each one
+
+    :param url: URL where the URIs are launched
+    :type url: string
+    :param file_location: file that contains the URIs
+    :type file_location: string
+    :param results_file: previously opened results file or None
+    :type results_file: file in write mode
+    :param cache: verdict cache, cached URIs are not launched
+    :type cache: verdict_cache.VerdictCache
+    :param checkpoint: checkpoint of the launch, the file is launched from the line after it
+    :type checkpoint: LaunchCheckpoint
+    :param uris: iterable of URIs launched instead of the lines of the file
+    :type uris: iterable
+    """
+    progress_file = progress.Progress(LOG_PROGRESS_FILE, progress.REQUESTS, \
+        os.path.getsize(file_location) if uris is None else None)
+    with open_file_to_launch(file_location, uris) as file:
+        count, position = seek_checkpoint(file, file_location, checkpoint)
+        for line in file:
+            line_without_line_break = re.sub(r'\n$', '', line)
+            position += len(line)
+            progress_file.update(count, position, line_without_line_break)
+            encoded_uri = parse.quote(line_without_line_break, safe="/:=?&")
+            if checkpoint is not None and checkpoint.is_launched(count):
+                count += 1
+                continue
+            if cache is not None and write_cached_result(cache, results_file, count, encoded_uri):
+                if checkpoint is not None:
+                    checkpoint.acknowledge(count)
+                count += 1
+                continue
+            status, headers, latency = request_uri(url, encoded_uri)
+            write_result(results_file, count, encoded_uri, status, headers, latency)
+            if checkpoint is not None:
+                checkpoint.acknowledge(count)
+            count += 1
+    progress_file.done(count - 1)
+
+def launch_concurrently(url, file_location, concurrency, results_file, cache=None, checkpoint=None, uris=None):
+    """Launches the URIs of the file concurrently through persistent keep-alive connections
+
+    :param url: URL where the URIs are launched
+    :type url: string
+    :param file_location: file that contains the URIs
+    :type file_location: string
+    :param concurrency: number of URIs launched at the same time
+    :type concurrency: int
+    :param results_file: previously opened results file or None
+    :type results_file: file in write mode
+    :param cache: verdict cache, cached URIs are not launched
+    :type cache: verdict_cache.VerdictCache
+    :param checkpoint: checkpoint of the launch, the file is launched from the line after it
+    :type checkpoint: LaunchCheckpoint
+    :param uris: iterable of URIs launched instead of the lines of the file
+    :type uris: iterable
+    """
+    import asyncio
+    if concurrency < 1:
+        log.error(INVALID_CONCURRENCY_ERROR)
+    log.info(LOG_INFO_CONCURRENCY.format(concurrency))
+    progress_file = progress.Progress(LOG_PROGRESS_FILE, progress.REQUESTS)
+    response_count = 0
+    blocked_count = 0
+    failed_count = 0
+
+    def on_response(line_number, encoded_uri, status, headers, latency):
+        nonlocal response_count, blocked_count, failed_count
+        write_result(results_file, line_number, encoded_uri, status, headers, latency)
+        if checkpoint is not None:
+            checkpoint.acknowledge(line_number)
+        response_count += 1
+        progress_file.update(response_count)
+        if status == HTTP_BLOCKED_STATUS:
+            blocked_count += 1
+        elif status is None:
+            failed_count += 1
+
+    with open_file_to_launch(file_location, uris) as file:
+        first_line, _ = seek_checkpoint(file, file_location, checkpoint)
+        lines = read_lines_to_launch(file, first_line, checkpoint)
+        if cache is not None:
+            lines = skip_cached_lines(lines, cache, results_file, checkpoint)
+        asyncio.run(launch_uris_concurrently(url, lines, concurrency, on_response))
+    progress_file.done(response_count)
+    log.info(LOG_INFO_RESPONSES.format(blocked_count, response_count - blocked_count - failed_count, failed_count))
+
+def get_latency_report(rate, duration, histograms, failed_count):
+    """Creates the latency report of an open loop run
+
+    :param rate: requests launched per second
+    :type rate: float
+    :param duration: seconds since the first request was launched until the last response
+    :type duration: float
+    :param histograms: histograms of latency in microseconds of blocked and not blocked responses
+    :type histograms: dict
+    :param failed_count: number of requests without response
+    :type failed_count: int
+
+    :return: report with the throughput and the latency summary in milliseconds of every group
+    :rtype: dict
+    """
+    report = {"rate": rate, "duration": duration, "without_response": failed_count}
+    for group, latency_histogram in histograms.items():
+        report[group] = latency_histogram.get_summary()
+        report[group]["throughput"] = latency_histogram.total / duration if duration else 0
+        report[group]["histogram"] = latency_histogram.to_dict()
+    return report
+
+def write_latency_report(rate, duration, histograms, failed_count, latency_file_name):
+    """Shows the percentiles of the latency report of an open loop run and writes it in a JSON file
+
+    :param rate: requests launched per second
+    :type rate: float
+    :param duration: seconds since the first request was launched until the last response
+    :type duration: float
+    :param histograms: histograms of latency in microseconds of blocked and not blocked responses
+    :type histograms: dict
+    :param failed_count: number of requests without response
+    :type failed_count: int
+    :param latency_file_name: JSON file where the latency report is written
+    :type latency_file_name: string
+    """
+    report = get_latency_report(rate, duration, histograms, failed_count)
+    for group, name in LATENCY_GROUPS.items():
+        summary = report[group]
+        log.info(LOG_INFO_LATENCY.format(name, summary["count"], summary["throughput"], summary["p50"], \
+            summary["p90"], summary["p99"], summary["p999"], summary["max"]))
+    log.info(LOG_INFO_RESPONSES.format(histograms[BLOCKED].total, histograms[NOT_BLOCKED].total, failed_count))
+    with open(latency_file_name, 'w') as latency_file:
+        json.dump(report, latency_file, indent=4)
+    log.info(LOG_INFO_LATENCY_FILE.format(latency_file_name))
+
+def launch_at_rate(url, file_location, rate, max_connections, results_file, latency_file_name, cache=None, \
+    checkpoint=None, uris=None):
+    """Launches the URIs of the file at a fixed rate, recording the latency of blocked and not
+    blocked responses in histograms. Percentiles are shown and written in a JSON file
+
+    :param url: URL where the URIs are launched
+    :type url: string
+    :param file_location: file that contains the URIs
+    :type file_location: string
+    :param rate: requests launched per second
+    :type rate: float
+    :param max_connections: maximum number of open connections
+    :type max_connections: int
+    :param results_file: previously opened results file or None
+    :type results_file: file in write mode
+    :param latency_file_name: JSON file where the latency report is written
+    :type latency_file_name: string
+    :param cache: verdict cache, cached URIs are not launched
+    :type cache: verdict_cache.VerdictCache
+    :param checkpoint: checkpoint of the launch, the file is launched from the line after it
+    :type checkpoint: LaunchCheckpoint
+    :param uris: iterable of URIs launched instead of the lines of the file
+    :type uris: iterable
+    """
+    import asyncio
+    if rate <= 0:
+        log.error(INVALID_RATE_ERROR)
+    if max_connections < 1:
+        log.error(INVALID_CONCURRENCY_ERROR)
+    log.info(LOG_INFO_RATE.format(rate, max_connections))
+    progress_file = progress.Progress(LOG_PROGRESS_FILE, progress.REQUESTS)
+    histograms = {BLOCKED: histogram.Histogram(), NOT_BLOCKED: histogram.Histogram()}
+    response_count = 0
+    failed_count = 0
+
+    def on_response(line_number, encoded_uri, status, headers, latency):
+        nonlocal response_count, failed_count
+        write_result(results_file, line_number, encoded_uri, status, headers, latency)
+        if checkpoint is not None:
+            checkpoint.acknowledge(line_number)
+        response_count += 1
+        progress_file.update(response_count)
+        if status is None:
+            failed_count += 1
+        else:
+            group = BLOCKED if status == HTTP_BLOCKED_STATUS else NOT_BLOCKED
+            histograms[group].record(latency * histogram.MICROSECONDS)
+
+    start_time = time.perf_counter()
+    with open_file_to_launch(file_location, uris) as file:
+        first_line, _ = seek_checkpoint(file, file_location, checkpoint)
+        lines = read_lines_to_launch(file, first_line, checkpoint)
+        if cache is not None:
+            lines = skip_cached_lines(lines, cache, results_file, checkpoint)
+        asyncio.run(launch_uris_at_rate(url, lines, rate, max_connections, on_response))
+    duration = time.perf_counter() - start_time
+    progress_file.done(response_count)
+    write_latency_report(rate, duration, histograms, failed_count, latency_file_name)
+
+def ignore_interrupt():
+    """Ignores the interrupt signal in worker processes, so an interrupted launch is stopped by
+    the main process, which terminates the workers after saving the checkpoint"""
+    import signal
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+def launch_shard(shard):
+    """Launches a line range of the file through its own connections, writing its results in a
+    temporary file. Runs in a worker process
+
+    :param shard: URL, file to launch, byte offset, first and last lines of the range, lines answered
+        before the checkpoint, concurrency, rate, cache file, ruleset and size (None without cache) and
+        temporary results file name (None without results file)
+    :type shard: tuple
+
+    :return: process ID, latency histograms of blocked and not blocked responses as dictionaries, number
+        of requests without response, cache hits and misses and seconds launching the range
+    :rtype: tuple
+    """
+    import asyncio
+    url, file_location, position, first_line, last_line, launched_lines, concurrency, rate, cache_settings, \
+        results_file_name = shard
+    histograms = {BLOCKED: histogram.Histogram(), NOT_BLOCKED: histogram.Histogram()}
+    failed_count = 0
+
+    def on_response(line_number, encoded_uri, status, headers, latency):
+        nonlocal failed_count
+        write_result(results_file, line_number, encoded_uri, status, headers, latency)
+        if status is None:
+            failed_count += 1
+        else:
+            group = BLOCKED if status == HTTP_BLOCKED_STATUS else NOT_BLOCKED
+            histograms[group].record(latency * histogram.MICROSECONDS)
+
+    start_time = time.perf_counter()
+    cache = verdict_cache.VerdictCache(*cache_settings) if cache_settings is not None else None
+    results_file = open(results_file_name, 'w') if results_file_name is not None else None
+    try:
+        with open(file_location, 'r') as file:
+            file.seek(position)
+            lines = itertools.islice(read_lines_to_launch(file, first_line), last_line - first_line + 1)
+            if launched_lines:
+                lines = (item for item in lines if item[0] not in launched_lines)
+            if cache is not None:
+                lines = skip_cached_lines(lines, cache, results_file)
+            if rate is not None:
+                asyncio.run(launch_uris_at_rate(url, lines, rate, concurrency, on_response))
+            elif concurrency is None:
+                for line_number, encoded_uri in lines:
+                    on_response(line_number, encoded_uri, *request_uri(url, encoded_uri))
+            else:
+                asyncio.run(launch_uris_concurrently(url, lines, concurrency, on_response))
+    finally:
+        if results_file is not None:
+            results_file.close()
+        if cache is not None:
+            cache.close()
+
+    return os.getpid(), {group: group_histogram.to_dict() for group, group_histogram in histograms.items()}, \
+        failed_count, cache.hits if cache is not None else 0, cache.misses if cache is not None else 0, \
+        time.perf_counter() - start_time
+
+def launch_in_processes(url, file_location, processes, concurrency, rate, results_file, latency_file_name, \
+    cache=None, checkpoint=None):
+    """Launches line ranges of the file in a pool of processes, each one through its own connections.
+
+    Every process writes the results of its range in a temporary file, which are merged in file
+    order. Results lines keep the line number of every URI, so the order of the file can be
+    rebuilt although Nginx logs the requests of every process interleaved. The throughput of
+    every process and the combined one are shown, and the latency report is written at rate
+
+    :param url: URL where the URIs are launched
+    :type url: string
+    :param file_location: file that contains the URIs
+    :type file_location: string
+    :param processes: number of processes
+    :type processes: int
+    :param concurrency: number of URIs launched at the same time by every process, None to launch them
+        one by one. At rate, maximum number of open connections of every process
+    :type concurrency: int
+    :param rate: requests launched per second by all processes, None to launch them as fast as possible
+    :type rate: float
+    :param results_file: previously opened results file or None
+    :type results_file: file in write mode
+    :param latency_file_name: JSON file where the latency report is written at rate
+    :type latency_file_name: string
+    :param cache: verdict cache, cached URIs are not launched
+    :type cache: verdict_cache.VerdictCache
+    :param checkpoint: checkpoint of the launch, acknowledged when the results of a range are merged
+    :type checkpoint: LaunchCheckpoint
+
+    :raises LogError: if processes, concurrency or rate are not valid
+    """
+    import multiprocessing
+    if processes < 1:
+        log.error(INVALID_PROCESSES_ERROR)
+    if concurrency is not None and concurrency < 1:
+        log.error(INVALID_CONCURRENCY_ERROR)
+    if rate is not None and rate <= 0:
+        log.error(INVALID_RATE_ERROR)
+    if rate is not None:
+        concurrency = concurrency or MAX_CONNECTIONS_DEFAULT
+        log.info(LOG_INFO_RATE.format(rate, concurrency * processes))
+    elif concurrency is not None:
+        log.info(LOG_INFO_CONCURRENCY.format(concurrency * processes))
+
+    shards = get_launch_shards(file_location, processes * SHARDS_PER_PROCESS, checkpoint)
+    log.info(LOG_INFO_PROCESSES.format(len(shards), file_location, processes))
+    cache_settings = (cache.file_name, cache.ruleset, cache.size) if cache is not None else None
+    launched_lines = checkpoint.acknowledged if checkpoint is not None else set()
+    histograms = {BLOCKED: histogram.Histogram(), NOT_BLOCKED: histogram.Histogram()}
+    failed_count = 0
+    process_throughputs = dict()
+    launched_shards = progress.Progress(LAUNCHED_SHARDS, SHARDS_UNIT, len(shards))
+    temporary_folder = None
+    if results_file is not None:
+        temporary_folder = tempfile.mkdtemp(dir=os.path.dirname(os.path.abspath(results_file.name)))
+    start_time = time.perf_counter()
+    try:
+        shard_arguments = list()
+        for number, (position, first_line, last_line) in enumerate(shards):
+            shard_arguments.append((url, file_location, position, first_line, last_line, \
+                frozenset(line for line in launched_lines if first_line <= line <= last_line), concurrency, \
+                rate / processes if rate is not None else None, cache_settings, \
+                os.path.join(temporary_folder, SHARD_RESULTS_FILE % number) if temporary_folder else None))
+        with multiprocessing.Pool(processes, initializer=ignore_interrupt) as pool:
+            shard_results = pool.imap(launch_shard, shard_arguments)
+            for number, (process_id, shard_histograms, shard_failed_count, hits, misses, duration) \
+                in enumerate(shard_results):
+                shard_results_file_name = shard_arguments[number][-1]
+                if shard_results_file_name is not None:
+                    with open(shard_results_file_name) as shard_results_file:
+                        shutil.copyfileobj(shard_results_file, results_file)
+                    os.remove(shard_results_file_name)
+                _, first_line, last_line = shards[number]
+                if checkpoint is not None:
+                    checkpoint.acknowledge_range(first_line, last_line)
+                responses_count = shard_failed_count
+                for group, values in shard_histograms.items():
+                    shard_histogram = histogram.Histogram.from_dict(values)
+                    histograms[group].merge(shard_histogram)
+                    responses_count += shard_histogram.total
+                failed_count += shard_failed_count
+                if cache is not None:
+                    cache.hits += hits
+                    cache.misses += misses
+                process_responses, process_duration = process_throughputs.get(process_id, (0, 0))
+                process_throughputs[process_id] = (process_responses + responses_count, process_duration + duration)
+                launched_shards.update(number + 1, number + 1)
+        launched_shards.done(len(shards))
+    finally:
+        if temporary_folder is not None:
+            shutil.rmtree(temporary_folder)
+    duration = time.perf_counter() - start_time
+
+    for process_id, (process_responses, process_duration) in sorted(process_throughputs.items()):
+        log.info(LOG_INFO_PROCESS_THROUGHPUT.format(process_id, process_responses, process_duration, \
+            process_responses / process_duration if process_duration else 0))
+    responses_count = histograms[BLOCKED].total + histograms[NOT_BLOCKED].total + failed_count
+    throughput = responses_count / duration if duration else 0
+    log.info(LOG_INFO_THROUGHPUT.format(responses_count, duration, processes, throughput, throughput / processes))
+    if rate is not None:
+        write_latency_report(rate, duration, histograms, failed_count, latency_file_name)
+    else:
+        log.info(LOG_INFO_RESPONSES.format(histograms[BLOCKED].total, histograms[NOT_BLOCKED].total, failed_count))
+
+def main(args, uris=None):
     """Main function.
     
     Launches the uris contained in file to specific url retrieved on launch parameters.
 
     All uris are encoded before launch and all line break contained at the end of each line 
-    of the file will be deleted
+    of the file will be deleted. If concurrency is indicated the uris are launched concurrently
+    through persistent keep-alive connections. If rate is indicated the uris are launched at
+    fixed intervals and the latency percentiles are reported. If results file is indicated the
+    response of every uri is written on it. If verdict cache is indicated the uris whose verdict
+    is cached are not launched, their verdict is written in results file instead. If processes
+    are indicated, line ranges of the file are launched in parallel by a pool of processes.
+
+    A checkpoint of the launch is saved while launching and removed when the whole file has
+    been launched, named after the id or after the file if the id is not indicated. If resume is indicated and the checkpoint of an interrupted launch exists,
+    the results file is truncated to its size, a run marker with the lines answered after the
+    checkpoint is sent and the uris not answered before the checkpoint are launched
+
+    If uris are given they are launched instead of the lines of the file, starting with the first
+    one while the rest are being generated. They are launched without checkpoint, since it needs
+    the file to find the lines launched before it
 
     :param args: command-line retrieved arguments
     :type args: ArgumentParser.parse_args()
+    :param uris: iterable of uris with their line break launched instead of the file
+    :type uris: iterable
 
-    :raises FileNotFoundError: if file does not exist
+    :raises LogError: if file does not exist, the checkpoint does not belong to it or uris are
+        given with resume or processes
     """
     log.info(LOG_INFO_MAIN.format(args.url, args.port))
-    progress_file = log.progress(LOG_PROGRESS_FILE)
-    progress_url_launch = log.progress(LOG_PROGRESS_URL)
 
     url = args.url
     if args.port != PORT_DEFAULT:
         url = args.url + ":" + str(args.port)
 
+    if uris is not None and (getattr(args, RESUME_VARIABLE_NAME, False) or \
+        getattr(args, PROCESSES_VARIABLE_NAME, None) is not None):
+        log.error(URIS_STREAM_ERROR)
+    if uris is None and not os.path.isfile(args.file_location):
+        log.error(FILE_NOT_EXISTS_ERROR % args.file_location)
+    file_identifier = args.id if args.id is not None else IDENTIFIER_DEFAULT
+    checkpoint_file_name = get_checkpoint_file_name(args.file_location, args.id)
+    checkpoint = None
+    if getattr(args, RESUME_VARIABLE_NAME, False):
+        checkpoint = LaunchCheckpoint.load(checkpoint_file_name, args.file_location)
+        if checkpoint is None:
+            log.info(LOG_INFO_NO_CHECKPOINT.format(checkpoint_file_name))
+        elif checkpoint.results_size is None and args.results is not None:
+            log.error(CHECKPOINT_RESULTS_ERROR.format(checkpoint_file_name))
+    if checkpoint is None and uris is None:
+        checkpoint = LaunchCheckpoint(checkpoint_file_name, args.file_location)
+
+    cache = verdict_cache.open_cache(args)
+    if cache is not None and args.results is None:
+        cache.close()
+        log.error(CACHE_WITHOUT_RESULTS_ERROR)
+    if args.results is None and (args.concurrency is not None or getattr(args, PROCESSES_VARIABLE_NAME, None) \
+        is not None or getattr(args, RATE_VARIABLE_NAME, None) is not None):
+        log.warn(LOG_WARN_ORDER)
+    results_file = None
+    if args.results is not None and checkpoint is not None and checkpoint.attempt > 1:
+        results_file = open(args.results, 'r+')
+        results_file.seek(checkpoint.results_size)
+        results_file.truncate()
+    elif args.results is not None:
+        results_file = open(args.results, 'w')
+    if checkpoint is not None:
+        checkpoint.results_file = results_file
+        checkpoint.save()
+    launched = False
     try:
-        with open(args.file_location, 'r') as file:
-            count = 1
-            for line in file:
-                try:
-                    line_without_line_break = re.sub(r'\n$', '', line)
-                    progress_file.status("%s" % count)
-                    progress_url_launch.status("%s" % line_without_line_break)
-                    encoded_uri = parse.quote(line_without_line_break, safe="/:=?&")
-                    request.urlopen(url + encoded_uri, timeout=5)
-                    count += 1
-                except error.HTTPError:
-                    count += 1
-                    pass
-        file.close()
+        if checkpoint is not None and checkpoint.attempt > 1:
+            log.info(LOG_INFO_RESUME.format(checkpoint.attempt, checkpoint_file_name, checkpoint.line, \
+                len(checkpoint.acknowledged)))
+            send_run_marker(url, checkpoint.attempt, checkpoint.line, checkpoint.acknowledged)
+        rate = getattr(args, RATE_VARIABLE_NAME, None)
+        processes = getattr(args, PROCESSES_VARIABLE_NAME, None)
+        if processes is not None:
+            launch_in_processes(url, args.file_location, processes, args.concurrency, rate, results_file, \
+                LATENCY_FILE % file_identifier, cache, checkpoint)
+        elif rate is not None:
+            launch_at_rate(url, args.file_location, rate, args.concurrency or MAX_CONNECTIONS_DEFAULT, \
+                results_file, LATENCY_FILE % file_identifier, cache, checkpoint, uris)
+        elif args.concurrency is None:
+            launch_sequentially(url, args.file_location, results_file, cache, checkpoint, uris)
+        else:
+            launch_concurrently(url, args.file_location, args.concurrency, results_file, cache, checkpoint, uris)
+        launched = True
+        if cache is not None:
+            log.info(LOG_INFO_CACHE.format(cache.hits, cache.file_name, cache.misses))
         log.info(LOG_INFO_MAIN_END)
     except FileNotFoundError:
         log.error(FILE_NOT_EXISTS_ERROR % args.file_location)
+    finally:
+        if checkpoint is None:
+            if not launched:
+                log.info(LOG_INFO_STREAM_INTERRUPTED)
+        elif launched:
+            checkpoint.remove()
+        else:
+            checkpoint.save()
+            log.info(LOG_INFO_CHECKPOINT.format(checkpoint_file_name, checkpoint.line))
+        if results_file is not None:
+            results_file.close()
+        if cache is not None:
+            cache.close()
 
 # =====================================
 # Main
 # =====================================
 if __name__ == "__main__":
     args = init_parser().parse_args()
+    progress.set_batch_mode(args.batch)
     main(args)
\ No newline at end of file
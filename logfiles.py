@@ -0,0 +1,308 @@
+"""Functions that open Nginx log files given as a single file or as a glob of a rotated series
+(access.log.2.gz, access.log.1, access.log), also compressed with gzip or zstd, reading them in
+order as a single stream of lines without decompressing them to disk. Used by the analysis
+scripts to read archived runs, optionally decompressing them in a separate thread
+
+Author: Carlos Cagigao Bravo
+"""
+
+import glob
+import io
+import os.path as path
+import re
+import threading
+
+# =====================================
+# Constant variables
+# =====================================
+DECOMPRESSION_THREAD_ARG = "-dt"
+DECOMPRESSION_THREAD_HELP = "Decompresses compressed logs and reads rotated ones in a separate thread, \
+overlapping it with the parsing of their lines. Logs may be a glob of a rotated series, e.g. \
+'access.log*', read from the oldest file to the newest one, compressed with gzip (.gz) or zstd (.zst)"
+DECOMPRESSION_THREAD_VARIABLE_NAME = "decompression_thread"
+
+ZSTD_NOT_INSTALLED_ERROR = "zstandard package is needed to read {}, install it with: pip install zstandard"
+
+GZIP_EXT = ".gz"
+ZSTD_EXT = ".zst"
+GLOB_CHARACTERS = re.compile(r'[*?\[]')
+ROTATED_CP = re.compile(r'\.(?P<number>\d+)(\.gz|\.zst)?$')
+ENCODING = "ISO-8859-1"
+LINE_BREAK = b"\n"
+BLOCK_SIZE = 1024 * 1024
+QUEUE_BLOCKS = 8
+QUEUE_TIMEOUT = 0.1
+
+decompression_thread = False
+
+# =====================================
+# Classes
+# =====================================
+class LogStream(io.RawIOBase):
+    """Binary stream of the blocks read from the files of a log, so they can be wrapped in a text
+    stream and read line by line as a single file"""
+
+    def __init__(self, blocks):
+        """Creates the stream
+
+        :param blocks: generator of blocks of bytes, none of them empty
+        :type blocks: generator
+        """
+        self.blocks = blocks
+        self.block = b""
+        self.offset = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        """Copies the next bytes of the current block into the buffer, reading a new block when it
+        has been copied completely
+
+        :param buffer: buffer to fill
+        :type buffer: bytearray
+
+        :return: number of bytes copied, 0 at the end of the last file
+        :rtype: int
+        """
+        if self.offset == len(self.block):
+            self.block = next(self.blocks, b"")
+            self.offset = 0
+        size = min(len(buffer), len(self.block) - self.offset)
+        buffer[:size] = self.block[self.offset:self.offset + size]
+        self.offset += size
+        return size
+
+    def close(self):
+        """Closes the file being read and stops the decompression thread"""
+        self.blocks.close()
+        super().close()
+
+# =====================================
+# Functions
+# =====================================
+def add_optional_arguments(parser):
+    """Add optional arguments to parser
+
+    :param parser: parser to add arguments
+    :type parser: ArgumentParser
+    """
+    parser.add_argument(DECOMPRESSION_THREAD_ARG, help=DECOMPRESSION_THREAD_HELP, \
+        dest=DECOMPRESSION_THREAD_VARIABLE_NAME, action='store_true')
+
+def set_decompression_thread(enabled):
+    """Enables reading the files of compressed and rotated logs in a separate thread
+
+    :param enabled: if decompression thread is indicated
+    :type enabled: boolean
+    """
+    global decompression_thread
+    decompression_thread = enabled
+
+def get_rotation_key(file_name):
+    """Gets the key that sorts the files of a rotated log from the oldest to the newest one, the
+    highest rotation number first and the file without number last. Files without rotation number
+    are sorted by name
+
+    :param file_name: name of a file of the log
+    :type file_name: string
+
+    :return: key of the file
+    :rtype: tuple
+
+    Example:
+        'access.log.2.gz' => (-2, 'access.log.2.gz')
+    """
+    result = ROTATED_CP.search(path.basename(file_name))
+    return -int(result.group('number')) if result is not None else 0, file_name
+
+def get_log_files(log_path):
+    """Gets the files of a log, which may be a single file or a glob
+
+    :param log_path: log file or glob retrieved from command line
+    :type log_path: string
+
+    :return: files in reading order, empty if there is none
+    :rtype: list
+    """
+    if path.isfile(log_path):
+        return [log_path]
+    if GLOB_CHARACTERS.search(log_path) is None:
+        return list()
+    return sorted((file_name for file_name in glob.glob(log_path) if path.isfile(file_name)), key=get_rotation_key)
+
+def exists(log_path):
+    """Checks if a log has some file
+
+    :param log_path: log file or glob retrieved from command line
+    :type log_path: string
+
+    :rtype: boolean
+    """
+    return len(get_log_files(log_path)) > 0
+
+def is_compressed(file_name):
+    """Checks if a file is compressed by its extension
+
+    :param file_name: name of the file
+    :type file_name: string
+
+    :rtype: boolean
+    """
+    return file_name.endswith(GZIP_EXT) or file_name.endswith(ZSTD_EXT)
+
+def is_plain_file(log_path):
+    """Checks if a log is a single file that is not compressed, so it can be read by byte ranges
+
+    :param log_path: log file or glob retrieved from command line
+    :type log_path: string
+
+    :rtype: boolean
+    """
+    return path.isfile(log_path) and not is_compressed(log_path)
+
+def get_size(log_path):
+    """Gets the bytes of the lines of a log, used to estimate the time left reading it
+
+    :param log_path: log file or glob retrieved from command line
+    :type log_path: string
+
+    :return: size of its files, None if some of them is compressed
+    :rtype: int
+    """
+    file_names = get_log_files(log_path)
+    if any(is_compressed(file_name) for file_name in file_names):
+        return None
+    return sum(path.getsize(file_name) for file_name in file_names)
+
+def open_binary_file(file_name):
+    """Opens a file of a log in binary mode, decompressing it while it is read if it is compressed
+
+    :param file_name: name of the file
+    :type file_name: string
+
+    :raises LogError: if the file is compressed with zstd and zstandard package is not installed
+
+    :return: binary stream of the decompressed file
+    :rtype: file
+    """
+    if file_name.endswith(GZIP_EXT):
+        import gzip
+        return gzip.open(file_name, 'rb')
+    if file_name.endswith(ZSTD_EXT):
+        try:
+            import zstandard
+        except ImportError:
+            from logger import log
+            log.error(ZSTD_NOT_INSTALLED_ERROR.format(file_name))
+        return zstandard.ZstdDecompressor().stream_reader(open(file_name, 'rb'), closefd=True)
+    return open(file_name, 'rb')
+
+def read_blocks(file_names):
+    """Reads the files of a log one after another in blocks of bytes. A line break is added at the
+    end of a file that does not finish with one, so its last line is not joined to the first line
+    of the next file
+
+    :param file_names: files in reading order
+    :type file_names: list
+
+    :return: generator of blocks of bytes
+    :rtype: generator
+    """
+    for file_name in file_names:
+        with open_binary_file(file_name) as log_file:
+            last_block = LINE_BREAK
+            block = log_file.read(BLOCK_SIZE)
+            while block:
+                yield block
+                last_block = block
+                block = log_file.read(BLOCK_SIZE)
+            if not last_block.endswith(LINE_BREAK):
+                yield LINE_BREAK
+
+def read_blocks_in_thread(blocks):
+    """Reads the blocks in a separate thread keeping at most QUEUE_BLOCKS of them ahead, so files
+    are read and decompressed while the lines of the previous blocks are parsed. Decompression
+    releases the GIL, so both are done at the same time
+
+    :param blocks: generator of blocks of bytes
+    :type blocks: generator
+
+    :return: generator of the same blocks
+    :rtype: generator
+    """
+    import queue
+    blocks_queue = queue.Queue(maxsize=QUEUE_BLOCKS)
+    stopped = threading.Event()
+
+    def put(item):
+        while not stopped.is_set():
+            try:
+                blocks_queue.put(item, timeout=QUEUE_TIMEOUT)
+                return
+            except queue.Full:
+                pass
+
+    def read():
+        try:
+            for block in blocks:
+                put(block)
+                if stopped.is_set():
+                    break
+        except BaseException as read_error:
+            put(read_error)
+        finally:
+            blocks.close()
+            put(None)
+
+    thread = threading.Thread(target=read, daemon=True)
+    thread.start()
+    try:
+        item = blocks_queue.get()
+        while item is not None:
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+            item = blocks_queue.get()
+    finally:
+        stopped.set()
+        thread.join()
+
+def get_log_blocks(log_path):
+    """Reads the files of a log in blocks of bytes, in a separate thread if it is enabled
+
+    :param log_path: log file or glob retrieved from command line
+    :type log_path: string
+
+    :return: generator of blocks of bytes
+    :rtype: generator
+    """
+    blocks = read_blocks(get_log_files(log_path))
+    return read_blocks_in_thread(blocks) if decompression_thread else blocks
+
+def open_log(log_path):
+    """Opens a log to read its lines as a single text file. A single file that is not compressed
+    is opened directly, the files of a rotated or compressed log are streamed one after another,
+    so line numbers go on from one file to the next one
+
+    :param log_path: log file or glob retrieved from command line
+    :type log_path: string
+
+    :return: text stream of the lines of the log
+    :rtype: file
+    """
+    if is_plain_file(log_path):
+        return open(log_path, encoding=ENCODING, errors='ignore')
+    return io.TextIOWrapper(io.BufferedReader(LogStream(get_log_blocks(log_path)), BLOCK_SIZE), \
+        encoding=ENCODING, errors='ignore')
+
+def count_lines(log_path):
+    """Counts the line breaks of a log, as wc -l does with its decompressed files
+
+    :param log_path: log file or glob retrieved from command line
+    :type log_path: string
+
+    :return: number of lines
+    :rtype: int
+    """
+    return sum(block.count(LINE_BREAK) for block in get_log_blocks(log_path))
@@ -0,0 +1,159 @@
+"""Lightweight log used by the analysis scripts instead of pwntools, which takes around
+a second to be imported. Messages are written with the same prefixes: [*] for info,
+[!] for warnings, [ERROR] for errors, which also raise an exception, and [x]/[+] for the
+status of a progress.
+
+Author: Carlos Cagigao Bravo
+"""
+
+import sys
+
+# =====================================
+# Constant variables
+# =====================================
+INFO_PREFIX = "[*]"
+WARN_PREFIX = "[!]"
+ERROR_PREFIX = "[ERROR]"
+PROGRESS_PREFIX = "[x]"
+SUCCESS_PREFIX = "[+]"
+BLUE = "\033[34m"
+YELLOW = "\033[33m"
+RED = "\033[31m"
+GREEN = "\033[32m"
+RESET = "\033[0m"
+CLEAR_LINE = "\r\033[K"
+LINE = "{} {}\n"
+STATUS_LINE = "{}: {}"
+
+# =====================================
+# Classes
+# =====================================
+class LogError(Exception):
+    """Exception raised after an error is written"""
+
+class Progress:
+    """Status of a long task, rewritten in the same line of the terminal"""
+
+    def __init__(self, log, message):
+        """Creates the progress of a task
+
+        :param log: log where the status is written
+        :type log: Log
+        :param message: message written before the status
+        :type message: string
+        """
+        self.log = log
+        self.message = message
+
+    def status(self, status):
+        """Writes the status of the task replacing the previous one. Nothing is written when
+        the output is not a terminal
+
+        :param status: status of the task
+        :type status: string
+        """
+        if self.log.terminal:
+            self.log.write(CLEAR_LINE + self.log.color(PROGRESS_PREFIX, BLUE) + " " + \
+                STATUS_LINE.format(self.message, status))
+            self.log.open_line = True
+
+    def success(self, status):
+        """Writes the final status of the task
+
+        :param status: final status of the task
+        :type status: string
+        """
+        self.log.line(SUCCESS_PREFIX, GREEN, STATUS_LINE.format(self.message, status))
+
+class Log:
+    """Log that writes messages in the standard output found when it is created, so they are not
+    written in files when the standard output is redirected (e.g. by fileinput)
+    """
+
+    def __init__(self, output):
+        """Creates the log
+
+        :param output: stream where messages are written
+        :type output: file
+        """
+        self.output = output
+        self.terminal = output.isatty()
+        self.open_line = False
+
+    def write(self, text):
+        """Writes text in the output
+
+        :param text: text to write
+        :type text: string
+        """
+        self.output.write(text)
+        self.output.flush()
+
+    def color(self, text, color):
+        """Colors text if the output is a terminal
+
+        :param text: text to color
+        :type text: string
+        :param color: ANSI color code
+        :type color: string
+
+        :return: colored text
+        :rtype: string
+        """
+        return color + text + RESET if self.terminal else text
+
+    def line(self, prefix, color, message):
+        """Writes a message in a new line, replacing the status of a progress
+
+        :param prefix: prefix of the message
+        :type prefix: string
+        :param color: ANSI color code of the prefix
+        :type color: string
+        :param message: message
+        :type message: string
+        """
+        text = LINE.format(self.color(prefix, color), message)
+        if self.open_line:
+            text = CLEAR_LINE + text
+            self.open_line = False
+        self.write(text)
+
+    def info(self, message):
+        """Writes an info message
+
+        :param message: message
+        :type message: string
+        """
+        self.line(INFO_PREFIX, BLUE, message)
+
+    def warn(self, message):
+        """Writes a warning message
+
+        :param message: message
+        :type message: string
+        """
+        self.line(WARN_PREFIX, YELLOW, message)
+
+    def error(self, message):
+        """Writes an error message and raises an exception, stopping the script
+
+        :param message: message
+        :type message: string
+
+        :raises LogError: always
+        """
+        self.line(ERROR_PREFIX, RED, message)
+        raise LogError(message)
+
+    def progress(self, message):
+        """Creates the progress of a long task
+
+        :param message: message written before the status
+        :type message: string
+
+        :return: progress
+        :rtype: Progress
+        """
+        return Progress(self, message)
+
+log = Log(sys.stdout)
@@ -0,0 +1,157 @@
+"""Functions and classes that report the progress of the loops of the analysis scripts.
+
+The status of a progress is only formatted and written when some time has passed since the
+last time it was written, showing the number of items processed, the throughput and the
+estimated time left. Progress is disabled when the output is not a terminal or batch mode
+is indicated, so redirected runs do not write a line for every processed item
+
+Author: Carlos Cagigao Bravo
+"""
+
+from logger import log
+import math
+import sys
+import time
+
+# =====================================
+# Constant variables
+# =====================================
+BATCH_ARG = "-b"
+BATCH_HELP = "Batch mode, progress of the analysis is not shown. It is not shown either when the output \
+is not a terminal"
+BATCH_VARIABLE_NAME = "batch"
+
+INTERVAL = 0.5
+MAX_STEP = 65536
+LINES = "lines"
+REQUESTS = "requests"
+STATUS = "{} {} | {:.0f} {}/s"
+STATUS_ETA = " | ETA {}"
+STATUS_DETAIL = " | {}"
+ETA_FORMAT = "{:d}:{:02d}:{:02d}"
+
+enabled = True
+
+# =====================================
+# Functions
+# =====================================
+def add_optional_arguments(parser):
+    """Add optional arguments to parser
+
+    :param parser: parser to add arguments
+    :type parser: ArgumentParser
+    """
+    parser.add_argument(BATCH_ARG, help=BATCH_HELP, dest=BATCH_VARIABLE_NAME, action='store_true')
+
+def set_batch_mode(batch):
+    """Enables progress only if batch mode is not indicated and the output is a terminal
+
+    :param batch: if batch mode is indicated
+    :type batch: boolean
+    """
+    global enabled
+    enabled = not batch and sys.stdout.isatty()
+
+def format_eta(seconds):
+    """Formats the estimated time left
+
+    :param seconds: seconds left
+    :type seconds: float
+
+    :return: hours, minutes and seconds left
+    :rtype: string
+
+    Example:
+        3725.2 => '1:02:05'
+    """
+    seconds = int(seconds)
+    return ETA_FORMAT.format(seconds // 3600, seconds // 60 % 60, seconds % 60)
+
+# =====================================
+# Classes
+# =====================================
+class Progress:
+    """Progress of a loop whose status is written at most every INTERVAL seconds.
+
+    update is called for every item, but the clock is only read every step items. The step
+    is doubled while the interval has not passed and halved when it is read too late, so most
+    calls are a single comparison
+    """
+
+    def __init__(self, message, unit=LINES, total=None):
+        """Creates the progress, which is not shown when progress is disabled
+
+        :param message: message shown before the status
+        :type message: string
+        :param unit: name of the counted items
+        :type unit: string
+        :param total: total size of the input, in the units of the position passed to update
+        :type total: int
+        """
+        self.unit = unit
+        self.total = total
+        self.start_time = self.last_time = time.monotonic()
+        self.step = 1
+        if enabled:
+            self.progress = log.progress(message)
+            self.next_count = 1
+        else:
+            self.progress = None
+            self.next_count = math.inf
+
+    def update(self, count, position=None, detail=None):
+        """Updates the number of processed items, writing the status if the interval has passed
+
+        :param count: number of items processed
+        :type count: int
+        :param position: processed size of the input, used with total to estimate the time left
+        :type position: int
+        :param detail: text added at the end of the status
+        :type detail: string
+        """
+        if count < self.next_count:
+            return
+        now = time.monotonic()
+        elapsed = now - self.last_time
+        if elapsed < INTERVAL:
+            self.step = min(self.step * 2, MAX_STEP)
+            self.next_count = count + self.step
+            return
+        if elapsed > 2 * INTERVAL:
+            self.step = max(self.step // 2, 1)
+        self.progress.status(self.get_status(count, position, detail, now))
+        self.last_time = now
+        self.next_count = count + self.step
+
+    def get_status(self, count, position, detail, now):
+        """Formats the status with the number of items, the throughput and the time left
+
+        :param count: number of items processed
+        :type count: int
+        :param position: processed size of the input
+        :type position: int
+        :param detail: text added at the end of the status
+        :type detail: string
+        :param now: current monotonic time
+        :type now: float
+
+        :return: status
+        :rtype: string
+        """
+        elapsed = now - self.start_time
+        rate = count / elapsed if elapsed else 0
+        status = STATUS.format(count, self.unit, rate, self.unit)
+        if self.total and position:
+            status += STATUS_ETA.format(format_eta(elapsed * (self.total - position) / position))
+        if detail is not None:
+            status += STATUS_DETAIL.format(detail)
+        return status
+
+    def done(self, count):
+        """Writes the final status of the progress
+
+        :param count: number of items processed
+        :type count: int
+        """
+        if self.progress is not None:
+            self.progress.success(self.get_status(count, None, None, time.monotonic()))
@@ -0,0 +1,272 @@
+"""Script that queries the rows of analysis runs loaded in a SQLite database by store.py through
+inverted indexes of their rule IDs, block types, request IDs and URI trigrams, so packets of
+every run are found in milliseconds. Indexes are updated incrementally with the runs loaded
+since the last query.
+
+Usage: query.py [-h] [-db database] [-i paths [paths ...]] [-ds dataset]
+                [-r rule_id] [-bt block_type] [-rid request_id] [-s text]
+                [-v verdict] [-b]
+
+optional arguments:
+  -h, --help            show this help message and exit
+  -db database          SQLite database of store.py. By default: analysis.db
+  -i paths [paths ...]  Analysis files or folders loaded in the database
+                        before querying it, as store.py does. Runs already
+                        loaded are skipped, so only new runs are loaded and
+                        indexed
+  -ds dataset           Dataset of the loaded runs, or of the queried rows. By
+                        default the dataset of a run is the first folder below
+                        the indicated one (e.g. rdb for analyzed-databases)
+  -r rule_id            Finds the attacks detected by a rule ID
+  -bt block_type        Finds the attacks with a block type
+  -rid request_id       Finds the attack with a request ID. Clean rows do not
+                        keep their request ID
+  -s text               Finds the URIs that contain a text, case sensitive,
+                        through the index of their trigrams. Texts shorter
+                        than 3 characters are searched reading every URI
+  -v verdict            Finds only the rows with a verdict, attack or clean
+  -b                    Batch mode, progress of the analysis is not shown. It
+                        is not shown either when the output is not a terminal
+
+Author: Carlos Cagigao Bravo
+"""
+
+import argparse
+from logger import log
+import os
+import os.path as path
+import sqlite3
+import time
+import progress
+import store
+
+# =====================================
+# Constant variables
+# =====================================
+DESCRIPTION = "Script that queries the rows of analysis runs loaded in a SQLite database by store.py through \
+inverted indexes of their rule IDs, block types, request IDs and URI trigrams, so packets of every run are found in \
+milliseconds. Indexes are updated incrementally with the runs loaded since the last query"
+
+DATABASE_ARG = "-db"
+DATABASE_HELP = "SQLite database of store.py. By default: %s" % store.DATABASE_DEFAULT
+DATABASE_VARIABLE_NAME = "database"
+
+INGEST_ARG = "-i"
+INGEST_HELP = "Analysis files or folders loaded in the database before querying it, as store.py does. Runs already \
+loaded are skipped, so only new runs are loaded and indexed"
+INGEST_VARIABLE_NAME = "paths"
+
+DATASET_ARG = "-ds"
+DATASET_HELP = "Dataset of the loaded runs, or of the queried rows. By default the dataset of a run is the first \
+folder below the indicated one (e.g. rdb for analyzed-databases)"
+DATASET_VARIABLE_NAME = "dataset"
+
+RULE_ARG = "-r"
+RULE_HELP = "Finds the attacks detected by a rule ID"
+RULE_VARIABLE_NAME = "rule_id"
+
+BLOCK_TYPE_ARG = "-bt"
+BLOCK_TYPE_HELP = "Finds the attacks with a block type"
+BLOCK_TYPE_VARIABLE_NAME = "block_type"
+
+REQUEST_ID_ARG = "-rid"
+REQUEST_ID_HELP = "Finds the attack with a request ID. Clean rows do not keep their request ID"
+REQUEST_ID_VARIABLE_NAME = "request_id"
+
+TEXT_ARG = "-s"
+TEXT_HELP = "Finds the URIs that contain a text, case sensitive, through the index of their trigrams. Texts \
+shorter than 3 characters are searched reading every URI"
+TEXT_VARIABLE_NAME = "text"
+
+VERDICT_ARG = "-v"
+VERDICT_ATTACK = "attack"
+VERDICT_CLEAN = "clean"
+VERDICT_HELP = "Finds only the rows with a verdict, %s or %s" % (VERDICT_ATTACK, VERDICT_CLEAN)
+VERDICT_VARIABLE_NAME = "verdict"
+
+LOG_INFO_INDEXING = "Indexing URIs of {} new runs"
+LOG_INFO_INDEXED = "Indexed {} new URIs of run {} of dataset {} in {}"
+TRIGRAM_NOT_SUPPORTED_ERROR = "SQLite {} does not support FTS5 trigram tokenizer, it is needed to index URIs \
+(SQLite 3.34 or newer)"
+NOTHING_TO_DO_ERROR = "Indicate the files to load with %s or a query with %s, %s, %s, %s or %s" % (INGEST_ARG, \
+    RULE_ARG, BLOCK_TYPE_ARG, REQUEST_ID_ARG, TEXT_ARG, VERDICT_ARG)
+
+TRIGRAM_SIZE = 3
+PHRASE_QUOTE = '"'
+CONDITION_SEPARATOR = " AND "
+QUERY_SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS indexed_runs (run_key INTEGER PRIMARY KEY, loaded_at REAL NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS requests_block_type ON requests (block_type)",
+    "CREATE INDEX IF NOT EXISTS requests_request_id ON requests (request_id)"
+]
+CREATE_URI_TRIGRAMS = "CREATE VIRTUAL TABLE IF NOT EXISTS uri_trigrams USING fts5(uri, \
+tokenize='trigram case_sensitive 1')"
+SELECT_NEW_RUNS = "SELECT runs.run_key, runs.dataset, runs.folder, runs.run_id FROM runs LEFT JOIN indexed_runs \
+ON indexed_runs.run_key = runs.run_key AND indexed_runs.loaded_at = runs.loaded_at WHERE indexed_runs.run_key IS NULL \
+ORDER BY runs.run_key"
+DELETE_STALE_RUNS = "DELETE FROM indexed_runs WHERE NOT EXISTS (SELECT 1 FROM runs \
+WHERE runs.run_key = indexed_runs.run_key AND runs.loaded_at = indexed_runs.loaded_at)"
+INSERT_RUN_URIS = "INSERT INTO uri_trigrams (rowid, uri) SELECT uri_hash, min(uri) FROM requests \
+WHERE run_key = ? AND uri_hash NOT IN (SELECT rowid FROM uri_trigrams) GROUP BY uri_hash"
+INSERT_INDEXED_RUN = "INSERT OR REPLACE INTO indexed_runs (run_key, loaded_at) SELECT run_key, loaded_at FROM runs \
+WHERE run_key = ?"
+ANALYZE = "ANALYZE"
+SELECT_ROWS = "SELECT runs.dataset, runs.folder, runs.run_id, requests.packet, requests.timestamp, \
+requests.block_type, requests.rule_ids, requests.uri FROM requests JOIN runs ON runs.run_key = requests.run_key WHERE "
+RULE_CONDITION = "requests.request_key IN (SELECT request_key FROM request_rules WHERE rule_id = ?)"
+BLOCK_TYPE_CONDITION = "requests.block_type = ?"
+REQUEST_ID_CONDITION = "requests.request_id = ?"
+TRIGRAMS_CONDITION = "requests.uri_hash IN (SELECT rowid FROM uri_trigrams WHERE uri_trigrams MATCH ?)"
+TEXT_CONDITION = "instr(requests.uri, ?) > 0"
+VERDICT_CONDITION = "requests.attack = ?"
+DATASET_CONDITION = "runs.dataset = ?"
+
+# =====================================
+# Functions
+# =====================================
+def init_parser():
+    """Retrieves the parameters with which it has been executed
+
+    :rtype: ArgumentParser
+    :return: arguments prepared to be parsed
+    """
+    parser = argparse.ArgumentParser(description=DESCRIPTION)
+    parser.add_argument(DATABASE_ARG, help=DATABASE_HELP, default=store.DATABASE_DEFAULT, \
+        metavar=DATABASE_VARIABLE_NAME, dest=DATABASE_VARIABLE_NAME)
+    parser.add_argument(INGEST_ARG, help=INGEST_HELP, metavar=INGEST_VARIABLE_NAME, dest=INGEST_VARIABLE_NAME, \
+        nargs='+')
+    parser.add_argument(DATASET_ARG, help=DATASET_HELP, metavar=DATASET_VARIABLE_NAME, dest=DATASET_VARIABLE_NAME)
+    parser.add_argument(RULE_ARG, help=RULE_HELP, metavar=RULE_VARIABLE_NAME, dest=RULE_VARIABLE_NAME, type=int)
+    parser.add_argument(BLOCK_TYPE_ARG, help=BLOCK_TYPE_HELP, metavar=BLOCK_TYPE_VARIABLE_NAME, \
+        dest=BLOCK_TYPE_VARIABLE_NAME, type=int)
+    parser.add_argument(REQUEST_ID_ARG, help=REQUEST_ID_HELP, metavar=REQUEST_ID_VARIABLE_NAME, \
+        dest=REQUEST_ID_VARIABLE_NAME)
+    parser.add_argument(TEXT_ARG, help=TEXT_HELP, metavar=TEXT_VARIABLE_NAME, dest=TEXT_VARIABLE_NAME)
+    parser.add_argument(VERDICT_ARG, help=VERDICT_HELP, metavar=VERDICT_VARIABLE_NAME, dest=VERDICT_VARIABLE_NAME, \
+        choices=[VERDICT_ATTACK, VERDICT_CLEAN])
+    progress.add_optional_arguments(parser)
+    return parser
+
+def update_indexes(connection):
+    """Creates the indexes of the rows if they do not exist and adds the URIs of the runs loaded
+    since the last update to the trigram index, every run in its own transaction. Only URIs not
+    indexed yet are added, keyed by their hash, so URIs repeated in many runs are indexed once.
+    Runs loaded again are indexed again, and URIs of deleted runs are left in the index since
+    they do not match any row. Statistics of the indexes are updated afterwards, so SQLite does
+    not choose the index of block types, which have few values, over the others
+
+    :param connection: open database
+    :type connection: sqlite3.Connection
+
+    :raises LogError: if SQLite does not support FTS5 trigram tokenizer
+    """
+    store.create_row_indexes(connection)
+    with connection:
+        try:
+            connection.execute(CREATE_URI_TRIGRAMS)
+        except sqlite3.OperationalError:
+            log.error(TRIGRAM_NOT_SUPPORTED_ERROR.format(sqlite3.sqlite_version))
+        for statement in QUERY_SCHEMA:
+            connection.execute(statement)
+        connection.execute(DELETE_STALE_RUNS)
+    new_runs = connection.execute(SELECT_NEW_RUNS).fetchall()
+    if new_runs:
+        log.info(LOG_INFO_INDEXING.format(len(new_runs)))
+    for run_key, dataset, folder, run_id in new_runs:
+        with connection:
+            uris = connection.execute(INSERT_RUN_URIS, (run_key,)).rowcount
+            connection.execute(INSERT_INDEXED_RUN, (run_key,))
+        log.info(LOG_INFO_INDEXED.format(uris, run_id, dataset, folder or os.curdir))
+    if new_runs:
+        connection.execute(ANALYZE)
+
+def get_phrase(text):
+    """Gets the FTS5 phrase that matches the trigrams of a text one after another, that is,
+    the URIs that contain it
+
+    :param text: text to find
+    :type text: string
+
+    :return: quoted phrase
+    :rtype: string
+
+    Example:
+        '/etc/passwd' => '"/etc/passwd"'
+    """
+    return PHRASE_QUOTE + text.replace(PHRASE_QUOTE, PHRASE_QUOTE * 2) + PHRASE_QUOTE
+
+def find_rows(connection, rule_id=None, block_type=None, request_id=None, text=None, verdict=None, dataset=None):
+    """Finds the rows of every run that meet all the indicated conditions. Rows containing a text
+    are found by the trigrams of their URIs, then checked, since every trigram may be anywhere in
+    the URI
+
+    :param connection: open database
+    :type connection: sqlite3.Connection
+    :param rule_id: rule ID that detected the attacks
+    :type rule_id: int
+    :param block_type: block type of the attacks
+    :type block_type: int
+    :param request_id: request ID of the attack
+    :type request_id: string
+    :param text: text contained in the URIs
+    :type text: string
+    :param verdict: attack or clean
+    :type verdict: string
+    :param dataset: dataset of the runs, all of them by default
+    :type dataset: string
+
+    :return: list of (dataset, folder, run ID, packet, timestamp, block type, rule IDs, URI) tuples
+    :rtype: list
+    """
+    conditions, parameters = list(), list()
+    for condition, value in ((RULE_CONDITION, rule_id), (BLOCK_TYPE_CONDITION, block_type), \
+            (REQUEST_ID_CONDITION, request_id), (DATASET_CONDITION, dataset)):
+        if value is not None:
+            conditions.append(condition)
+            parameters.append(value)
+    if text is not None:
+        if len(text) >= TRIGRAM_SIZE:
+            conditions.append(TRIGRAMS_CONDITION)
+            parameters.append(get_phrase(text))
+        conditions.append(TEXT_CONDITION)
+        parameters.append(text)
+    if verdict is not None:
+        conditions.append(VERDICT_CONDITION)
+        parameters.append(int(verdict == VERDICT_ATTACK))
+    return connection.execute(SELECT_ROWS + CONDITION_SEPARATOR.join(conditions) + store.ORDER_BY_RUN, \
+        parameters).fetchall()
+
+def main(args):
+    """Main function.
+
+    Loads the runs found in the indicated files and folders that are not loaded yet, updates
+    the indexes with the new runs and shows the rows that meet all the indicated conditions
+
+    :param args: command-line retrieved arguments
+    :type args: ArgumentParser.parse_args()
+
+    :raises LogError: if a path or the database does not exist or there is nothing to do
+    """
+    query = (args.rule_id, args.block_type, args.request_id, args.text, args.verdict)
+    if args.paths is None and all(value is None for value in query):
+        log.error(NOTHING_TO_DO_ERROR)
+    if args.paths is None and not path.isfile(args.database):
+        log.error(store.DATABASE_NOT_EXISTS_ERROR % args.database)
+    connection = store.open_database(args.database)
+    try:
+        if args.paths is not None:
+            store.load_runs(connection, args.database, args.paths, args.dataset)
+        update_indexes(connection)
+        if any(value is not None for value in query):
+            start_time = time.perf_counter()
+            store.show_rows(find_rows(connection, *query, None if args.paths else args.dataset), start_time)
+    finally:
+        connection.close()
+
+# =====================================
+# Main
+# =====================================
+if __name__ == "__main__":
+    args = init_parser().parse_args()
+    progress.set_batch_mode(args.batch)
+    main(args)
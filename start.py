@@ -1,8 +1,11 @@
 """Script that launches all parts of Nemesida WAF Analysis, in order: generator,
 launcher, analyzer, comparer
 
-Usage: start.py [-h] [-o output] [-u url] [-p port] [-e error_log]
-                [-a access_log] -i input -f file_location -id id
+Usage: start.py [-h] [-o output] [-u url] [-p port] [-c concurrency]
+                [-r results] [-rt rate] [-re] [-pr processes] [-e error_log]
+                [-a access_log] [-j workers] [-m memory] [-sp] [-sg] [-nu]
+                [-cl] [-vc cache] [-rs ruleset] [-vcs cache_size] [-dt] [-b]
+                -i input -f file_location -id id
 
 optional arguments:
   -h, --help        show this help message and exit
@@ -12,12 +15,78 @@ optional arguments:
                     configuration file. By default: 'http://localhost'
   -p port           Specific port to launch the URIs from the file. By
                     default: '80'
+  -c concurrency    Number of URIs launched concurrently through persistent
+                    HTTP/1.1 keep-alive connections. By default URIs are
+                    launched one by one opening a new connection for each one
+  -r results        File where the line number, HTTP status, latency and
+                    request ID of every launched URI are written. Request ID
+                    and block type are recovered from X-Request-ID and
+                    X-Block-Type response headers
+  -rt rate          Requests per second launched at fixed intervals without
+                    waiting for the responses (open loop). Latency is measured
+                    from the time every request was scheduled and its
+                    percentiles are written in analysis-'id'.latency.json.
+                    Concurrency limits the number of open connections, by
+                    default: 512
+  -re               Resumes an interrupted launch of the same file and id
+                    after the last line whose response, and the ones of all
+                    previous lines, had been received, appending to the
+                    results file. Checkpoints of that line are written in
+                    analysis-'id'.launcher.checkpoint while launching, or in
+                    'file'.launcher.checkpoint when id is not indicated, and a
+                    run marker request is sent so analyzer can separate the
+                    attempts in the access log
+  -pr processes     Number of processes launching line ranges of the file in
+                    parallel, each one through its own connections as
+                    concurrency indicates and at the rate divided between
+                    them. Results of every process are merged by line number
+                    and the combined throughput is shown. By default the file
+                    is launched by a single process
   -e error_log      Nginx error log file which contains information about
                     Nemesida blocked urls. By default:
                     /var/log/nginx/error.log
   -a access_log     Nginx access log file which contains information about
                     access to the server. By default:
                     /var/log/nginx/access.log
+  -j workers        Number of processes parsing byte ranges of the access log
+                    in parallel. By default the access log is parsed by a
+                    single process
+  -m memory         Memory in megabytes used to join error log and .index file
+                    by request ID, spilling sorted runs to temporary files
+                    when it is exceeded. By default the join is done
+                    completely in memory
+  -sp               Analyzes access log and error log in a single streaming
+                    pass creating .clean, .index and .attacks files at the
+                    same time, instead of running analyzer and comparer one
+                    after another
+  -sg               Launches the URIs while they are generated from the input
+                    file, starting with the first line instead of waiting for
+                    the whole .uri file. The .uri file is written at the same
+                    time in a separate thread. It can not be used with -re nor
+                    -pr, which launch the .uri file after generating it
+  -nu               Does not write the .uri file when the URIs are launched
+                    while they are generated with -sg
+  -cl               Writes also analysis-'id'.columns, a binary columnar file
+                    of .index and .attacks files whose rows are read by packet
+                    number without parsing them. It is converted back to text
+                    with columnar.py
+  -vc cache         SQLite file where the verdicts of launched URIs are kept
+                    by URI and ruleset. Launcher does not launch the URIs
+                    whose verdict is cached, writing it in the results file
+                    instead, and analyzer adds the verdicts of the results
+                    file to the cache
+  -rs ruleset       Identifier of the ruleset of Nemesida WAF whose verdicts
+                    are cached, e.g. its Docker image. Required with verdict
+                    cache
+  -vcs cache_size   Maximum number of verdicts kept in the cache, the least
+                    recently used ones are removed. By default: 1000000
+  -dt               Decompresses compressed logs and reads rotated ones in a
+                    separate thread, overlapping it with the parsing of their
+                    lines. Logs may be a glob of a rotated series, e.g.
+                    'access.log*', read from the oldest file to the newest
+                    one, compressed with gzip (.gz) or zstd (.zst)
+  -b                Batch mode, progress of the analysis is not shown. It is
+                    not shown either when the output is not a terminal
 
 required arguments:
   -i input          Input file to be parsed in RAW format (fileName-raw.uri)
@@ -29,10 +98,18 @@ Author: Carlos Cagigao Bravo
 """
 
 import argparse
+from logger import log
+import shutil
+import tempfile
+from urllib import parse
 import launcher
 import generator
 import analyzer
 import comparer
+import columnar
+import logfiles
+import progress
+import verdict_cache
 
 # =====================================
 # Constant variables
@@ -41,6 +118,30 @@ DESCRIPTION = "Script that launches all parts of Nemesida WAF Analysis, in order
     generator, launcher, analyzer, comparer"
 REQUIRED_ARGS = "required arguments"
 
+SINGLE_PASS_ARG = "-sp"
+SINGLE_PASS_HELP = "Analyzes access log and error log in a single streaming pass creating .clean, .index and \
+.attacks files at the same time, instead of running analyzer and comparer one after another"
+SINGLE_PASS_VARIABLE_NAME = "single_pass"
+
+STREAM_ARG = "-sg"
+STREAM_HELP = "Launches the URIs while they are generated from the input file, starting with the first line \
+instead of waiting for the whole .uri file. The .uri file is written at the same time in a separate thread. It can \
+not be used with %s nor %s, which launch the .uri file after generating it" % (launcher.RESUME_ARG, \
+launcher.PROCESSES_ARG)
+STREAM_VARIABLE_NAME = "stream"
+
+NO_URI_FILE_ARG = "-nu"
+NO_URI_FILE_HELP = "Does not write the .uri file when the URIs are launched while they are generated with %s" \
+% STREAM_ARG
+NO_URI_FILE_VARIABLE_NAME = "no_uri_file"
+
+SINGLE_PASS_LOG_START = "Starting single pass analysis for {} and {} files"
+SINGLE_PASS_LOG_END = "Files {}, {} and {} generated"
+STREAM_LOG_FILE = "URIs are launched from the .uri file after generating it, %s and %s need it" \
+% (launcher.RESUME_ARG, launcher.PROCESSES_ARG)
+SINGLE_PASS_CACHE_ERROR = "Single pass analysis reads the access log, where URIs with cached verdict are not, \
+so it can not be used with verdict cache"
+
 
 # =====================================
 # Functions
@@ -58,6 +159,14 @@ def init_parser():
     generator.add_optional_arguments(parser)
     launcher.add_optional_arguments(parser)
     analyzer.add_optional_arguments(parser, True)
+    parser.add_argument(SINGLE_PASS_ARG, help=SINGLE_PASS_HELP, dest=SINGLE_PASS_VARIABLE_NAME, \
+        action='store_true')
+    parser.add_argument(STREAM_ARG, help=STREAM_HELP, dest=STREAM_VARIABLE_NAME, action='store_true')
+    parser.add_argument(NO_URI_FILE_ARG, help=NO_URI_FILE_HELP, dest=NO_URI_FILE_VARIABLE_NAME, action='store_true')
+    columnar.add_optional_arguments(parser)
+    verdict_cache.add_optional_arguments(parser)
+    logfiles.add_optional_arguments(parser)
+    progress.add_optional_arguments(parser)
 
     generator.add_required_arguments(required_arguments)
     launcher.add_required_arguments(required_arguments)
@@ -65,26 +174,151 @@ def init_parser():
 
     return parser
 
+def single_pass_analysis(access_log_arg, error_log_arg, file_identifier, results_file_name=None):
+    """Creates .clean, .index and .attacks files reading once the error log and once the access log.
+
+    Rule IDs of the error log are grouped by request ID first, then every access log line is
+    written completed to .clean or to .index and .attacks files, being its line number the
+    packet number, numbered again after the run marker of every resumed launch while the access
+    log is read, so it is not searched for run markers before. If results file written by
+    launcher is indicated, the packet number is the line of the URI in the launched file
+    recovered by request ID, so it does not depend on the order of the access log. Lines of
+    .attacks file are kept in a temporary file until the header can be written
+
+    :param access_log_arg: access log retrieved from command line
+    :type access_log_arg: string
+    :param error_log_arg: error log retrieved from command line
+    :type error_log_arg: string
+    :param file_identifier: numeric value added to identify generated files
+    :type file_identifier: int
+    :param results_file_name: results file written by launcher, None to number the access log lines
+    :type results_file_name: string
+
+    :return: statistics of the run, also written in a JSON file next to the generated files
+    :rtype: analyzer.RunStatistics
+    """
+    log.info(SINGLE_PASS_LOG_START.format(access_log_arg, error_log_arg))
+    index_file_name = comparer.ANALYSIS_FILE_NAME.format(file_identifier, comparer.INDEX_EXT)
+    clean_file_name = comparer.ANALYSIS_FILE_NAME.format(file_identifier, comparer.CLEAN_EXT)
+    attacks_file_name = comparer.ANALYSIS_FILE_NAME.format(file_identifier, comparer.ATTACKS_EXT)
+    statistics_file_name = comparer.ANALYSIS_FILE_NAME.format(file_identifier, comparer.STATISTICS_EXT)
+    statistics = analyzer.RunStatistics()
+    with statistics.stage(single_pass_analysis.__name__):
+        line_numbers = comparer.get_line_numbers_by_request_id(results_file_name) \
+            if results_file_name is not None else None
+        write_single_pass_files(access_log_arg, error_log_arg, index_file_name, clean_file_name, \
+            attacks_file_name, statistics, line_numbers)
+    statistics.save(statistics_file_name)
+
+    log.info(SINGLE_PASS_LOG_END.format(index_file_name, clean_file_name, attacks_file_name))
+    return statistics
+
+def write_single_pass_files(access_log_arg, error_log_arg, index_file_name, clean_file_name, attacks_file_name, \
+    statistics, line_numbers=None):
+    """Writes .clean, .index and .attacks files of the single pass analysis
+
+    :param access_log_arg: access log retrieved from command line
+    :type access_log_arg: string
+    :param error_log_arg: error log retrieved from command line
+    :type error_log_arg: string
+    :param index_file_name: name of .index file
+    :type index_file_name: string
+    :param clean_file_name: name of .clean file
+    :type clean_file_name: string
+    :param attacks_file_name: name of .attacks file
+    :type attacks_file_name: string
+    :param statistics: statistics where lines and bytes read are counted
+    :type statistics: analyzer.RunStatistics
+    :param line_numbers: line of the launched file by request ID, used as packet number if indicated
+    :type line_numbers: dict
+    """
+    rule_ids_by_request_id = analyzer.get_rule_ids_by_request_id(error_log_arg, statistics)
+    access_log_cp = analyzer.get_access_log_compiled_pattern()
+    read_lines = progress.Progress(analyzer.READING_FILE.format(access_log_arg), total=logfiles.get_size(access_log_arg))
+    position = 0
+
+    clean_file = open(clean_file_name, 'w')
+    index_file = open(index_file_name, 'w')
+    attacks_lines = tempfile.TemporaryFile('w+')
+    with logfiles.open_log(access_log_arg) as log_file:
+        for packet, line in analyzer.number_access_log_lines(log_file):
+            statistics.input_lines += 1
+            statistics.bytes_read += len(line)
+            position += len(line)
+            read_lines.update(statistics.input_lines, position)
+            result = access_log_cp.search(line)
+            if result is not None:
+                decoded_uri = parse.unquote(result.group('uri'))
+                if result.group('http_status') == analyzer.HTTP_BLOCKED_STATUS:
+                    timestamp = result.group('timestamp')
+                    request_id = result.group('id')
+                    index_line = analyzer.INDEX_FILE_LINE.format(timestamp, decoded_uri, request_id, result.group('bt'))
+                    rule_ids = rule_ids_by_request_id.pop(request_id, [])
+                    index_line = analyzer.add_string_from_index(index_line, len(index_line) - 1, \
+                        analyzer.get_nattacks_string(rule_ids))
+                    index_file.write(index_line)
+                    if line_numbers is not None:
+                        packet = line_numbers.get(request_id, packet)
+                    attacks_lines.write(comparer.PACKET_DATA.format(packet) + \
+                        index_line[len(timestamp) + 1:])
+                    statistics.attack_lines += 1
+                else:
+                    clean_file.write(analyzer.CLEAN_FILE_LINE.format(decoded_uri))
+                    statistics.clean_lines += 1
+    clean_file.close()
+    index_file.close()
+    read_lines.done(statistics.input_lines)
+    log.info(analyzer.ANALYZED_URIS.format(statistics.attack_lines, statistics.clean_lines))
+
+    with open(attacks_file_name, 'w') as attacks_file:
+        attacks_file.write(comparer.get_attacks_header(statistics))
+        attacks_lines.seek(0)
+        shutil.copyfileobj(attacks_lines, attacks_file)
+    attacks_lines.close()
+
 def main(args):
     """Main function.
 
     First check for log files existence and then uses main from 
-    previous script in order to launch sequentially
+    previous script in order to launch sequentially. If stream is indicated, the URIs are
+    launched while they are generated, writing .uri file in a separate thread unless no URI
+    file is indicated. If single pass is
+    indicated, analyzer and comparer are replaced by a single streaming pass. If columnar file is
+    indicated, .index and .attacks files are converted to it at the end
 
-    :raises PwnlibException: if file does not exists
+    :raises LogError: if file does not exists or single pass is indicated with verdict cache
     """
     analyzer.check_files(args.access_log, args.error_log)
-    generator.main(args)
-    print()
-    launcher.main(args)
-    print()
-    analyzer.main(args)
+    if args.single_pass and getattr(args, verdict_cache.CACHE_VARIABLE_NAME, None) is not None:
+        log.error(SINGLE_PASS_CACHE_ERROR)
+    stream = args.stream and not args.resume and args.processes is None
+    if args.stream and not stream:
+        log.info(STREAM_LOG_FILE)
+    if stream:
+        output_file_name = None if args.no_uri_file else generator.output_file_def(args.input, args.output)
+        launcher.main(args, generator.generate_uris(args.input, output_file_name))
+    else:
+        generator.main(args)
+        print()
+        launcher.main(args)
     print()
-    comparer.main(args)
+    if args.single_pass:
+        single_pass_analysis(args.access_log, args.error_log, args.id, args.results)
+    else:
+        statistics = analyzer.main(args)
+        print()
+        comparer.main(args, statistics)
+    if args.columnar:
+        print()
+        columnar.write_columnar_file(comparer.ANALYSIS_FILE_NAME.format(args.id, columnar.COLUMNAR_EXT), \
+            comparer.ANALYSIS_FILE_NAME.format(args.id, comparer.INDEX_EXT), \
+            comparer.ANALYSIS_FILE_NAME.format(args.id, comparer.ATTACKS_EXT))
 
 # =====================================
 # Main
 # =====================================
 if __name__ == "__main__":
     args = init_parser().parse_args()
+    logfiles.set_decompression_thread(args.decompression_thread)
+    progress.set_batch_mode(args.batch)
     main(args)
\ No newline at end of file
@@ -0,0 +1,376 @@
+"""Script that computes the statistics of the rule IDs of analysis runs of one or many datasets
+with NumPy: detection rate by dataset, histograms of rule IDs, block types and number of attacks
+of every request, co-occurrence of rule IDs in the same request and blocks per second, written
+in CSV or JSON files.
+
+Usage: stats.py [-h] [-ds dataset] [-o output] [-f format] [-b] -i paths
+                [paths ...]
+
+optional arguments:
+  -h, --help            show this help message and exit
+  -ds dataset           Dataset of the runs. By default the dataset of a run
+                        is the first folder below the indicated one (e.g. rdb
+                        for analyzed-databases)
+  -o output             Prefix of the output files, 'output'-'table'.csv for
+                        every table or 'output'.json with all of them. By
+                        default: stats
+  -f format             Format of the output files, csv or json. By default:
+                        csv
+  -b                    Batch mode, progress of the analysis is not shown. It
+                        is not shown either when the output is not a terminal
+
+required arguments:
+  -i paths [paths ...]  Analysis files or folders searched recursively for
+                        analysis-'id'.attacks, .index, .clean and .columns
+                        files. Attacks of a run are read from its .columns
+                        file if it exists
+
+Author: Carlos Cagigao Bravo
+"""
+
+import argparse
+import array
+import csv
+import json
+from logger import log
+import time
+import columnar
+import comparer
+import progress
+import store
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# =====================================
+# Constant variables
+# =====================================
+DESCRIPTION = "Script that computes the statistics of the rule IDs of analysis runs of one or many datasets with \
+NumPy: detection rate by dataset, histograms of rule IDs, block types and number of attacks of every request, \
+co-occurrence of rule IDs in the same request and blocks per second, written in CSV or JSON files"
+REQUIRED_ARGS = "required arguments"
+
+INPUT_ARG = "-i"
+INPUT_HELP = "Analysis files or folders searched recursively for analysis-'id'.attacks, .index, .clean and \
+.columns files. Attacks of a run are read from its .columns file if it exists"
+INPUT_VARIABLE_NAME = "paths"
+
+DATASET_ARG = "-ds"
+DATASET_HELP = "Dataset of the runs. By default the dataset of a run is the first folder below the indicated one \
+(e.g. rdb for analyzed-databases)"
+DATASET_VARIABLE_NAME = "dataset"
+
+OUTPUT_ARG = "-o"
+OUTPUT_DEFAULT = "stats"
+OUTPUT_HELP = "Prefix of the output files, 'output'-'table'.csv for every table or 'output'.json with all of \
+them. By default: %s" % OUTPUT_DEFAULT
+OUTPUT_VARIABLE_NAME = "output"
+
+FORMAT_ARG = "-f"
+FORMAT_CSV = "csv"
+FORMAT_JSON = "json"
+FORMAT_HELP = "Format of the output files, %s or %s. By default: %s" % (FORMAT_CSV, FORMAT_JSON, FORMAT_CSV)
+FORMAT_VARIABLE_NAME = "format"
+
+LOG_INFO_MAIN = "Computing statistics of the analysis runs in {}"
+LOG_INFO_RUNS = "Found {} analysis runs of {} datasets"
+LOG_INFO_DATASET = "Dataset {}: {} runs, [{}] input, [{}] clean, [{}] attacks, detection rate {:.2%}"
+LOG_INFO_WRITTEN = "File {} written: {} rows"
+LOG_INFO_END = "Statistics computed in {:.2f} s"
+LOADING_RUNS = "Loading runs"
+RUNS_UNIT = "runs"
+NUMPY_NOT_INSTALLED_ERROR = "numpy package is needed to compute statistics, install it with: pip install -r requirements/optional"
+NO_RUNS_ERROR = "No analysis runs found in %s"
+
+DETECTION = "detection"
+RULES = "rules"
+BLOCK_TYPES = "block_types"
+NATTACKS = "nattacks"
+COOCCURRENCE = "cooccurrence"
+BLOCKS_PER_SECOND = "blocks_per_second"
+OUTPUT_FILE = "{}-{}.{}"
+JSON_FILE = "{}.{}"
+ISO_8859_1 = "ISO-8859-1"
+TIME_UNKNOWN = columnar.TIMESTAMP_UNKNOWN
+RULE_ID_MASK = 0xFFFFFFFF
+BINCOUNT_MAX = 1 << 24
+
+# =====================================
+# Functions
+# =====================================
+def init_parser():
+    """Retrieves the parameters with which it has been executed
+
+    :rtype: ArgumentParser
+    :return: arguments prepared to be parsed
+    """
+    parser = argparse.ArgumentParser(description=DESCRIPTION)
+    required_arguments = parser.add_argument_group(REQUIRED_ARGS)
+    parser.add_argument(DATASET_ARG, help=DATASET_HELP, metavar=DATASET_VARIABLE_NAME, dest=DATASET_VARIABLE_NAME)
+    parser.add_argument(OUTPUT_ARG, help=OUTPUT_HELP, default=OUTPUT_DEFAULT, metavar=OUTPUT_VARIABLE_NAME, \
+        dest=OUTPUT_VARIABLE_NAME)
+    parser.add_argument(FORMAT_ARG, help=FORMAT_HELP, default=FORMAT_CSV, metavar=FORMAT_VARIABLE_NAME, \
+        dest=FORMAT_VARIABLE_NAME, choices=[FORMAT_CSV, FORMAT_JSON])
+    progress.add_optional_arguments(parser)
+    required_arguments.add_argument(INPUT_ARG, help=INPUT_HELP, metavar=INPUT_VARIABLE_NAME, \
+        dest=INPUT_VARIABLE_NAME, nargs='+', required=True)
+    return parser
+
+def check_numpy():
+    """Checks that numpy package is installed before reading any run
+
+    :raises LogError: if it is not installed
+    """
+    if numpy is None:
+        log.error(NUMPY_NOT_INSTALLED_ERROR)
+
+def read_text_run(attacks_file_name, index_file_name):
+    """Reads the attacks of a run from its .attacks and .index files. Timestamps are parsed once
+    for every different second
+
+    :param attacks_file_name: .attacks file or None
+    :type attacks_file_name: string
+    :param index_file_name: .index file or None
+    :type index_file_name: string
+
+    :return: block types, number of rule IDs of every attack, rule IDs and seconds since epoch
+        (TIME_UNKNOWN without .index file)
+    :rtype: tuple
+    """
+    block_types, rule_counts, rule_ids, seconds = array.array('B'), array.array('I'), array.array('I'), \
+        array.array('q')
+    seconds_by_timestamp = dict()
+    for _, timestamp, _, _, block_type, row_rule_ids in store.read_attack_rows(attacks_file_name, index_file_name):
+        block_types.append(block_type)
+        rule_counts.append(len(row_rule_ids))
+        rule_ids.extend(int(rule_id) for rule_id in row_rule_ids)
+        second = seconds_by_timestamp.get(timestamp)
+        if second is None:
+            seconds_offset = columnar.parse_timestamp(timestamp) if timestamp is not None else None
+            second = seconds_by_timestamp[timestamp] = seconds_offset[0] if seconds_offset else TIME_UNKNOWN
+        seconds.append(second)
+    return numpy.frombuffer(block_types, numpy.uint8), numpy.frombuffer(rule_counts, numpy.uint32), \
+        numpy.frombuffer(rule_ids, numpy.uint32), numpy.frombuffer(seconds, numpy.int64)
+
+def read_columnar_run(columnar_file_name):
+    """Reads the attacks of a run from its columnar file, copying its columns to arrays
+
+    :param columnar_file_name: .columns file
+    :type columnar_file_name: string
+
+    :return: header of .attacks file (None if it was not converted), block types, number of rule
+        IDs of every attack, rule IDs and seconds since epoch
+    :rtype: tuple
+    """
+    with columnar.ColumnarFile(columnar_file_name) as columnar_file:
+        header = (columnar_file.input_lines, columnar_file.clean_lines, columnar_file.attack_lines) \
+            if columnar_file.has_attacks() else None
+        return header, numpy.array(columnar_file.block_types, numpy.uint8), \
+            numpy.diff(numpy.array(columnar_file.rule_offsets, numpy.int64)).astype(numpy.uint32), \
+            numpy.array(columnar_file.rule_ids, numpy.uint32), numpy.array(columnar_file.timestamps, numpy.int64)
+
+def read_run(files):
+    """Reads the lines and attacks of a run. Input and clean lines come from the header of
+    .attacks file, clean lines are counted in .clean file without it
+
+    :param files: analysis files of the run by extension
+    :type files: dict
+
+    :return: input lines, clean lines, block types, number of rule IDs of every attack, rule IDs
+        and seconds since epoch
+    :rtype: tuple
+    """
+    header = None
+    if columnar.COLUMNAR_EXT in files:
+        header, *attacks = read_columnar_run(files[columnar.COLUMNAR_EXT])
+    else:
+        attacks_file_name = files.get(comparer.ATTACKS_EXT)
+        if attacks_file_name is not None:
+            with open(attacks_file_name, encoding=ISO_8859_1, errors='ignore') as attacks_file:
+                header = store.read_attacks_header(attacks_file)
+        attacks = read_text_run(attacks_file_name, files.get(comparer.INDEX_EXT))
+    if header is not None:
+        input_lines, clean_lines, _ = header
+    else:
+        clean_lines = comparer.count_lines(files[comparer.CLEAN_EXT]) if comparer.CLEAN_EXT in files else 0
+        input_lines = clean_lines + len(attacks[0])
+    return (input_lines, clean_lines) + tuple(attacks)
+
+def get_unique_rule_ids(rule_counts, rule_ids):
+    """Removes the rule IDs repeated in the same attack. Only the attacks with more than one rule
+    ID are sorted by attack and rule ID, the rest are kept as they are
+
+    :param rule_counts: number of rule IDs of every attack
+    :type rule_counts: numpy.ndarray
+    :param rule_ids: rule IDs of every attack one after another
+    :type rule_ids: numpy.ndarray
+
+    :return: rule IDs of the attacks with a single one, attack number and rule ID of the sorted
+        rule IDs of the attacks with more than one
+    :rtype: tuple
+    """
+    multiple = numpy.repeat(rule_counts > 1, rule_counts)
+    attacks = numpy.repeat(numpy.arange(len(rule_counts), dtype=numpy.int64), rule_counts)[multiple]
+    keys = numpy.unique(attacks << 32 | rule_ids[multiple].astype(numpy.int64))
+    return rule_ids[~multiple], keys >> 32, keys & RULE_ID_MASK
+
+def get_rule_histogram(single_rule_ids, multiple_rule_ids):
+    """Counts the attacks detected by every rule ID, with a bincount when rule IDs are small enough
+
+    :param single_rule_ids: rule IDs of the attacks with a single one
+    :type single_rule_ids: numpy.ndarray
+    :param multiple_rule_ids: unique rule IDs of the attacks with more than one
+    :type multiple_rule_ids: numpy.ndarray
+
+    :return: rule IDs in increasing order and their attacks
+    :rtype: tuple
+    """
+    rule_ids = numpy.concatenate((single_rule_ids.astype(numpy.int64), multiple_rule_ids))
+    if len(rule_ids) == 0 or rule_ids.max() >= BINCOUNT_MAX:
+        return numpy.unique(rule_ids, return_counts=True)
+    counts = numpy.bincount(rule_ids)
+    found_rule_ids = numpy.flatnonzero(counts)
+    return found_rule_ids, counts[found_rule_ids]
+
+def get_cooccurrence(attacks, rule_ids):
+    """Counts the attacks detected by every pair of rule IDs. Attacks with the same number of rule
+    IDs are stacked in a matrix whose column pairs give all the pairs of them at once
+
+    :param attacks: attack number of every rule ID, in increasing order
+    :type attacks: numpy.ndarray
+    :param rule_ids: unique rule IDs of every attack in increasing order
+    :type rule_ids: numpy.ndarray
+
+    :return: first rule ID, second rule ID (greater than the first one) and attacks of every pair
+    :rtype: tuple
+    """
+    attack_starts = numpy.flatnonzero(numpy.concatenate(([True], attacks[1:] != attacks[:-1]))) \
+        if len(attacks) else numpy.empty(0, numpy.int64)
+    counts = numpy.diff(numpy.append(attack_starts, len(attacks)))
+    pairs = [numpy.empty(0, numpy.int64)]
+    for count in numpy.unique(counts[counts > 1]):
+        attack_rule_ids = rule_ids[attack_starts[counts == count][:, None] + numpy.arange(count)]
+        first, second = numpy.triu_indices(count, 1)
+        pairs.append((attack_rule_ids[:, first] << 32 | attack_rule_ids[:, second]).ravel())
+    pairs, pair_counts = numpy.unique(numpy.concatenate(pairs), return_counts=True)
+    return pairs >> 32, pairs & RULE_ID_MASK, pair_counts
+
+def get_blocks_per_second(seconds):
+    """Counts the attacks blocked every second of a run, from the first one to the last one
+
+    :param seconds: seconds since epoch of every attack, TIME_UNKNOWN if it is not known
+    :type seconds: numpy.ndarray
+
+    :return: every second and its blocks, empty if no second is known
+    :rtype: tuple
+    """
+    seconds = seconds[seconds != TIME_UNKNOWN]
+    if len(seconds) == 0:
+        return numpy.empty(0, numpy.int64), numpy.empty(0, numpy.int64)
+    first = seconds.min()
+    blocks = numpy.bincount(seconds - first)
+    return first + numpy.arange(len(blocks)), blocks
+
+def get_statistics(runs):
+    """Reads every run and computes the statistics tables grouping the runs by dataset
+
+    :param runs: runs by (dataset, folder below the dataset, run ID), with the files by extension
+    :type runs: dict
+
+    :return: rows of every table by its name
+    :rtype: dict
+    """
+    tables = {name: list() for name in (DETECTION, RULES, BLOCK_TYPES, NATTACKS, COOCCURRENCE, BLOCKS_PER_SECOND)}
+    datasets = dict()
+    loaded_runs = progress.Progress(LOADING_RUNS, RUNS_UNIT, len(runs))
+    for number, run in enumerate(sorted(runs), 1):
+        dataset, folder, run_id = run
+        input_lines, clean_lines, block_types, rule_counts, rule_ids, seconds = read_run(runs[run])
+        datasets.setdefault(dataset, list()).append((input_lines, clean_lines, block_types, rule_counts, rule_ids))
+        for second, blocks in zip(*get_blocks_per_second(seconds)):
+            tables[BLOCKS_PER_SECOND].append({"dataset": dataset, "folder": folder, "run": run_id, \
+                "second": int(second), "time": str(numpy.datetime64(int(second), 's')), "blocks": int(blocks)})
+        loaded_runs.update(number, detail=run_id)
+    loaded_runs.done(len(runs))
+
+    for dataset, dataset_runs in sorted(datasets.items()):
+        input_lines = sum(run[0] for run in dataset_runs)
+        clean_lines = sum(run[1] for run in dataset_runs)
+        block_types = numpy.concatenate([run[2] for run in dataset_runs])
+        rule_counts = numpy.concatenate([run[3] for run in dataset_runs])
+        rule_ids = numpy.concatenate([run[4] for run in dataset_runs])
+        attack_lines = len(block_types)
+        detection_rate = attack_lines / input_lines if input_lines else 0.0
+        log.info(LOG_INFO_DATASET.format(dataset, len(dataset_runs), input_lines, clean_lines, attack_lines, \
+            detection_rate))
+        tables[DETECTION].append({"dataset": dataset, "runs": len(dataset_runs), "input": input_lines, \
+            "clean": clean_lines, "attacks": attack_lines, "detection_rate": detection_rate})
+        single_rule_ids, multiple_attacks, multiple_rule_ids = get_unique_rule_ids(rule_counts, rule_ids)
+        for rule_id, attacks in zip(*get_rule_histogram(single_rule_ids, multiple_rule_ids)):
+            tables[RULES].append({"dataset": dataset, "rule_id": int(rule_id), "attacks": int(attacks), \
+                "share": int(attacks) / attack_lines})
+        for block_type, attacks in enumerate(numpy.bincount(block_types)):
+            if attacks:
+                tables[BLOCK_TYPES].append({"dataset": dataset, "block_type": block_type, "attacks": int(attacks)})
+        for nattacks, attacks in enumerate(numpy.bincount(rule_counts)):
+            if attacks:
+                tables[NATTACKS].append({"dataset": dataset, "nattacks": nattacks, "attacks": int(attacks)})
+        for first, second, attacks in zip(*get_cooccurrence(multiple_attacks, multiple_rule_ids)):
+            tables[COOCCURRENCE].append({"dataset": dataset, "rule_id": int(first), "other_rule_id": int(second), \
+                "attacks": int(attacks)})
+    return tables
+
+def write_tables(tables, output, output_format):
+    """Writes every table in its own CSV file, or all of them in a JSON file
+
+    :param tables: rows of every table by its name
+    :type tables: dict
+    :param output: prefix of the output files
+    :type output: string
+    :param output_format: FORMAT_CSV or FORMAT_JSON
+    :type output_format: string
+    """
+    if output_format == FORMAT_JSON:
+        file_name = JSON_FILE.format(output, FORMAT_JSON)
+        with open(file_name, 'w') as json_file:
+            json.dump(tables, json_file, indent=2)
+        log.info(LOG_INFO_WRITTEN.format(file_name, sum(len(rows) for rows in tables.values())))
+        return
+    for name, rows in tables.items():
+        file_name = OUTPUT_FILE.format(output, name, FORMAT_CSV)
+        with open(file_name, 'w', newline='') as csv_file:
+            if rows:
+                writer = csv.DictWriter(csv_file, fieldnames=list(rows[0]))
+                writer.writeheader()
+                writer.writerows(rows)
+        log.info(LOG_INFO_WRITTEN.format(file_name, len(rows)))
+
+def main(args):
+    """Main function.
+
+    Finds the runs of the indicated files and folders, loads the rule IDs, block types and
+    timestamps of their attacks in arrays and writes the statistics of every dataset
+
+    :param args: command-line retrieved arguments
+    :type args: ArgumentParser.parse_args()
+
+    :raises LogError: if numpy is not installed, a path does not exist or there are no runs
+    """
+    check_numpy()
+    start_time = time.perf_counter()
+    log.info(LOG_INFO_MAIN.format(", ".join(args.paths)))
+    runs = store.find_runs(args.paths, args.dataset)
+    if not runs:
+        log.error(NO_RUNS_ERROR % ", ".join(args.paths))
+    log.info(LOG_INFO_RUNS.format(len(runs), len({run[0] for run in runs})))
+    write_tables(get_statistics(runs), args.output, args.format)
+    log.info(LOG_INFO_END.format(time.perf_counter() - start_time))
+
+# =====================================
+# Main
+# =====================================
+if __name__ == "__main__":
+    args = init_parser().parse_args()
+    progress.set_batch_mode(args.batch)
+    main(args)
@@ -0,0 +1,596 @@
+"""Script that loads the rows of .attacks, .index and .clean files of analysis runs in a
+SQLite database, so runs of every dataset can be queried together by rule ID or URI.
+
+Usage: store.py [-h] [-db database] [-i paths [paths ...]] [-ds dataset] [-rp]
+                [-qr rule_id] [-qu uri] [-b]
+
+optional arguments:
+  -h, --help            show this help message and exit
+  -db database          SQLite database where the rows are loaded. By default:
+                        analysis.db
+  -i paths [paths ...]  Analysis files or folders searched recursively for
+                        analysis-'id'.attacks, .index, .clean and .columns
+                        files. Runs already loaded are skipped, so new runs
+                        can be appended as they finish
+  -ds dataset           Dataset of the loaded runs, or of the queried rows. By
+                        default the dataset of a run is the first folder below
+                        the indicated one (e.g. rdb for analyzed-databases)
+  -rp                   Loads again the runs already loaded, replacing their
+                        rows
+  -qr rule_id           Shows the attacks detected by a rule ID in every run
+  -qu uri               Shows the verdict of a decoded URI in every run
+  -b                    Batch mode, progress of the analysis is not shown. It
+                        is not shown either when the output is not a terminal
+
+Author: Carlos Cagigao Bravo
+"""
+
+import argparse
+import array
+import hashlib
+from logger import log
+import os
+import os.path as path
+import re
+import sqlite3
+import time
+import columnar
+import comparer
+import progress
+import verdict_cache
+
+# =====================================
+# Constant variables
+# =====================================
+DESCRIPTION = "Script that loads the rows of .attacks, .index and .clean files of analysis runs in a SQLite \
+database, so runs of every dataset can be queried together by rule ID or URI"
+
+DATABASE_ARG = "-db"
+DATABASE_DEFAULT = "analysis.db"
+DATABASE_HELP = "SQLite database where the rows are loaded. By default: %s" % DATABASE_DEFAULT
+DATABASE_VARIABLE_NAME = "database"
+
+INGEST_ARG = "-i"
+INGEST_HELP = "Analysis files or folders searched recursively for analysis-'id'.attacks, .index, .clean and \
+.columns files. Runs already loaded are skipped, so new runs can be appended as they finish"
+INGEST_VARIABLE_NAME = "paths"
+
+DATASET_ARG = "-ds"
+DATASET_HELP = "Dataset of the loaded runs, or of the queried rows. By default the dataset of a run is the first \
+folder below the indicated one (e.g. rdb for analyzed-databases)"
+DATASET_VARIABLE_NAME = "dataset"
+
+REPLACE_ARG = "-rp"
+REPLACE_HELP = "Loads again the runs already loaded, replacing their rows"
+REPLACE_VARIABLE_NAME = "replace"
+
+RULE_ARG = "-qr"
+RULE_HELP = "Shows the attacks detected by a rule ID in every run"
+RULE_VARIABLE_NAME = "rule_id"
+
+URI_ARG = "-qu"
+URI_HELP = "Shows the verdict of a decoded URI in every run"
+URI_VARIABLE_NAME = "uri"
+
+LOG_INFO_MAIN = "Loading analysis runs in {}"
+LOG_INFO_RUNS = "Found {} analysis runs"
+LOG_INFO_INDEXES = "Creating indexes of {}"
+LOG_INFO_SKIPPED = "Run {} of dataset {} in {} already loaded"
+LOG_INFO_LOADED = "Loaded run {} of dataset {}: {} attacks and {} clean rows in {:.2f} s"
+LOG_INFO_CLEAN_PACKETS = "Lines of run {} do not add up to its input, packets of clean rows are not known"
+LOG_INFO_QUERY = "{} rows found in {:.1f} ms"
+LOG_INFO_END = "Database {} updated"
+LOADING_ROWS = "Loading {}"
+PATH_NOT_EXISTS_ERROR = "Path %s does not exist"
+DATABASE_NOT_EXISTS_ERROR = "Database %s does not exist"
+NOTHING_TO_DO_ERROR = "Indicate the files to load with %s or a query with %s or %s" % (INGEST_ARG, RULE_ARG, URI_ARG)
+
+ANALYSIS_FILE_CP = re.compile(r'^analysis-(?P<id>.+)\.(?P<extension>attacks|index|clean|columns)$')
+ATTACKS_HEADER_CP = re.compile(r'^\[(?P<input>\d+)\] input, \[(?P<clean>\d+)\] clean, \[(?P<attacks>\d+)\] attacks$')
+ATTACKS_LINE_CP = re.compile(
+    r'^Packet \[(?P<packet>\d+)\]\t'
+    r'Uri \[(?P<uri>.*)\]\t'
+    r'RequestID \[(?P<id>[a-zA-Z0-9]+)\]\t'
+    r'BT \[(?P<bt>\d)\]\t'
+    r'Nattacks \[(?P<nattacks>\d+)\]'
+)
+INDEX_LINE_CP = re.compile(
+    r'^(?P<timestamp>\[\d{2}\/\w{3}\/\d{4}:\d{2}:\d{2}:\d{2} [+-]\d{4}\])\t'
+    r'Uri \[(?P<uri>.*)\]\t'
+    r'RequestID \[(?P<id>[a-zA-Z0-9]+)\]\t'
+    r'BT \[(?P<bt>\d)\]\t'
+    r'Nattacks \[(?P<nattacks>\d+)\]'
+)
+RULE_ID_CP = re.compile(r'\[(\d+)\]')
+HEADER_LINES = 3
+ANALYSIS_FILE = "analysis-{}.{}"
+ISO_8859_1 = "ISO-8859-1"
+URI_HASH_SIZE = 8
+BATCH_SIZE = 50000
+QUERY_ROW = "\t".join(["{}"] * 8)
+QUERY_HEADER = QUERY_ROW.format("dataset", "folder", "run", "packet", "timestamp", "block_type", "rule_ids", "uri")
+
+SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS runs (run_key INTEGER PRIMARY KEY, dataset TEXT NOT NULL, folder TEXT NOT NULL, \
+run_id TEXT NOT NULL, input_lines INTEGER, clean_lines INTEGER, attack_lines INTEGER, loaded_at REAL NOT NULL, \
+UNIQUE (dataset, folder, run_id))",
+    "CREATE TABLE IF NOT EXISTS requests (request_key INTEGER PRIMARY KEY, run_key INTEGER NOT NULL, \
+packet INTEGER, timestamp TEXT, uri TEXT NOT NULL, uri_hash INTEGER NOT NULL, request_id TEXT, block_type INTEGER, \
+attack INTEGER NOT NULL, rule_ids TEXT NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS request_rules (request_key INTEGER NOT NULL, rule_id INTEGER NOT NULL, \
+position INTEGER NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS runs_dataset ON runs (dataset)",
+    "CREATE INDEX IF NOT EXISTS runs_run_id ON runs (run_id)"
+]
+ROW_INDEXES = [
+    "CREATE INDEX IF NOT EXISTS requests_run ON requests (run_key, packet)",
+    "CREATE INDEX IF NOT EXISTS requests_uri_hash ON requests (uri_hash)",
+    "CREATE INDEX IF NOT EXISTS request_rules_rule_id ON request_rules (rule_id, request_key)"
+]
+PRAGMAS = ["PRAGMA journal_mode=WAL", "PRAGMA synchronous=NORMAL", "PRAGMA cache_size=-65536"]
+SELECT_ANY_REQUEST = "SELECT 1 FROM requests LIMIT 1"
+SELECT_RUN = "SELECT run_key FROM runs WHERE dataset = ? AND folder = ? AND run_id = ?"
+SELECT_LAST_REQUEST_KEY = "SELECT coalesce(max(request_key), 0) FROM requests"
+DELETE_RUN_RULES = "DELETE FROM request_rules WHERE request_key IN (SELECT request_key FROM requests WHERE run_key = ?)"
+DELETE_RUN_REQUESTS = "DELETE FROM requests WHERE run_key = ?"
+DELETE_RUN = "DELETE FROM runs WHERE run_key = ?"
+INSERT_RUN = "INSERT INTO runs (dataset, folder, run_id, input_lines, clean_lines, attack_lines, loaded_at) \
+VALUES (?, ?, ?, ?, ?, ?, ?)"
+INSERT_REQUEST = "INSERT INTO requests (request_key, run_key, packet, timestamp, uri, uri_hash, request_id, \
+block_type, attack, rule_ids) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+INSERT_REQUEST_RULE = "INSERT INTO request_rules (request_key, rule_id, position) VALUES (?, ?, ?)"
+SELECT_BY_RULE = "SELECT runs.dataset, runs.folder, runs.run_id, requests.packet, requests.timestamp, \
+requests.block_type, requests.rule_ids, requests.uri FROM request_rules \
+JOIN requests ON requests.request_key = request_rules.request_key JOIN runs ON runs.run_key = requests.run_key \
+WHERE request_rules.rule_id = ?"
+SELECT_BY_URI = "SELECT runs.dataset, runs.folder, runs.run_id, requests.packet, requests.timestamp, \
+requests.block_type, requests.rule_ids, requests.uri FROM requests JOIN runs ON runs.run_key = requests.run_key \
+WHERE requests.uri_hash = ? AND requests.uri = ?"
+DATASET_CONDITION = " AND runs.dataset = ?"
+ORDER_BY_RUN = " ORDER BY runs.dataset, runs.folder, runs.run_id, requests.packet"
+
+# =====================================
+# Functions
+# =====================================
+def init_parser():
+    """Retrieves the parameters with which it has been executed
+
+    :rtype: ArgumentParser
+    :return: arguments prepared to be parsed
+    """
+    parser = argparse.ArgumentParser(description=DESCRIPTION)
+    add_optional_arguments(parser)
+    progress.add_optional_arguments(parser)
+    return parser
+
+def add_optional_arguments(parser):
+    """Add optional arguments to parser
+
+    :param parser: parser to add arguments
+    :type parser: ArgumentParser
+    """
+    parser.add_argument(DATABASE_ARG, help=DATABASE_HELP, default=DATABASE_DEFAULT, metavar=DATABASE_VARIABLE_NAME, \
+        dest=DATABASE_VARIABLE_NAME)
+    parser.add_argument(INGEST_ARG, help=INGEST_HELP, metavar=INGEST_VARIABLE_NAME, dest=INGEST_VARIABLE_NAME, \
+        nargs='+')
+    parser.add_argument(DATASET_ARG, help=DATASET_HELP, metavar=DATASET_VARIABLE_NAME, dest=DATASET_VARIABLE_NAME)
+    parser.add_argument(REPLACE_ARG, help=REPLACE_HELP, dest=REPLACE_VARIABLE_NAME, action='store_true')
+    parser.add_argument(RULE_ARG, help=RULE_HELP, metavar=RULE_VARIABLE_NAME, dest=RULE_VARIABLE_NAME, type=int)
+    parser.add_argument(URI_ARG, help=URI_HELP, metavar=URI_VARIABLE_NAME, dest=URI_VARIABLE_NAME)
+
+def open_database(database_name):
+    """Opens the database creating its tables and the indexes of the runs if they do not exist
+
+    :param database_name: SQLite file
+    :type database_name: string
+
+    :return: connection
+    :rtype: sqlite3.Connection
+    """
+    connection = sqlite3.connect(database_name)
+    for statement in PRAGMAS + SCHEMA:
+        connection.execute(statement)
+    connection.commit()
+    return connection
+
+def create_row_indexes(connection):
+    """Creates the indexes of the requests and their rule IDs if they do not exist
+
+    :param connection: open database
+    :type connection: sqlite3.Connection
+    """
+    with connection:
+        for statement in ROW_INDEXES:
+            connection.execute(statement)
+
+def get_uri_hash(uri):
+    """Gets a hash of the URI that does not change between processes, used to look up URIs
+    without indexing the whole text
+
+    :param uri: decoded URI
+    :type uri: string
+
+    :return: signed 64 bits hash
+    :rtype: int
+    """
+    digest = hashlib.blake2b(uri.encode(ISO_8859_1, errors='replace'), digest_size=URI_HASH_SIZE).digest()
+    return int.from_bytes(digest, 'big', signed=True)
+
+def find_runs(paths, dataset=None):
+    """Finds the analysis runs of the indicated files and folders, grouping the files of every
+    run by extension
+
+    :param paths: analysis files or folders searched recursively
+    :type paths: list
+    :param dataset: dataset of every run. By default the first folder below the indicated one,
+        or the indicated folder itself if the files are directly inside it
+    :type dataset: string
+
+    :raises LogError: if a path does not exist
+
+    :return: runs by (dataset, folder below the dataset, run ID), with the files by extension
+    :rtype: dict
+
+    Example:
+        ['analyzed-databases'] => {('rdb', '', '20210930'): {'attacks': 'analyzed-databases/rdb/...', ...}, ...}
+    """
+    runs = dict()
+    for root in paths:
+        if not path.exists(root):
+            log.error(PATH_NOT_EXISTS_ERROR % root)
+        if path.isfile(root):
+            files = [(path.dirname(root), [path.basename(root)])]
+            root = path.dirname(path.dirname(path.abspath(root)))
+        else:
+            files = [(folder, file_names) for folder, _, file_names in os.walk(root)]
+        for folder, file_names in files:
+            folders = path.relpath(path.abspath(folder), path.abspath(root)).split(os.sep)
+            if folders == [os.curdir]:
+                folders = [path.basename(path.abspath(root))]
+            for file_name in file_names:
+                result = ANALYSIS_FILE_CP.match(file_name)
+                if result is not None:
+                    key = (dataset or folders[0], "/".join(folders[1:]), result.group('id'))
+                    runs.setdefault(key, dict())[result.group('extension')] = path.join(folder, file_name)
+    return runs
+
+def read_attacks_header(attacks_file):
+    """Reads the header of .attacks file
+
+    :param attacks_file: previously opened .attacks file at its beginning
+    :type attacks_file: file in read mode
+
+    :return: input, clean and attack lines of the run, None if the header is not valid
+    :rtype: tuple
+    """
+    lines = [attacks_file.readline() for _ in range(HEADER_LINES)]
+    result = ATTACKS_HEADER_CP.match(lines[1].rstrip('\n'))
+    if result is None:
+        return None
+    return int(result.group('input')), int(result.group('clean')), int(result.group('attacks'))
+
+def parse_row(result, line):
+    """Gets the fields of a .attacks or .index line
+
+    :param result: match of ATTACKS_LINE_CP or INDEX_LINE_CP
+    :type result: re.Match
+    :param line: matched line, with rule IDs after Nattacks
+    :type line: string
+
+    :return: URI, request ID, block type and rule IDs
+    :rtype: tuple
+    """
+    return result.group('uri'), result.group('id'), int(result.group('bt')), RULE_ID_CP.findall(line, result.end())
+
+def read_attack_rows(attacks_file_name, index_file_name):
+    """Reads the rows of the attacks of a run, merging .attacks and .index files, which have
+    their lines in the same order: packets come from .attacks file and timestamps from .index file.
+    Only one of them is needed, missing fields are None
+
+    :param attacks_file_name: .attacks file or None
+    :type attacks_file_name: string
+    :param index_file_name: .index file or None
+    :type index_file_name: string
+
+    :return: generator of (packet, timestamp, URI, request ID, block type, rule IDs) tuples
+    :rtype: generator
+    """
+    attacks_file = open(attacks_file_name, encoding=ISO_8859_1, errors='ignore') if attacks_file_name else None
+    index_file = open(index_file_name, encoding=ISO_8859_1, errors='ignore') if index_file_name else None
+    try:
+        attacks = iter(())
+        if attacks_file is not None:
+            read_attacks_header(attacks_file)
+            attacks = (result for result in (ATTACKS_LINE_CP.match(line) for line in attacks_file) \
+                if result is not None)
+        if index_file is None:
+            for result in attacks:
+                uri, request_id, block_type, rule_ids = parse_row(result, result.string)
+                yield int(result.group('packet')), None, uri, request_id, block_type, rule_ids
+            return
+
+        attack = next(attacks, None)
+        for line in index_file:
+            result = INDEX_LINE_CP.match(line)
+            if result is None:
+                continue
+            uri, request_id, block_type, rule_ids = parse_row(result, line)
+            packet = None
+            if attack is not None and attack.group('id') == request_id:
+                packet = int(attack.group('packet'))
+                attack = next(attacks, None)
+            yield packet, result.group('timestamp'), uri, request_id, block_type, rule_ids
+    finally:
+        for file in (attacks_file, index_file):
+            if file is not None:
+                file.close()
+
+def get_clean_packets(attack_packets, input_lines):
+    """Gets the packets of the clean rows of a run, which are the packets not used by attacks
+    in increasing order, as .clean file keeps the order of the input
+
+    :param attack_packets: packets of the attacks
+    :type attack_packets: array
+    :param input_lines: lines of the input of the run
+    :type input_lines: int
+
+    :return: generator of packets
+    :rtype: generator
+    """
+    attack_packets = sorted(attack_packets)
+    next_attack = 0
+    for packet in range(1, input_lines + 1):
+        if next_attack < len(attack_packets) and attack_packets[next_attack] == packet:
+            next_attack += 1
+        else:
+            yield packet
+
+def read_clean_rows(clean_file_name, clean_packets):
+    """Reads the rows of .clean file of a run
+
+    :param clean_file_name: .clean file
+    :type clean_file_name: string
+    :param clean_packets: iterator of the packets of the clean rows, None if they are not known
+    :type clean_packets: iterator
+
+    :return: generator of (packet, timestamp, URI, request ID, block type, rule IDs) tuples
+    :rtype: generator
+    """
+    with open(clean_file_name, encoding=ISO_8859_1, errors='ignore') as clean_file:
+        for line in clean_file:
+            packet = next(clean_packets, None) if clean_packets is not None else None
+            yield packet, None, line.rstrip('\n'), None, None, []
+
+def delete_run(connection, run_key):
+    """Deletes the rows of a run
+
+    :param connection: open database
+    :type connection: sqlite3.Connection
+    :param run_key: key of the run
+    :type run_key: int
+    """
+    connection.execute(DELETE_RUN_RULES, (run_key,))
+    connection.execute(DELETE_RUN_REQUESTS, (run_key,))
+    connection.execute(DELETE_RUN, (run_key,))
+
+def insert_rows(connection, run_key, rows, attack, request_key, loaded_rows):
+    """Inserts the rows of a run in batches
+
+    :param connection: open database
+    :type connection: sqlite3.Connection
+    :param run_key: key of the run
+    :type run_key: int
+    :param rows: iterable of (packet, timestamp, URI, request ID, block type, rule IDs) tuples
+    :type rows: iterable
+    :param attack: if rows are attacks
+    :type attack: boolean
+    :param request_key: last key used by a row
+    :type request_key: int
+    :param loaded_rows: progress of the loaded rows
+    :type loaded_rows: progress.Progress
+
+    :return: last key used by a row and packets of the rows
+    :rtype: tuple
+    """
+    requests, request_rules = list(), list()
+    packets = array.array('q')
+    for packet, timestamp, uri, request_id, block_type, rule_ids in rows:
+        request_key += 1
+        requests.append((request_key, run_key, packet, timestamp, uri, get_uri_hash(uri), request_id, block_type, \
+            int(attack), verdict_cache.format_rule_ids(rule_ids)))
+        request_rules.extend((request_key, int(rule_id), position) for position, rule_id in enumerate(rule_ids))
+        if packet is not None:
+            packets.append(packet)
+        if len(requests) >= BATCH_SIZE:
+            connection.executemany(INSERT_REQUEST, requests)
+            connection.executemany(INSERT_REQUEST_RULE, request_rules)
+            requests, request_rules = list(), list()
+            loaded_rows.update(request_key)
+    connection.executemany(INSERT_REQUEST, requests)
+    connection.executemany(INSERT_REQUEST_RULE, request_rules)
+    return request_key, packets
+
+def load_run(connection, run, files, replace):
+    """Loads the rows of a run in a single transaction. Packets of clean rows are recovered from
+    the packets not used by attacks when input, clean and attack lines of the header add up.
+    Attacks are read from the columnar file of the run instead of .attacks and .index files if
+    it exists
+
+    :param connection: open database
+    :type connection: sqlite3.Connection
+    :param run: dataset, folder below the dataset and run ID
+    :type run: tuple
+    :param files: analysis files of the run by extension
+    :type files: dict
+    :param replace: if the run is loaded again when it was already loaded
+    :type replace: boolean
+
+    :return: if the run has been loaded
+    :rtype: boolean
+    """
+    dataset, folder, run_id = run
+    existing_run = connection.execute(SELECT_RUN, run).fetchone()
+    if existing_run is not None and not replace:
+        log.info(LOG_INFO_SKIPPED.format(run_id, dataset, folder or os.curdir))
+        return False
+
+    start_time = time.perf_counter()
+    header = None
+    columnar_file = None
+    if columnar.COLUMNAR_EXT in files:
+        columnar_file = columnar.ColumnarFile(files[columnar.COLUMNAR_EXT])
+        if columnar_file.has_attacks():
+            header = columnar_file.input_lines, columnar_file.clean_lines, columnar_file.attack_lines
+        attack_rows = columnar_file.read_rows()
+    else:
+        attacks_file_name = files.get(comparer.ATTACKS_EXT)
+        if attacks_file_name is not None:
+            with open(attacks_file_name, encoding=ISO_8859_1, errors='ignore') as attacks_file:
+                header = read_attacks_header(attacks_file)
+        attack_rows = read_attack_rows(attacks_file_name, files.get(comparer.INDEX_EXT))
+    input_lines, clean_lines, attack_lines = header or (None, None, None)
+
+    with connection:
+        if existing_run is not None:
+            delete_run(connection, existing_run[0])
+        run_key = connection.execute(INSERT_RUN, (dataset, folder, run_id, input_lines, clean_lines, \
+            attack_lines, time.time())).lastrowid
+        first_request_key = request_key = connection.execute(SELECT_LAST_REQUEST_KEY).fetchone()[0]
+        loaded_rows = progress.Progress(LOADING_ROWS.format(ANALYSIS_FILE.format(run_id, "*")), progress.LINES)
+        try:
+            request_key, attack_packets = insert_rows(connection, run_key, attack_rows, True, request_key, \
+                loaded_rows)
+        finally:
+            if columnar_file is not None:
+                columnar_file.close()
+        attack_count = request_key - first_request_key
+        if comparer.CLEAN_EXT in files:
+            clean_packets = None
+            if header is not None and input_lines == clean_lines + attack_lines and len(attack_packets) == attack_lines:
+                clean_packets = get_clean_packets(attack_packets, input_lines)
+            else:
+                log.info(LOG_INFO_CLEAN_PACKETS.format(run_id))
+            request_key, _ = insert_rows(connection, run_key, read_clean_rows(files[comparer.CLEAN_EXT], \
+                clean_packets), False, request_key, loaded_rows)
+        loaded_rows.done(request_key - first_request_key)
+    log.info(LOG_INFO_LOADED.format(run_id, dataset, attack_count, request_key - first_request_key - attack_count, \
+        time.perf_counter() - start_time))
+    return True
+
+def load_runs(connection, database_name, paths, dataset=None, replace=False):
+    """Loads the runs found in the indicated files and folders that are not loaded yet, every
+    one in its own transaction. When the database has no rows yet, indexes are created after
+    loading every run, which is faster than updating them row by row
+
+    :param connection: open database
+    :type connection: sqlite3.Connection
+    :param database_name: SQLite file
+    :type database_name: string
+    :param paths: analysis files or folders searched recursively
+    :type paths: list
+    :param dataset: dataset of every run, the first folder below the indicated one by default
+    :type dataset: string
+    :param replace: if runs already loaded are loaded again
+    :type replace: boolean
+
+    :raises LogError: if a path does not exist
+    """
+    log.info(LOG_INFO_MAIN.format(database_name))
+    runs = find_runs(paths, dataset)
+    log.info(LOG_INFO_RUNS.format(len(runs)))
+    empty = connection.execute(SELECT_ANY_REQUEST).fetchone() is None
+    if not empty:
+        create_row_indexes(connection)
+    for run in sorted(runs):
+        load_run(connection, run, runs[run], replace)
+    if empty:
+        log.info(LOG_INFO_INDEXES.format(database_name))
+        create_row_indexes(connection)
+    log.info(LOG_INFO_END.format(database_name))
+
+def find_by_rule(connection, rule_id, dataset=None):
+    """Finds the attacks detected by a rule in every run
+
+    :param connection: open database
+    :type connection: sqlite3.Connection
+    :param rule_id: rule ID
+    :type rule_id: int
+    :param dataset: dataset of the runs, all of them by default
+    :type dataset: string
+
+    :return: list of (dataset, folder, run ID, packet, timestamp, block type, rule IDs, URI) tuples
+    :rtype: list
+    """
+    if dataset is None:
+        return connection.execute(SELECT_BY_RULE + ORDER_BY_RUN, (rule_id,)).fetchall()
+    return connection.execute(SELECT_BY_RULE + DATASET_CONDITION + ORDER_BY_RUN, (rule_id, dataset)).fetchall()
+
+def find_by_uri(connection, uri, dataset=None):
+    """Finds the verdicts of an URI in every run
+
+    :param connection: open database
+    :type connection: sqlite3.Connection
+    :param uri: decoded URI
+    :type uri: string
+    :param dataset: dataset of the runs, all of them by default
+    :type dataset: string
+
+    :return: list of (dataset, folder, run ID, packet, timestamp, block type, rule IDs, URI) tuples
+    :rtype: list
+    """
+    if dataset is None:
+        return connection.execute(SELECT_BY_URI + ORDER_BY_RUN, (get_uri_hash(uri), uri)).fetchall()
+    return connection.execute(SELECT_BY_URI + DATASET_CONDITION + ORDER_BY_RUN, \
+        (get_uri_hash(uri), uri, dataset)).fetchall()
+
+def show_rows(rows, start_time):
+    """Writes the found rows separated by tabs in the standard output
+
+    :param rows: rows found
+    :type rows: list
+    :param start_time: time when the query started
+    :type start_time: float
+    """
+    elapsed = time.perf_counter() - start_time
+    print(QUERY_HEADER)
+    for row in rows:
+        print(QUERY_ROW.format(*(verdict_cache.EMPTY_VALUE if value is None else value for value in row)))
+    log.info(LOG_INFO_QUERY.format(len(rows), elapsed * 1000))
+
+def main(args):
+    """Main function.
+
+    Loads the runs found in the indicated files and folders that are not loaded yet, then runs
+    the indicated queries
+
+    :param args: command-line retrieved arguments
+    :type args: ArgumentParser.parse_args()
+
+    :raises LogError: if a path does not exist or there is nothing to do
+    """
+    if args.paths is None and args.rule_id is None and args.uri is None:
+        log.error(NOTHING_TO_DO_ERROR)
+    if args.paths is None and not path.isfile(args.database):
+        log.error(DATABASE_NOT_EXISTS_ERROR % args.database)
+    connection = open_database(args.database)
+    try:
+        if args.paths is None:
+            create_row_indexes(connection)
+        else:
+            load_runs(connection, args.database, args.paths, args.dataset, args.replace)
+        if args.rule_id is not None:
+            start_time = time.perf_counter()
+            show_rows(find_by_rule(connection, args.rule_id, None if args.paths else args.dataset), start_time)
+        if args.uri is not None:
+            start_time = time.perf_counter()
+            show_rows(find_by_uri(connection, args.uri, None if args.paths else args.dataset), start_time)
+    finally:
+        connection.close()
+
+# =====================================
+# Main
+# =====================================
+if __name__ == "__main__":
+    args = init_parser().parse_args()
+    progress.set_batch_mode(args.batch)
+    main(args)
@@ -0,0 +1,88 @@
+"""Tests of the numbering of access log lines across the attempts of a resumed launch
+
+Usage: python -m pytest tests
+
+Author: Carlos Cagigao Bravo
+"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import analyzer
+import launcher
+
+# =====================================
+# Constant variables
+# =====================================
+ACCESS_LOG_LINE = '127.0.0.1 - - [18/Oct/2026:10:00:00 +0000] "GET {} HTTP/1.1" 200 5 "-" "-" "-"\n'
+URI = "/index.php?line={}"
+
+# =====================================
+# Functions
+# =====================================
+def get_attempt_lines(line_numbers):
+    """Access log lines of the URIs of some lines of the launched file"""
+    return [ACCESS_LOG_LINE.format(URI.format(line_number)) for line_number in line_numbers]
+
+def get_marker_lines(attempt, line, acknowledged=()):
+    """Access log lines of the run marker requests sent by launcher"""
+    return [ACCESS_LOG_LINE.format(marker_uri) for marker_uri in launcher.get_run_marker_uris(attempt, line, \
+        acknowledged)]
+
+# =====================================
+# Classes
+# =====================================
+class NumberAccessLogLinesTest(unittest.TestCase):
+
+    def assertNumbering(self, log_lines, expected):
+        """Checks that every access log line is numbered as the line of its URI"""
+        numbered = list(analyzer.number_access_log_lines(log_lines))
+        self.assertEqual([line_number for line_number, _ in numbered], expected)
+        for line_number, line in numbered:
+            self.assertIn(URI.format(line_number) + " ", line)
+
+    def test_without_markers(self):
+        self.assertNumbering(get_attempt_lines(range(1, 6)), [1, 2, 3, 4, 5])
+
+    def test_lines_launched_again(self):
+        log_lines = get_attempt_lines(range(1, 7)) + get_marker_lines(2, 3) + get_attempt_lines(range(4, 11))
+        self.assertNumbering(log_lines, list(range(1, 11)))
+
+    def test_acknowledged_lines_not_launched_again(self):
+        log_lines = get_attempt_lines(range(1, 10)) + get_marker_lines(2, 3, {5, 6, 9}) + \
+            get_attempt_lines([4, 7, 8, 10, 11])
+        self.assertNumbering(log_lines, list(range(1, 12)))
+
+    def test_several_attempts(self):
+        log_lines = get_attempt_lines(range(1, 5)) + get_marker_lines(2, 2, {4}) + \
+            get_attempt_lines([3, 5, 6, 7, 8]) + get_marker_lines(3, 5, {7, 8}) + get_attempt_lines([6, 9])
+        self.assertNumbering(log_lines, list(range(1, 10)))
+
+    def test_marker_in_several_requests(self):
+        last_line = 4 + 4 * launcher.RUN_MARKER_RANGES
+        acknowledged = set(range(5, last_line + 1, 2))
+        marker_lines = get_marker_lines(2, 3, acknowledged)
+        self.assertEqual(len(marker_lines), 2)
+        launched_again = [line_number for line_number in range(4, last_line + 6) if line_number not in acknowledged]
+        log_lines = get_attempt_lines(range(1, last_line + 1)) + marker_lines + get_attempt_lines(launched_again)
+        self.assertNumbering(log_lines, list(range(1, last_line + 6)))
+
+
+class RunMarkerTest(unittest.TestCase):
+
+    def test_line_ranges(self):
+        self.assertEqual(launcher.get_line_ranges({9, 5, 6, 7, 12}), [(5, 7), (9, 9), (12, 12)])
+        self.assertEqual(launcher.get_line_ranges(()), [])
+
+    def test_parse_marker(self):
+        self.assertEqual(launcher.parse_run_marker(get_marker_lines(2, 1500)[0]), (2, 1500, []))
+        self.assertEqual(launcher.parse_run_marker(get_marker_lines(3, 1500, {1502, 1503, 1510})[0]), \
+            (3, 1500, [(1502, 1503), (1510, 1510)]))
+        self.assertIsNone(launcher.parse_run_marker(get_attempt_lines([1])[0]))
+
+
+if __name__ == '__main__':
+    unittest.main()
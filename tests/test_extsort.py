@@ -0,0 +1,74 @@
+"""Tests of the external sort of lines bigger than the memory budget
+
+Usage: python -m pytest tests
+
+Author: Carlos Cagigao Bravo
+"""
+
+import heapq
+import os
+import random
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import extsort
+
+# =====================================
+# Constant variables
+# =====================================
+LINES_NUMBER = 5000
+LINE = "{:08x}\t{}\n"
+TINY_BUDGET = 1
+
+# =====================================
+# Classes
+# =====================================
+class SortLinesTest(unittest.TestCase):
+
+    def setUp(self):
+        folder = tempfile.TemporaryDirectory()
+        self.addCleanup(folder.cleanup)
+        self.folder = folder.name
+        numbers = random.Random(LINES_NUMBER)
+        self.lines = [LINE.format(numbers.getrandbits(32), number) for number in range(LINES_NUMBER)]
+        self.merged_runs = list()
+        merge = heapq.merge
+
+        def count_runs(*iterables, **kwargs):
+            self.merged_runs.append(len(iterables))
+            return merge(*iterables, **kwargs)
+        merge_patch = mock.patch.object(extsort.heapq, 'merge', side_effect=count_runs)
+        merge_patch.start()
+        self.addCleanup(merge_patch.stop)
+
+    def test_in_memory(self):
+        self.assertEqual(list(extsort.sort_lines(self.lines, LINES_NUMBER * 1024, self.folder)), sorted(self.lines))
+        self.assertEqual(self.merged_runs, [])
+
+    def test_runs(self):
+        memory_budget = sum(sys.getsizeof(line) + extsort.POINTER_SIZE for line in self.lines) // 10
+        sorted_lines = list(extsort.sort_lines(self.lines, memory_budget, self.folder))
+        self.assertEqual(sorted_lines, sorted(self.lines))
+        self.assertEqual(len(self.merged_runs), 1)
+        self.assertEqual(os.listdir(self.folder), [])
+
+    def test_more_runs_than_fan_in(self):
+        sorted_lines = list(extsort.sort_lines(self.lines, TINY_BUDGET, self.folder))
+        self.assertEqual(sorted_lines, sorted(self.lines))
+        self.assertGreater(len(self.merged_runs), extsort.MERGE_FAN_IN)
+        self.assertLessEqual(max(self.merged_runs), extsort.MERGE_FAN_IN)
+        self.assertEqual(os.listdir(self.folder), [])
+
+    def test_closed_before_end(self):
+        sorted_lines = extsort.sort_lines(self.lines, TINY_BUDGET, self.folder)
+        self.assertEqual(next(sorted_lines), min(self.lines))
+        sorted_lines.close()
+        self.assertEqual(os.listdir(self.folder), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+"""Tests of the follower reading the access log of a resumed launch
+
+Usage: python -m pytest tests
+
+Author: Carlos Cagigao Bravo
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import comparer
+import follower
+import launcher
+
+# =====================================
+# Constant variables
+# =====================================
+FILE_IDENTIFIER = 1
+ACCESS_LOG = "access.log"
+ERROR_LOG = "error.log"
+ACCESS_LOG_LINE = '127.0.0.1 - - [18/Oct/2026:10:00:00 +0000] "GET {} HTTP/1.1" {} 3 "-" "-" "-" \
+"request_id":"{}" "block_type":{}\n'
+ERROR_LOG_LINE = "2026/10/18 10:00:00 [error] 1#1: *1 the request {} was blocked by rule ID {}, client: 127.0.0.1\n"
+URI = "/index.php?line={}"
+REQUEST_ID = "{:032x}"
+BLOCKED_LINES = (2, 5, 7)
+RULE_ID = 1000
+
+# =====================================
+# Classes
+# =====================================
+class FollowerResumedLaunchTest(unittest.TestCase):
+    """Access log of a launch of 9 lines interrupted after line 6 with its checkpoint after line 3 and
+    line 5 acknowledged, resumed launching lines 4 and 6 to 9 again, and read by the follower in
+    two runs, the first one before the run marker was written"""
+
+    def setUp(self):
+        folder = tempfile.TemporaryDirectory()
+        self.addCleanup(folder.cleanup)
+        current_folder = os.getcwd()
+        os.chdir(folder.name)
+        self.addCleanup(os.chdir, current_folder)
+        self.attempt = 0
+
+    def write_attempt(self, line_numbers, marker_uris=()):
+        """Appends the lines of an attempt to the logs, every request with a different request ID"""
+        with open(ACCESS_LOG, 'a') as access_log, open(ERROR_LOG, 'a') as error_log:
+            for marker_uri in marker_uris:
+                access_log.write(ACCESS_LOG_LINE.format(marker_uri, 200, REQUEST_ID.format(0), 0))
+            for line_number in line_numbers:
+                self.attempt += 1
+                request_id = REQUEST_ID.format(self.attempt)
+                blocked = line_number in BLOCKED_LINES
+                if blocked:
+                    error_log.write(ERROR_LOG_LINE.format(request_id, RULE_ID + line_number))
+                access_log.write(ACCESS_LOG_LINE.format(URI.format(line_number), 403 if blocked else 200, \
+                    request_id, 2 if blocked else 0))
+
+    def follow(self):
+        """Reads the logs once and stops as Ctrl+C does"""
+        with mock.patch.object(follower.time, 'sleep', side_effect=KeyboardInterrupt):
+            return follower.follow_logs(ACCESS_LOG, ERROR_LOG, FILE_IDENTIFIER, 0)
+
+    def read_analysis_file(self, extension):
+        with open(comparer.ANALYSIS_FILE_NAME.format(FILE_IDENTIFIER, extension)) as analysis_file:
+            return analysis_file.readlines()
+
+    def test_lines_launched_again(self):
+        self.write_attempt(range(1, 7))
+        statistics = self.follow()
+        self.assertEqual(statistics.input_lines, 6)
+
+        self.write_attempt([4, 6, 7, 8, 9], launcher.get_run_marker_uris(2, 3, {5}))
+        statistics = self.follow()
+        self.assertEqual((statistics.input_lines, statistics.attack_lines, statistics.clean_lines), (9, 3, 6))
+
+        attacks_lines = self.read_analysis_file(comparer.ATTACKS_EXT)
+        self.assertEqual(attacks_lines[:len(comparer.get_attacks_header(statistics).splitlines())], \
+            comparer.get_attacks_header(statistics).splitlines(keepends=True))
+        packets = [line for line in attacks_lines if line.startswith("Packet")]
+        self.assertEqual(len(packets), len(BLOCKED_LINES))
+        for packet, line_number in zip(packets, BLOCKED_LINES):
+            self.assertTrue(packet.startswith(comparer.PACKET_DATA.format(line_number)))
+            self.assertIn("Uri [{}]".format(URI.format(line_number)), packet)
+            self.assertIn(str(RULE_ID + line_number), packet)
+        self.assertEqual(len(self.read_analysis_file(comparer.INDEX_EXT)), len(BLOCKED_LINES))
+        self.assertEqual(self.read_analysis_file(comparer.CLEAN_EXT), [URI.format(line_number) + "\n" \
+            for line_number in (1, 3, 4, 6, 8, 9)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,321 @@
+"""Tests of the launch checkpoint, the line offsets of the file to launch and its split in line ranges
+
+Usage: python -m pytest tests
+
+Author: Carlos Cagigao Bravo
+"""
+
+import asyncio
+import os
+import socket
+import struct
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import launcher
+from logger import LogError
+
+# =====================================
+# Constant variables
+# =====================================
+OFFSETS_STEP = 4
+LINES_NUMBER = 23
+URI_LINE = "/index.php?id={}&q=%s\n"
+CHECKPOINT_NAME = "analysis-1.launcher.checkpoint"
+URIS_NAME = "attacks.uri"
+HTTP_RESPONSE = b"HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\nok"
+HTTP_STATUS_LINE = b"HTTP/1.1 200 OK\r\n"
+RESET_IDLE_PATH = "/reset-idle"
+RESET_RESPONSE_PATH = "/reset-response"
+
+# =====================================
+# Classes
+# =====================================
+class LauncherTestCase(unittest.TestCase):
+    """File to launch with lines of different lengths in a temporary folder, with the offsets taken
+    every OFFSETS_STEP lines so line ranges are tested with few lines"""
+
+    def setUp(self):
+        folder = tempfile.TemporaryDirectory()
+        self.addCleanup(folder.cleanup)
+        self.folder = folder.name
+        self.file_location = os.path.join(self.folder, URIS_NAME)
+        self.checkpoint_name = os.path.join(self.folder, CHECKPOINT_NAME)
+        self.lines = [URI_LINE.format("9" * line_number) for line_number in range(1, LINES_NUMBER + 1)]
+        with open(self.file_location, 'w') as file:
+            file.writelines(self.lines)
+        offsets_step = mock.patch.object(launcher, 'OFFSETS_STEP', OFFSETS_STEP)
+        offsets_step.start()
+        self.addCleanup(offsets_step.stop)
+
+    def line_offset(self, line_number):
+        """Byte offset of a line of the file to launch, counted from 1"""
+        return sum(len(line) for line in self.lines[:line_number - 1])
+
+    def checkpoint(self, line, acknowledged=()):
+        """Checkpoint of the file to launch after a line"""
+        return launcher.LaunchCheckpoint(self.checkpoint_name, self.file_location, line=line, \
+            acknowledged=acknowledged)
+
+
+class LaunchCheckpointTest(LauncherTestCase):
+
+    def test_save_load(self):
+        checkpoint = launcher.LaunchCheckpoint(self.checkpoint_name, self.file_location, 2, 7, {9, 12}, 345)
+        checkpoint.save()
+        self.assertFalse(os.path.exists(self.checkpoint_name + launcher.CHECKPOINT_TEMPORARY_EXT))
+
+        loaded = launcher.LaunchCheckpoint.load(self.checkpoint_name, self.file_location)
+        self.assertEqual(loaded.attempt, 3)
+        self.assertEqual(loaded.line, 7)
+        self.assertEqual(loaded.acknowledged, {9, 12})
+        self.assertEqual(loaded.results_size, 345)
+
+    def test_save_results_size(self):
+        results_name = os.path.join(self.folder, "results")
+        checkpoint = self.checkpoint(0)
+        with open(results_name, 'w') as checkpoint.results_file:
+            checkpoint.results_file.write("1\t403\t0.001\t-\t-\t-\t-\n")
+            checkpoint.save()
+        loaded = launcher.LaunchCheckpoint.load(self.checkpoint_name, self.file_location)
+        self.assertEqual(loaded.results_size, os.path.getsize(results_name))
+
+    def test_load_missing(self):
+        self.assertIsNone(launcher.LaunchCheckpoint.load(self.checkpoint_name, self.file_location))
+
+    def test_load_other_file(self):
+        self.checkpoint(5).save()
+        with open(self.file_location, 'a') as file:
+            file.write(URI_LINE.format(0))
+        with self.assertRaises(LogError):
+            launcher.LaunchCheckpoint.load(self.checkpoint_name, self.file_location)
+
+    def test_file_name(self):
+        self.assertEqual(launcher.get_checkpoint_file_name(self.file_location, 123), launcher.CHECKPOINT_FILE % 123)
+        self.assertEqual(launcher.get_checkpoint_file_name(self.file_location), \
+            launcher.FILE_CHECKPOINT_FILE % URIS_NAME)
+
+    def test_remove(self):
+        checkpoint = self.checkpoint(5)
+        checkpoint.save()
+        checkpoint.remove()
+        self.assertFalse(os.path.exists(self.checkpoint_name))
+        checkpoint.remove()
+
+    def test_acknowledge_out_of_order(self):
+        checkpoint = self.checkpoint(0)
+        for line_number in (2, 3, 5):
+            checkpoint.acknowledge(line_number)
+        self.assertEqual((checkpoint.line, checkpoint.acknowledged), (0, {2, 3, 5}))
+        checkpoint.acknowledge(1)
+        self.assertEqual((checkpoint.line, checkpoint.acknowledged), (3, {5}))
+        self.assertTrue(checkpoint.is_launched(5))
+        self.assertFalse(checkpoint.is_launched(4))
+
+    def test_acknowledge_range_after_gap(self):
+        checkpoint = self.checkpoint(4)
+        checkpoint.acknowledge_range(9, 12)
+        self.assertEqual((checkpoint.line, checkpoint.acknowledged), (4, {9, 10, 11, 12}))
+
+    def test_acknowledge_range_closes_gap(self):
+        checkpoint = self.checkpoint(4, {9, 10, 14})
+        checkpoint.acknowledge_range(5, 8)
+        self.assertEqual((checkpoint.line, checkpoint.acknowledged), (10, {14}))
+
+    def test_acknowledge_range_overlapping(self):
+        checkpoint = self.checkpoint(6, {8, 11})
+        checkpoint.acknowledge_range(3, 9)
+        self.assertEqual((checkpoint.line, checkpoint.acknowledged), (9, {11}))
+        checkpoint.acknowledge_range(2, 5)
+        self.assertEqual((checkpoint.line, checkpoint.acknowledged), (9, {11}))
+
+    def test_acknowledge_range_round_trip(self):
+        checkpoint = self.checkpoint(0)
+        checkpoint.acknowledge_range(5, 8)
+        checkpoint.acknowledge_range(1, 3)
+        checkpoint.save()
+        loaded = launcher.LaunchCheckpoint.load(self.checkpoint_name, self.file_location)
+        self.assertEqual((loaded.line, loaded.acknowledged), (3, {5, 6, 7, 8}))
+        loaded.acknowledge(4)
+        self.assertEqual((loaded.line, loaded.acknowledged), (8, set()))
+
+
+class LineOffsetsTest(LauncherTestCase):
+
+    def test_offsets(self):
+        offsets = launcher.get_line_offsets(self.file_location)
+        expected = [self.line_offset(line_number) for line_number in range(1, LINES_NUMBER + 1, OFFSETS_STEP)]
+        self.assertEqual(offsets.tolist(), expected)
+        self.assertTrue(os.path.isfile(self.file_location + launcher.OFFSETS_EXT))
+
+    def test_offsets_small_buffer(self):
+        with mock.patch.object(launcher, 'BUFFER_SIZE', 7):
+            offsets = launcher.get_line_offsets(self.file_location)
+        expected = [self.line_offset(line_number) for line_number in range(1, LINES_NUMBER + 1, OFFSETS_STEP)]
+        self.assertEqual(offsets.tolist(), expected)
+
+    def test_offsets_last_line(self):
+        with open(self.file_location, 'w') as file:
+            file.writelines(self.lines[:2 * OFFSETS_STEP])
+        offsets = launcher.get_line_offsets(self.file_location)
+        self.assertEqual(offsets.tolist(), [0, self.line_offset(OFFSETS_STEP + 1)])
+
+    def test_offsets_rebuilt(self):
+        launcher.get_line_offsets(self.file_location)
+        self.lines = [URI_LINE.format(line_number) for line_number in range(1, LINES_NUMBER + 1)]
+        with open(self.file_location, 'w') as file:
+            file.writelines(self.lines)
+        offsets = launcher.get_line_offsets(self.file_location)
+        self.assertEqual(offsets[1], self.line_offset(OFFSETS_STEP + 1))
+
+    def test_seek_checkpoint(self):
+        for line in range(0, LINES_NUMBER + 1):
+            with self.subTest(line=line), open(self.file_location, 'r') as file:
+                line_number, position = launcher.seek_checkpoint(file, self.file_location, self.checkpoint(line))
+                self.assertEqual((line_number, position), (line + 1, self.line_offset(line + 1)))
+                self.assertEqual(file.readline(), self.lines[line] if line < LINES_NUMBER else "")
+
+    def test_seek_without_checkpoint(self):
+        with open(self.file_location, 'r') as file:
+            self.assertEqual(launcher.seek_checkpoint(file, self.file_location, None), (1, 0))
+
+    def test_read_lines_after_checkpoint(self):
+        checkpoint = self.checkpoint(5, {7, 8})
+        with open(self.file_location, 'r') as file:
+            first_line, _ = launcher.seek_checkpoint(file, self.file_location, checkpoint)
+            line_numbers = [line_number for line_number, _ in launcher.read_lines_to_launch(file, first_line, \
+                checkpoint)]
+        self.assertEqual(line_numbers, [6] + list(range(9, LINES_NUMBER + 1)))
+
+
+class LaunchShardsTest(LauncherTestCase):
+
+    def assertShards(self, shards, first_line):
+        """Checks that the line ranges are contiguous from the first line to the last line of the file,
+        and that every one starts at the offset of its first line"""
+        self.assertEqual(shards[0][1], first_line)
+        self.assertEqual(shards[-1][2], LINES_NUMBER)
+        for (offset, line_number, last_line), following in zip(shards, shards[1:] + [None]):
+            self.assertEqual(offset, self.line_offset(line_number))
+            self.assertLessEqual(line_number, last_line)
+            if following is not None:
+                self.assertEqual(following[1], last_line + 1)
+
+    def test_shards(self):
+        shards = launcher.get_launch_shards(self.file_location, 3)
+        self.assertShards(shards, 1)
+        self.assertEqual(len(shards), 3)
+        for _, line_number, _ in shards[1:]:
+            self.assertEqual((line_number - 1) % OFFSETS_STEP, 0)
+
+    def test_shards_more_than_offsets(self):
+        shards = launcher.get_launch_shards(self.file_location, 50)
+        self.assertShards(shards, 1)
+        self.assertEqual(len(shards), len(range(1, LINES_NUMBER + 1, OFFSETS_STEP)))
+
+    def test_single_shard(self):
+        self.assertEqual(launcher.get_launch_shards(self.file_location, 1), [(0, 1, LINES_NUMBER)])
+
+    def test_shards_after_checkpoint(self):
+        for line in (3, OFFSETS_STEP, OFFSETS_STEP + 1, 13, LINES_NUMBER - 1):
+            with self.subTest(line=line):
+                self.assertShards(launcher.get_launch_shards(self.file_location, 3, self.checkpoint(line)), line + 1)
+
+    def test_shards_checkpoint_at_end(self):
+        self.assertEqual(launcher.get_launch_shards(self.file_location, 3, self.checkpoint(LINES_NUMBER)), [])
+
+    def test_shards_lines_multiple_of_step(self):
+        with open(self.file_location, 'w') as file:
+            file.writelines(self.lines[:2 * OFFSETS_STEP])
+        shards = launcher.get_launch_shards(self.file_location, 2)
+        self.assertEqual(shards, [(0, 1, OFFSETS_STEP), (self.line_offset(OFFSETS_STEP + 1), OFFSETS_STEP + 1, \
+            2 * OFFSETS_STEP)])
+
+
+
+class BrokenPipeWriter:
+    """Writer of a keep-alive connection that the server has already closed"""
+
+    def write(self, data):
+        pass
+
+    async def drain(self):
+        raise BrokenPipeError()
+
+    def close(self):
+        pass
+
+
+class SendRequestTest(unittest.IsolatedAsyncioTestCase):
+    """Local server that answers every request, resetting the connection after the response of
+    RESET_IDLE_PATH or after the status line of RESET_RESPONSE_PATH"""
+
+    async def asyncSetUp(self):
+        self.requests = list()
+        self.server = await asyncio.start_server(self.handle, "127.0.0.1", 0)
+        port = self.server.sockets[0].getsockname()[1]
+        self.target = launcher.get_target("http://127.0.0.1:%d" % port)
+
+    async def asyncTearDown(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def handle(self, reader, writer):
+        request_line = await reader.readline()
+        while request_line:
+            while (await reader.readline()).strip():
+                pass
+            path = request_line.split()[1].decode()
+            self.requests.append(path)
+            writer.write(HTTP_STATUS_LINE if path == RESET_RESPONSE_PATH else HTTP_RESPONSE)
+            await writer.drain()
+            if path in (RESET_IDLE_PATH, RESET_RESPONSE_PATH):
+                writer.get_extra_info('socket').setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack('ii', 1, 0))
+                writer.transport.abort()
+                return
+            request_line = await reader.readline()
+        writer.close()
+
+    async def test_reused_connection(self):
+        connection, status, _ = await launcher.send_request(self.target, None, "/a")
+        connection, status, _ = await launcher.send_request(self.target, connection, "/b")
+        self.assertEqual(status, 200)
+        self.assertIsNotNone(connection)
+        self.assertEqual(self.requests, ["/a", "/b"])
+        connection[1].close()
+
+    async def test_reused_connection_reset_while_idle(self):
+        connection, status, _ = await launcher.send_request(self.target, None, RESET_IDLE_PATH)
+        self.assertEqual(status, 200)
+        await asyncio.sleep(0.1)
+        connection, status, _ = await launcher.send_request(self.target, connection, "/a")
+        self.assertEqual(status, 200)
+        self.assertEqual(self.requests, [RESET_IDLE_PATH, "/a"])
+        connection[1].close()
+
+    async def test_reused_connection_broken_pipe(self):
+        connection, status, _ = await launcher.send_request(self.target, (None, BrokenPipeWriter()), "/a")
+        self.assertEqual(status, 200)
+        self.assertEqual(self.requests, ["/a"])
+        connection[1].close()
+
+    async def test_new_connection_reset_after_status_line(self):
+        connection, status, _ = await launcher.send_request(self.target, None, RESET_RESPONSE_PATH)
+        self.assertIsNone(status)
+        self.assertIsNone(connection)
+        self.assertEqual(self.requests, [RESET_RESPONSE_PATH])
+
+    async def test_reused_connection_reset_after_status_line(self):
+        connection, status, _ = await launcher.send_request(self.target, None, "/a")
+        connection, status, _ = await launcher.send_request(self.target, connection, RESET_RESPONSE_PATH)
+        self.assertIsNone(status)
+        self.assertIsNone(connection)
+        self.assertEqual(self.requests, ["/a", RESET_RESPONSE_PATH])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,221 @@
+"""Cache of the verdicts of Nemesida WAF kept in a SQLite file, so URIs already launched
+against the same ruleset are not launched again in later runs.
+
+Every verdict is kept by encoded URI and ruleset identifier (e.g. the Docker image of
+Nemesida WAF) with its HTTP status, block type and rule IDs. When the cache has more
+verdicts than its size, the least recently used ones are removed
+
+Author: Carlos Cagigao Bravo
+"""
+
+from logger import log
+import sqlite3
+
+# =====================================
+# Constant variables
+# =====================================
+CACHE_ARG = "-vc"
+CACHE_HELP = "SQLite file where the verdicts of launched URIs are kept by URI and ruleset. Launcher does not \
+launch the URIs whose verdict is cached, writing it in the results file instead, and analyzer adds the verdicts \
+of the results file to the cache"
+CACHE_VARIABLE_NAME = "cache"
+
+RULESET_ARG = "-rs"
+RULESET_HELP = "Identifier of the ruleset of Nemesida WAF whose verdicts are cached, e.g. its Docker image. \
+Required with verdict cache"
+RULESET_VARIABLE_NAME = "ruleset"
+
+CACHE_SIZE_ARG = "-vcs"
+CACHE_SIZE_DEFAULT = 1000000
+CACHE_SIZE_HELP = "Maximum number of verdicts kept in the cache, the least recently used ones are removed. \
+By default: %s" % CACHE_SIZE_DEFAULT
+CACHE_SIZE_VARIABLE_NAME = "cache_size"
+
+RULESET_REQUIRED_ERROR = "Ruleset must be indicated with %s to use the verdict cache" % RULESET_ARG
+INVALID_CACHE_SIZE_ERROR = "Size of the verdict cache must be greater than 0"
+INVALID_CACHE_ERROR = "Verdict cache {} can not be opened: {}"
+
+RULE_IDS_SEPARATOR = ","
+EMPTY_VALUE = "-"
+BATCH_SIZE = 10000
+TIMEOUT = 60
+
+CREATE_TABLE = "CREATE TABLE IF NOT EXISTS verdicts (uri TEXT NOT NULL, ruleset TEXT NOT NULL, \
+status INTEGER NOT NULL, block_type TEXT NOT NULL, rule_ids TEXT NOT NULL, last_used INTEGER NOT NULL, \
+PRIMARY KEY (uri, ruleset))"
+CREATE_LAST_USED_INDEX = "CREATE INDEX IF NOT EXISTS verdicts_last_used ON verdicts (last_used)"
+SELECT_LAST_USED = "SELECT coalesce(max(last_used), 0) FROM verdicts"
+SELECT_VERDICT = "SELECT status, block_type, rule_ids FROM verdicts WHERE uri = ? AND ruleset = ?"
+INSERT_VERDICT = "INSERT OR REPLACE INTO verdicts (uri, ruleset, status, block_type, rule_ids, last_used) \
+VALUES (?, ?, ?, ?, ?, ?)"
+UPDATE_LAST_USED = "UPDATE verdicts SET last_used = ? WHERE uri = ? AND ruleset = ?"
+COUNT_VERDICTS = "SELECT count(*) FROM verdicts"
+DELETE_LEAST_RECENTLY_USED = "DELETE FROM verdicts WHERE rowid IN \
+(SELECT rowid FROM verdicts ORDER BY last_used LIMIT ?)"
+PRAGMAS = ["PRAGMA journal_mode=WAL", "PRAGMA synchronous=NORMAL"]
+
+# =====================================
+# Classes
+# =====================================
+class VerdictCache:
+    """Verdicts of a ruleset kept in a SQLite file.
+
+    New verdicts and uses of cached ones are kept in memory and written in batches, and the
+    least recently used verdicts are removed when the cache is closed
+    """
+
+    def __init__(self, file_name, ruleset, size=CACHE_SIZE_DEFAULT):
+        """Opens the cache, creating the file if it does not exist
+
+        :param file_name: SQLite file
+        :type file_name: string
+        :param ruleset: identifier of the ruleset
+        :type ruleset: string
+        :param size: maximum number of verdicts kept
+        :type size: int
+
+        :raises LogError: if the file is not a valid cache
+        """
+        if size < 1:
+            log.error(INVALID_CACHE_SIZE_ERROR)
+        self.file_name = file_name
+        self.ruleset = ruleset
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self.added = 0
+        self.new_verdicts = dict()
+        self.uses = list()
+        try:
+            self.connection = sqlite3.connect(file_name, timeout=TIMEOUT)
+            for pragma in PRAGMAS:
+                self.connection.execute(pragma)
+            self.connection.execute(CREATE_TABLE)
+            self.connection.execute(CREATE_LAST_USED_INDEX)
+            self.last_used = self.connection.execute(SELECT_LAST_USED).fetchone()[0]
+            self.connection.commit()
+        except sqlite3.DatabaseError as database_error:
+            log.error(INVALID_CACHE_ERROR.format(file_name, database_error))
+
+    def get(self, uri):
+        """Gets the verdict of an URI
+
+        :param uri: encoded URI
+        :type uri: string
+
+        :return: HTTP status, block type and list of rule IDs, None if it is not cached
+        :rtype: tuple
+        """
+        verdict = self.new_verdicts.get(uri)
+        if verdict is None:
+            verdict = self.connection.execute(SELECT_VERDICT, (uri, self.ruleset)).fetchone()
+            if verdict is None:
+                self.misses += 1
+                return None
+            self.last_used += 1
+            self.uses.append((self.last_used, uri, self.ruleset))
+            if len(self.uses) >= BATCH_SIZE:
+                self.flush()
+        self.hits += 1
+        status, block_type, rule_ids = verdict
+        return status, block_type, parse_rule_ids(rule_ids)
+
+    def put(self, uri, status, block_type, rule_ids):
+        """Adds or replaces the verdict of an URI
+
+        :param uri: encoded URI
+        :type uri: string
+        :param status: HTTP status
+        :type status: int
+        :param block_type: block type of X-Block-Type header
+        :type block_type: string
+        :param rule_ids: rule IDs of the error log
+        :type rule_ids: list
+        """
+        self.new_verdicts[uri] = (int(status), block_type, format_rule_ids(rule_ids))
+        self.added += 1
+        if len(self.new_verdicts) >= BATCH_SIZE:
+            self.flush()
+
+    def flush(self):
+        """Writes the new verdicts and the uses of cached ones"""
+        verdicts = list()
+        for uri, (status, block_type, rule_ids) in self.new_verdicts.items():
+            self.last_used += 1
+            verdicts.append((uri, self.ruleset, status, block_type, rule_ids, self.last_used))
+        with self.connection:
+            self.connection.executemany(UPDATE_LAST_USED, self.uses)
+            self.connection.executemany(INSERT_VERDICT, verdicts)
+        self.new_verdicts = dict()
+        self.uses = list()
+
+    def evict(self):
+        """Removes the least recently used verdicts exceeding the size of the cache"""
+        exceeding = self.connection.execute(COUNT_VERDICTS).fetchone()[0] - self.size
+        if exceeding > 0:
+            with self.connection:
+                self.connection.execute(DELETE_LEAST_RECENTLY_USED, (exceeding,))
+
+    def close(self):
+        """Writes pending changes, removes the exceeding verdicts and closes the file"""
+        self.flush()
+        self.evict()
+        self.connection.close()
+
+# =====================================
+# Functions
+# =====================================
+def add_optional_arguments(parser):
+    """Add optional arguments to parser
+
+    :param parser: parser to add arguments
+    :type parser: ArgumentParser
+    """
+    parser.add_argument(CACHE_ARG, help=CACHE_HELP, metavar=CACHE_VARIABLE_NAME, dest=CACHE_VARIABLE_NAME)
+    parser.add_argument(RULESET_ARG, help=RULESET_HELP, metavar=RULESET_VARIABLE_NAME, dest=RULESET_VARIABLE_NAME)
+    parser.add_argument(CACHE_SIZE_ARG, help=CACHE_SIZE_HELP, default=CACHE_SIZE_DEFAULT, \
+        metavar=CACHE_SIZE_VARIABLE_NAME, dest=CACHE_SIZE_VARIABLE_NAME, type=int)
+
+def open_cache(args):
+    """Opens the verdict cache indicated in the arguments
+
+    :param args: command-line retrieved arguments
+    :type args: ArgumentParser.parse_args()
+
+    :raises LogError: if ruleset is not indicated or the file is not a valid cache
+
+    :return: cache, None if it is not indicated
+    :rtype: VerdictCache
+    """
+    file_name = getattr(args, CACHE_VARIABLE_NAME, None)
+    if file_name is None:
+        return None
+    ruleset = getattr(args, RULESET_VARIABLE_NAME, None)
+    if not ruleset:
+        log.error(RULESET_REQUIRED_ERROR)
+    return VerdictCache(file_name, ruleset, getattr(args, CACHE_SIZE_VARIABLE_NAME, CACHE_SIZE_DEFAULT))
+
+def format_rule_ids(rule_ids):
+    """Joins rule IDs as they are written in results file and in the cache
+
+    :param rule_ids: rule IDs
+    :type rule_ids: list
+
+    :return: rule IDs separated by commas, '-' if there are none
+    :rtype: string
+
+    Example:
+        ['1559', '57'] => '1559,57'
+    """
+    return RULE_IDS_SEPARATOR.join(rule_ids) or EMPTY_VALUE
+
+def parse_rule_ids(rule_ids):
+    """Splits rule IDs joined by format_rule_ids
+
+    :param rule_ids: rule IDs separated by commas, '-' if there are none
+    :type rule_ids: string
+
+    :return: rule IDs
+    :rtype: list
+    """
+    return [] if rule_ids == EMPTY_VALUE else rule_ids.split(RULE_IDS_SEPARATOR)
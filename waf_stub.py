@@ -0,0 +1,463 @@
+"""Script that runs a local stand-in of Nemesida WAF to benchmark launcher and analyzer without
+Docker. GET requests are answered with 403 if the decoded URI matches any rule and with 200
+otherwise, writing nginx access.log and error.log lines in the format read by analyzer
+
+Usage: waf_stub.py [-h] [-l address] [-p port] [-a access_log] [-e error_log]
+                   [-rl rules] [-w workers]
+
+optional arguments:
+  -h, --help     show this help message and exit
+  -l address     Address where the server listens. By default: 127.0.0.1
+  -p port        Port where the server listens. By default: 8080
+  -a access_log  Access log file where a line is written for every request. By
+                 default: access.log
+  -e error_log   Error log file where a line is written for every rule matched
+                 by a request. By default: error.log
+  -rl rules      File with a rule in every line: rule ID and regular
+                 expression matched against the decoded URI separated by a
+                 space. By default some rules for path traversal, SQL
+                 injection, XSS and command injection are used
+  -w workers     Number of processes answering requests in the same port. By
+                 default: 1
+
+Author: Carlos Cagigao Bravo
+"""
+
+import argparse
+import asyncio
+from logger import log
+import multiprocessing
+import os
+import random
+import re
+import signal
+import time
+from urllib import parse
+
+# =====================================
+# Constant variables
+# =====================================
+DESCRIPTION = "Script that runs a local stand-in of Nemesida WAF to benchmark launcher and analyzer without \
+Docker. GET requests are answered with 403 if the decoded URI matches any rule and with 200 otherwise, writing \
+nginx access.log and error.log lines in the format read by analyzer"
+
+ADDRESS_ARG = "-l"
+ADDRESS_DEFAULT = "127.0.0.1"
+ADDRESS_HELP = "Address where the server listens. By default: %s" % ADDRESS_DEFAULT
+ADDRESS_VARIABLE_NAME = "address"
+
+PORT_ARG = "-p"
+PORT_DEFAULT = 8080
+PORT_HELP = "Port where the server listens. By default: %s" % PORT_DEFAULT
+PORT_VARIABLE_NAME = "port"
+
+ACCESS_LOG_ARG = "-a"
+ACCESS_LOG_DEFAULT = "access.log"
+ACCESS_LOG_HELP = "Access log file where a line is written for every request. By default: %s" % ACCESS_LOG_DEFAULT
+ACCESS_LOG_VARIABLE_NAME = "access_log"
+
+ERROR_LOG_ARG = "-e"
+ERROR_LOG_DEFAULT = "error.log"
+ERROR_LOG_HELP = "Error log file where a line is written for every rule matched by a request. By default: %s" \
+    % ERROR_LOG_DEFAULT
+ERROR_LOG_VARIABLE_NAME = "error_log"
+
+RULES_ARG = "-rl"
+RULES_HELP = "File with a rule in every line: rule ID and regular expression matched against the decoded URI \
+separated by a space. By default some rules for path traversal, SQL injection, XSS and command injection are used"
+RULES_VARIABLE_NAME = "rules"
+
+WORKERS_ARG = "-w"
+WORKERS_DEFAULT = 1
+WORKERS_HELP = "Number of processes answering requests in the same port. By default: %s" % WORKERS_DEFAULT
+WORKERS_VARIABLE_NAME = "workers"
+
+DEFAULT_RULES = [
+    ("57", r"\.\./"),
+    ("67", r"\.\.\.\."),
+    ("1559", r"etc/passwd"),
+    ("1513", r"union\s+(all\s+)?select"),
+    ("1516", r"'\s*(or|and)\s"),
+    ("2739", r"select\s.+\sfrom\s"),
+    ("1562", r"<\s*script"),
+    ("508", r"cmd\.exe|/bin/(ba)?sh|;\s*(cat|ls|id)\b")
+]
+RULE_LINE_CP = re.compile(r'(?P<rule_id>\d+) (?P<pattern>.+)')
+
+LOG_INFO_MAIN = "Nemesida WAF stand-in listening on {}:{} with {} rules and {} processes, press Ctrl+C to stop"
+LOG_INFO_LOGS = "Writing access log in {} and error log in {}"
+LOG_INFO_END = "Server stopped"
+FILE_NOT_EXISTS_ERROR = "File %s does not exist"
+INVALID_RULE_ERROR = "Invalid rule in line {} of {}: {}"
+INVALID_WORKERS_ERROR = "Number of processes must be greater than 0"
+
+HEADERS_END = b"\r\n\r\n"
+HTTP_BLOCKED_STATUS = 403
+HTTP_OK_STATUS = 200
+HTTP_NOT_ALLOWED_STATUS = 405
+HTTP_BAD_REQUEST_STATUS = 400
+HTTP_REASONS = {HTTP_OK_STATUS: "OK", HTTP_BAD_REQUEST_STATUS: "Bad Request", HTTP_BLOCKED_STATUS: "Forbidden", \
+    HTTP_NOT_ALLOWED_STATUS: "Not Allowed"}
+HTTP_BODIES = {HTTP_OK_STATUS: b"ok\n", HTTP_BAD_REQUEST_STATUS: b"bad request\n", \
+    HTTP_BLOCKED_STATUS: b"blocked by Nemesida WAF stand-in\n", HTTP_NOT_ALLOWED_STATUS: b"not allowed\n"}
+HTTP_RESPONSE = "HTTP/1.1 {} {}\r\nServer: nginx\r\nDate: {}\r\nContent-Type: text/plain\r\nContent-Length: {}\r\n\
+Connection: {}\r\nX-Request-ID: {}\r\nX-Block-Type: {}\r\n\r\n"
+HTTP_METHOD = "GET"
+HTTP_VERSION_1_0 = "HTTP/1.0"
+CONNECTION_CLOSE_HEADER = b"connection: close"
+KEEP_ALIVE = "keep-alive"
+CLOSE = "close"
+HTTP_ENCODING = "ISO-8859-1"
+DATE_FORMAT = "%a, %d %b %Y %H:%M:%S GMT"
+BLOCKED_TYPE = 2
+NOT_BLOCKED_TYPE = 0
+REQUEST_ID_FORMAT = "%032x"
+REQUEST_ID_BITS = 128
+MAX_HEADERS_SIZE = 65536
+DECODINGS = 2
+
+ACCESS_LOG_LINE = '{} - - {} "{}" {} {} "-" "{}" "-" "request_id":"{}" "block_type":{}\n'
+ACCESS_LOG_TIMESTAMP_FORMAT = "[%d/%b/%Y:%H:%M:%S +0000]"
+ERROR_LOG_LINE = '{} [error] {}#{}: *{} the request {} was blocked by rule ID {}, client: {}, server: localhost, \
+request: "{}"\n'
+ERROR_LOG_TIMESTAMP_FORMAT = "%Y/%m/%d %H:%M:%S"
+USER_AGENT_HEADER = b"\r\nuser-agent: "
+EMPTY_VALUE = "-"
+
+# =====================================
+# Classes
+# =====================================
+class LogWriter:
+    """Log file whose lines are kept in memory and appended with a single write, so lines of
+    different processes are never mixed and the lines of the requests answered in the same turn
+    of the event loop are written together
+    """
+
+    def __init__(self, file_name):
+        """Opens the log file in append mode
+
+        :param file_name: name of the log file
+        :type file_name: string
+        """
+        self.descriptor = os.open(file_name, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        self.lines = list()
+
+    def write(self, line):
+        """Adds a line to the pending ones
+
+        :param line: line finished with a line break
+        :type line: string
+        """
+        self.lines.append(line)
+
+    def flush(self):
+        """Appends the pending lines to the file"""
+        if self.lines:
+            data = "".join(self.lines).encode(HTTP_ENCODING, errors="replace")
+            self.lines = list()
+            while data:
+                data = data[os.write(self.descriptor, data):]
+
+    def close(self):
+        """Appends the pending lines and closes the file"""
+        self.flush()
+        os.close(self.descriptor)
+
+class Clock:
+    """Formatted timestamps of the current second, formatted again only when the second changes"""
+
+    def __init__(self):
+        self.second = None
+        self.date = self.access_log_timestamp = self.error_log_timestamp = None
+
+    def update(self):
+        """Formats the timestamps if the second has changed"""
+        second = int(time.time())
+        if second != self.second:
+            self.second = second
+            utc_time = time.gmtime(second)
+            self.date = time.strftime(DATE_FORMAT, utc_time)
+            self.access_log_timestamp = time.strftime(ACCESS_LOG_TIMESTAMP_FORMAT, utc_time)
+            self.error_log_timestamp = time.strftime(ERROR_LOG_TIMESTAMP_FORMAT, utc_time)
+
+class WafStub:
+    """Server that answers the requests of the connections and writes the log lines"""
+
+    def __init__(self, rules, access_log, error_log):
+        """Creates the server
+
+        :param rules: list of (rule ID, compiled pattern) tuples
+        :type rules: list
+        :param access_log: access log writer
+        :type access_log: LogWriter
+        :param error_log: error log writer
+        :type error_log: LogWriter
+        """
+        self.rules = rules
+        self.any_rule_cp = re.compile("|".join("(?:%s)" % rule_cp.pattern for _, rule_cp in rules), re.IGNORECASE)
+        self.access_log = access_log
+        self.error_log = error_log
+        self.clock = Clock()
+        self.pid = os.getpid()
+        self.connection_count = 0
+        self.flushed = None
+
+    def get_matched_rules(self, uri):
+        """Gets the rules matched by the URI decoded as many times as DECODINGS indicates
+
+        :param uri: URI of the request
+        :type uri: string
+
+        :return: IDs of the matched rules
+        :rtype: list
+        """
+        decoded_uri = uri
+        for _ in range(DECODINGS):
+            decoded_uri = parse.unquote(decoded_uri, encoding=HTTP_ENCODING)
+        if self.any_rule_cp.search(decoded_uri) is None:
+            return []
+        return [rule_id for rule_id, rule_cp in self.rules if rule_cp.search(decoded_uri)]
+
+    def answer(self, head, client, connection_number):
+        """Creates the response of a request writing its log lines
+
+        :param head: request line and headers
+        :type head: bytes
+        :param client: address of the client
+        :type client: string
+        :param connection_number: number of the connection, written in error log
+        :type connection_number: int
+
+        :return: response and if the connection must be kept alive
+        :rtype: tuple
+        """
+        self.clock.update()
+        request_id = REQUEST_ID_FORMAT % random.getrandbits(REQUEST_ID_BITS)
+        request_line = head[:head.find(b"\r\n")].decode(HTTP_ENCODING)
+        parts = request_line.split(" ")
+        keep_alive = len(parts) == 3 and parts[2] != HTTP_VERSION_1_0 and CONNECTION_CLOSE_HEADER not in head.lower()
+        block_type = NOT_BLOCKED_TYPE
+        if len(parts) != 3:
+            status = HTTP_BAD_REQUEST_STATUS
+        elif parts[0] != HTTP_METHOD:
+            status = HTTP_NOT_ALLOWED_STATUS
+        else:
+            rule_ids = self.get_matched_rules(parts[1])
+            status = HTTP_OK_STATUS
+            if rule_ids:
+                status = HTTP_BLOCKED_STATUS
+                block_type = BLOCKED_TYPE
+                for rule_id in rule_ids:
+                    self.error_log.write(ERROR_LOG_LINE.format(self.clock.error_log_timestamp, self.pid, self.pid, \
+                        connection_number, request_id, rule_id, client, request_line))
+
+        body = HTTP_BODIES[status]
+        self.access_log.write(ACCESS_LOG_LINE.format(client, self.clock.access_log_timestamp, request_line, status, \
+            len(body), self.get_user_agent(head), request_id, block_type))
+        response = HTTP_RESPONSE.format(status, HTTP_REASONS[status], self.clock.date, len(body), \
+            KEEP_ALIVE if keep_alive else CLOSE, request_id, block_type).encode(HTTP_ENCODING) + body
+        return response, keep_alive
+
+    def get_user_agent(self, head):
+        """Gets the User-Agent header of the request
+
+        :param head: request line and headers
+        :type head: bytes
+
+        :return: value of the header or - if it is not found
+        :rtype: string
+        """
+        start = head.lower().find(USER_AGENT_HEADER)
+        if start < 0:
+            return EMPTY_VALUE
+        start += len(USER_AGENT_HEADER)
+        end = head.find(b"\r\n", start)
+        return head[start:end if end >= 0 else len(head)].decode(HTTP_ENCODING)
+
+    async def handle_connection(self, reader, writer):
+        """Answers the requests of a connection until the client closes it or asks for it
+
+        :param reader: reader of the connection
+        :type reader: asyncio.StreamReader
+        :param writer: writer of the connection
+        :type writer: asyncio.StreamWriter
+        """
+        self.connection_count += 1
+        connection_number = self.connection_count
+        peer = writer.get_extra_info("peername")
+        client = peer[0] if peer else EMPTY_VALUE
+        try:
+            keep_alive = True
+            while keep_alive:
+                head = await reader.readuntil(HEADERS_END)
+                response, keep_alive = self.answer(head, client, connection_number)
+                await self.flush_soon()
+                writer.write(response)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    def flush_soon(self):
+        """Schedules the append of pending lines after the requests answered in the current turn
+        of the event loop, so their responses are sent once their log lines are written
+
+        :return: future done when the lines have been appended
+        :rtype: asyncio.Future
+        """
+        if self.flushed is None:
+            loop = asyncio.get_running_loop()
+            self.flushed = loop.create_future()
+            loop.call_soon(self.flush)
+        return self.flushed
+
+    def flush(self):
+        """Appends pending lines to the logs. Error log is written first, as Nemesida does, so the
+        rule IDs of a request are always in error log when its access log line is read
+        """
+        self.error_log.flush()
+        self.access_log.flush()
+        if self.flushed is not None:
+            self.flushed.set_result(None)
+            self.flushed = None
+
+# =====================================
+# Functions
+# =====================================
+def init_parser():
+    """Retrieves the parameters with which it has been executed
+
+    :rtype: ArgumentParser
+    :return: arguments prepared to be parsed
+    """
+    parser = argparse.ArgumentParser(description=DESCRIPTION)
+    parser.add_argument(ADDRESS_ARG, help=ADDRESS_HELP, default=ADDRESS_DEFAULT, metavar=ADDRESS_VARIABLE_NAME, \
+        dest=ADDRESS_VARIABLE_NAME)
+    parser.add_argument(PORT_ARG, help=PORT_HELP, default=PORT_DEFAULT, metavar=PORT_VARIABLE_NAME, \
+        dest=PORT_VARIABLE_NAME, type=int)
+    parser.add_argument(ACCESS_LOG_ARG, help=ACCESS_LOG_HELP, default=ACCESS_LOG_DEFAULT, \
+        metavar=ACCESS_LOG_VARIABLE_NAME, dest=ACCESS_LOG_VARIABLE_NAME)
+    parser.add_argument(ERROR_LOG_ARG, help=ERROR_LOG_HELP, default=ERROR_LOG_DEFAULT, \
+        metavar=ERROR_LOG_VARIABLE_NAME, dest=ERROR_LOG_VARIABLE_NAME)
+    parser.add_argument(RULES_ARG, help=RULES_HELP, metavar=RULES_VARIABLE_NAME, dest=RULES_VARIABLE_NAME)
+    parser.add_argument(WORKERS_ARG, help=WORKERS_HELP, default=WORKERS_DEFAULT, metavar=WORKERS_VARIABLE_NAME, \
+        dest=WORKERS_VARIABLE_NAME, type=int)
+    return parser
+
+def read_rules(rules_file_name):
+    """Reads the rules of the file, or returns the default ones if no file is indicated
+
+    :param rules_file_name: file with a rule ID and a regular expression in every line
+    :type rules_file_name: string
+
+    :return: list of (rule ID, compiled pattern) tuples
+    :rtype: list
+
+    :raises LogError: if file does not exist or a line is not a valid rule
+    """
+    if rules_file_name is None:
+        return [(rule_id, re.compile(pattern, re.IGNORECASE)) for rule_id, pattern in DEFAULT_RULES]
+    if not os.path.isfile(rules_file_name):
+        log.error(FILE_NOT_EXISTS_ERROR % rules_file_name)
+    rules = list()
+    with open(rules_file_name, encoding=HTTP_ENCODING) as rules_file:
+        for line_number, line in enumerate(rules_file, 1):
+            line = line.rstrip("\n")
+            if not line.strip():
+                continue
+            result = RULE_LINE_CP.fullmatch(line)
+            try:
+                rules.append((result.group('rule_id'), re.compile(result.group('pattern'), re.IGNORECASE)))
+            except (AttributeError, re.error):
+                log.error(INVALID_RULE_ERROR.format(line_number, rules_file_name, line))
+    return rules
+
+async def serve(address, port, rules, access_log_name, error_log_name):
+    """Answers requests until the process is stopped
+
+    :param address: address where the server listens
+    :type address: string
+    :param port: port where the server listens
+    :type port: int
+    :param rules: list of (rule ID, compiled pattern) tuples
+    :type rules: list
+    :param access_log_name: access log file
+    :type access_log_name: string
+    :param error_log_name: error log file
+    :type error_log_name: string
+    """
+    waf_stub = WafStub(rules, LogWriter(access_log_name), LogWriter(error_log_name))
+    server = await asyncio.start_server(waf_stub.handle_connection, address, port, reuse_port=True, \
+        limit=MAX_HEADERS_SIZE)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        waf_stub.flush()
+        waf_stub.access_log.close()
+        waf_stub.error_log.close()
+
+def stop(signal_number, frame):
+    """Stops the server when the process is terminated, as Ctrl+C does
+
+    :param signal_number: number of the received signal
+    :type signal_number: int
+    :param frame: current stack frame
+    :type frame: frame
+    """
+    raise KeyboardInterrupt()
+
+def run_worker(address, port, rules, access_log_name, error_log_name):
+    """Runs a server process until it is interrupted
+
+    :param address: address where the server listens
+    :type address: string
+    :param port: port where the server listens
+    :type port: int
+    :param rules: list of (rule ID, compiled pattern) tuples
+    :type rules: list
+    :param access_log_name: access log file
+    :type access_log_name: string
+    :param error_log_name: error log file
+    :type error_log_name: string
+    """
+    signal.signal(signal.SIGTERM, stop)
+    try:
+        asyncio.run(serve(address, port, rules, access_log_name, error_log_name))
+    except KeyboardInterrupt:
+        pass
+
+def main(args):
+    """Main function.
+
+    Reads the rules and starts as many server processes as indicated listening in the same port,
+    all of them appending lines to the same log files. When the main process is interrupted or
+    terminated the other ones are terminated too, writing their pending lines
+
+    :param args: command-line retrieved arguments
+    :type args: ArgumentParser.parse_args()
+
+    :raises LogError: if rules file does not exist or the number of processes is not valid
+    """
+    if args.workers < 1:
+        log.error(INVALID_WORKERS_ERROR)
+    rules = read_rules(args.rules)
+    log.info(LOG_INFO_MAIN.format(args.address, args.port, len(rules), args.workers))
+    log.info(LOG_INFO_LOGS.format(args.access_log, args.error_log))
+    worker_args = (args.address, args.port, rules, args.access_log, args.error_log)
+    workers = [multiprocessing.Process(target=run_worker, args=worker_args) for _ in range(args.workers - 1)]
+    for worker in workers:
+        worker.start()
+    run_worker(*worker_args)
+    for worker in workers:
+        worker.terminate()
+        worker.join()
+    log.info(LOG_INFO_END)
+
+# =====================================
+# Main
+# =====================================
+if __name__ == "__main__":
+    args = init_parser().parse_args()
+    main(args)